@@ -1,9 +1,9 @@
 import cv2
 import numpy as np
 import mediapipe as mp
-import onnxruntime as ort
 from scipy.spatial.distance import cosine
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -15,8 +15,14 @@ from supabase import create_client, Client
 import io
 import base64
 import binascii
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 import uuid
+import time
+import asyncio
+import functools
+from collections import Counter
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
 
 # Security Agent (rule-based: log incidents, email admin on unauthorized attempts)
 from security.logger import set_supabase_client, log_incident, get_attempt_count_last_5min
@@ -24,6 +30,37 @@ from security.agent import security_agent
 from security.notifier import send_alert_email_async
 from security.rules import LOG_ONLY, MEDIUM_ALERT, HIGH_ALERT
 
+# Pooled face detectors (long-lived MediaPipe graphs)
+from vision import (
+    DetectionResult,
+    DetectorPool,
+    QualityResult,
+    QualityThresholds,
+    assess_face,
+    decode_image,
+    decode_scale,
+    detect_faces,
+    face_inputs,
+    image_size,
+    mediapipe_face_detector,
+)
+
+from streaming import Cooldown, FaceTracker, LatestSlot, MotionGate, decode_thumbnail, parse_roi
+
+# Resident face gallery (in-memory embeddings used by /recognize_face/)
+from inference import (
+    BACKENDS,
+    ArcFaceOnnxBackend,
+    MicroBatchScheduler,
+    MobileFaceNetTFLiteBackend,
+    UploadCache,
+    content_key,
+    embedding_buffer,
+    resolve_variant,
+    settings_from_env,
+)
+from gallery import FaceGallery, GallerySync, IVFIndex, candidates_to_dicts, open_snapshot, write_snapshot
+
 # Load environment variables
 load_dotenv()
 
@@ -51,34 +88,172 @@ supabase: Client = create_client(url, key)
 set_supabase_client(supabase)
 
 # ------------------------------
-# Load ArcFace ONNX Model
+# Load Embedding Backend
 # ------------------------------
-_MODEL_CANDIDATES = [
-    os.environ.get("ARCFACE_MODEL_PATH", "").strip(),
-    "arcface.onnx",
-    os.path.join("..", "arcface.onnx"),
-]
-_MODEL_PATH = next((p for p in _MODEL_CANDIDATES if p and os.path.exists(p)), None)
-if not _MODEL_PATH:
-    raise RuntimeError(
-        "ArcFace model not found. Set ARCFACE_MODEL_PATH or place arcface.onnx in "
-        "face_recognition/ or project root."
+# CPU stages (decode, detection, alignment, embedding, matching) run on a bounded pool of
+# RECOGNITION_WORKERS threads (see cpu_executor below)
+RECOGNITION_WORKERS = int(os.environ.get("RECOGNITION_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_BATCHING = os.environ.get("INFERENCE_BATCHING", "true").strip().lower() in ("1", "true", "yes")
+
+# arcface-onnx (default) | mobilefacenet-tflite (lighter model for low-power gates).
+# Embeddings of different backends are not comparable: re-register students after switching
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "arcface-onnx").strip().lower()
+if EMBEDDING_BACKEND == "arcface-onnx":
+    _MODEL_CANDIDATES = [
+        os.environ.get("ARCFACE_MODEL_PATH", "").strip(),
+        "arcface.onnx",
+        os.path.join("..", "arcface.onnx"),
+    ]
+    _MODEL_PATH = next((p for p in _MODEL_CANDIDATES if p and os.path.exists(p)), None)
+    if not _MODEL_PATH:
+        raise RuntimeError(
+            "ArcFace model not found. Set ARCFACE_MODEL_PATH or place arcface.onnx in "
+            "face_recognition/ or project root."
+        )
+    # Reduced-precision variant written next to the model by scripts/quantize_arcface.py:
+    # fp32 (default), int8-dynamic, int8-static or fp16
+    ARCFACE_MODEL_VARIANT = os.environ.get("ARCFACE_MODEL_VARIANT", "fp32").strip().lower() or "fp32"
+    try:
+        _MODEL_PATH = resolve_variant(_MODEL_PATH, ARCFACE_MODEL_VARIANT)
+    except (FileNotFoundError, ValueError) as e:
+        raise RuntimeError(str(e))
+
+    # Session threading: with the micro-batching scheduler one dispatcher thread runs the session,
+    # so it may use every core; without it each CPU worker can be inside the session at once and
+    # gets its share. ORT_* variables override (see inference/session.py; scripts/autotune_onnx.py
+    # benchmarks layouts on this machine). The optimized graph is cached in ORT_OPTIMIZED_MODEL_CACHE.
+    # IO binding writes embeddings straight into preallocated per-thread rows (ONNX_IO_BINDING=false
+    # uses session.run).
+    onnx_settings = settings_from_env(
+        intra_op_threads=0 if INFERENCE_BATCHING else max(1, (os.cpu_count() or 1) // RECOGNITION_WORKERS),
+        allow_spinning=INFERENCE_BATCHING,
+        cache_dir=".ort_cache",
+    )
+    print(f"📦 Loading ArcFace ONNX model ({ARCFACE_MODEL_VARIANT}) from: {_MODEL_PATH}")
+    embedding_backend = ArcFaceOnnxBackend(
+        _MODEL_PATH,
+        onnx_settings,
+        io_binding=os.environ.get("ONNX_IO_BINDING", "true").strip().lower() in ("1", "true", "yes"),
     )
+elif EMBEDDING_BACKEND == "mobilefacenet-tflite":
+    _MODEL_PATH = os.environ.get("MOBILEFACENET_MODEL_PATH", "").strip() or "output_model.tflite"
+    if not os.path.exists(_MODEL_PATH):
+        raise RuntimeError("MobileFaceNet model not found. Set MOBILEFACENET_MODEL_PATH or place output_model.tflite in face_recognition/.")
+    print(f"📦 Loading MobileFaceNet TFLite model from: {_MODEL_PATH}")
+    # One interpreter per CPU worker thread, so split the cores between them
+    embedding_backend = MobileFaceNetTFLiteBackend(
+        _MODEL_PATH,
+        num_threads=int(os.environ.get("TFLITE_THREADS", str(max(1, (os.cpu_count() or 1) // RECOGNITION_WORKERS)))),
+    )
+else:
+    raise RuntimeError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND!r} (expected one of {BACKENDS})")
+print(f"   Backend: {embedding_backend.info()}")
 
-print(f"📦 Loading ArcFace ONNX model from: {_MODEL_PATH}")
-onnx_session = ort.InferenceSession(_MODEL_PATH, providers=["CPUExecutionProvider"])
-onnx_input = onnx_session.get_inputs()[0]
-onnx_output_names = [o.name for o in onnx_session.get_outputs()]
-onnx_output_name = "embedding" if "embedding" in onnx_output_names else onnx_output_names[0]
-print(f"   Input: name={onnx_input.name}, shape={onnx_input.shape}, type={onnx_input.type}")
-print(f"   Output: name={onnx_output_name}, available_outputs={onnx_output_names}")
+# Embedding size and input layout of the selected backend (ArcFace exports are 512-d)
+EMBEDDING_DIM = embedding_backend.dim
+FACE_INPUT = embedding_backend.input_spec
 
 mp_face_detection = mp.solutions.face_detection
 
+# CPU stages run on this bounded pool so the event loop keeps serving /health and dashboard
+# polling; blocking Supabase calls go to the Starlette threadpool (run_in_threadpool) instead
+cpu_executor = ThreadPoolExecutor(max_workers=RECOGNITION_WORKERS, thread_name_prefix="face-cpu")
+
+async def run_cpu(fn, *args, **kwargs):
+    """Await a CPU-bound call on the bounded face pool"""
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, functools.partial(fn, *args, **kwargs))
+
+# Long-lived detectors checked out per request instead of building a graph each time;
+# one per CPU worker so a detection never waits for a detector
+detector_pool = DetectorPool(
+    mediapipe_face_detector(model_selection=0, min_detection_confidence=0.5),
+    size=int(os.environ.get("DETECTOR_POOL_SIZE", str(RECOGNITION_WORKERS))),
+    timeout=float(os.environ.get("DETECTOR_POOL_TIMEOUT", "10")),
+)
+# Large JPEG uploads are decoded at 1/2, 1/4 or 1/8 scale down to about DECODE_MAX_SIDE px;
+# detection runs on a copy of at most DETECT_MAX_SIDE px and faces are cropped from the decoded image
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "1600"))
+DETECT_MAX_SIDE = int(os.environ.get("DETECT_MAX_SIDE", "640"))
+# ArcFace crop: bbox (same sampling as registered templates) | keypoints (eye-aligned; re-register after switching)
+FACE_ALIGNMENT = os.environ.get("FACE_ALIGNMENT", "bbox").strip().lower()
+
+# Face-quality gate before embedding: unusable faces are rejected with a reason code
+# instead of running ArcFace, matching and the security agent (QUALITY_GATE=false disables)
+QUALITY_GATE = os.environ.get("QUALITY_GATE", "true").strip().lower() in ("1", "true", "yes")
+QUALITY_THRESHOLDS = QualityThresholds(
+    min_face_px=int(os.environ.get("QUALITY_MIN_FACE_PX", "60")),
+    min_score=float(os.environ.get("QUALITY_MIN_SCORE", "0.6")),
+    max_yaw=float(os.environ.get("QUALITY_MAX_YAW", "0.5")),
+    min_sharpness=float(os.environ.get("QUALITY_MIN_SHARPNESS", "60")),
+)
+QUALITY_MESSAGES = {
+    "face_too_small": "Face is too small - please step closer to the camera.",
+    "low_detection_score": "Face is not clearly visible - please face the camera.",
+    "head_turned": "Head is turned - please look straight at the camera.",
+    "too_blurry": "Image is too blurry - please hold still and try again.",
+}
+quality_rejections: Counter = Counter()
+
+# Identical uploads (kiosk retries, the dashboard sending one capture to /process_face/ and then
+# /recognize_face/ or /register_from_dashboard/) reuse one decode + detection + embedding, keyed by
+# a hash of the bytes; concurrent identical uploads share the in-flight one. UPLOAD_CACHE_SIZE=0 disables
+UPLOAD_CACHE_SIZE = int(os.environ.get("UPLOAD_CACHE_SIZE", "256"))
+UPLOAD_CACHE_TTL = float(os.environ.get("UPLOAD_CACHE_TTL", "60"))
+upload_cache = UploadCache(max_entries=UPLOAD_CACHE_SIZE, ttl=UPLOAD_CACHE_TTL) if UPLOAD_CACHE_SIZE > 0 else None
+
+# Optional IVF index for very large galleries (exact matmul is used below GALLERY_ANN_MIN_SIZE)
+GALLERY_ANN_ENABLED = os.environ.get("GALLERY_ANN_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+GALLERY_ANN_PATH = os.environ.get("GALLERY_ANN_PATH", "gallery_ivf.npz").strip()
+gallery_index = None
+if GALLERY_ANN_ENABLED:
+    if GALLERY_ANN_PATH and os.path.exists(GALLERY_ANN_PATH):
+        try:
+            gallery_index = IVFIndex.load(GALLERY_ANN_PATH)
+            print(f"📦 Loaded gallery ANN index from {GALLERY_ANN_PATH} ({len(gallery_index)} vectors)")
+        except Exception as e:
+            print(f"Could not load gallery ANN index ({e}); it will be rebuilt")
+    if gallery_index is None or gallery_index.dim != EMBEDDING_DIM:
+        gallery_index = IVFIndex(
+            EMBEDDING_DIM,
+            nlist=int(os.environ.get("GALLERY_ANN_NLIST", "0")) or None,
+        )
+    gallery_index.nprobe = int(os.environ.get("GALLERY_ANN_NPROBE", str(gallery_index.nprobe)))
+
+face_gallery = FaceGallery(
+    dim=EMBEDDING_DIM,
+    index=gallery_index,
+    ann_min_size=int(os.environ.get("GALLERY_ANN_MIN_SIZE", "50000")),
+    # float32 | float16 | int8 (per-row scale); scores are always accumulated in float32
+    dtype=os.environ.get("GALLERY_DTYPE", "float32").strip().lower(),
+    # How a student's templates are combined: max (best template) | mean
+    fusion=os.environ.get("GALLERY_FUSION", "max").strip().lower(),
+)
+# Templates kept per student when registering with append=true (oldest dropped first)
+MAX_FACE_TEMPLATES = max(1, int(os.environ.get("MAX_FACE_TEMPLATES", "5")))
+RECOGNITION_TOP_K = int(os.environ.get("RECOGNITION_TOP_K", "5"))
+# Cosine similarity a match must exceed to count as recognized
+RECOGNITION_THRESHOLD = float(os.environ.get("RECOGNITION_THRESHOLD", "0.75"))
+# Faces embedded per frame when /recognize_face/ is called with multi_face=true
+MAX_FACES_PER_FRAME = int(os.environ.get("MAX_FACES_PER_FRAME", "10"))
+# Images accepted per /recognize_faces/batch call
+RECOGNITION_BATCH_MAX = int(os.environ.get("RECOGNITION_BATCH_MAX", "32"))
+
+# Memory-mapped gallery snapshot shared by all workers (empty GALLERY_SNAPSHOT_DIR disables it).
+# It makes startup instant; pages stay shared only until a worker applies its first change
+# (sync delta, enrollment), after which that worker holds a private copy and writes a new
+# snapshot on shutdown (see gallery.snapshot). Snapshots carrying a sync watermark are opened
+# at any age and caught up by gallery sync; GALLERY_SNAPSHOT_MAX_AGE only limits those without one
+GALLERY_SNAPSHOT_DIR = os.environ.get("GALLERY_SNAPSHOT_DIR", "gallery_snapshot").strip()
+GALLERY_SNAPSHOT_MAX_AGE = float(os.environ.get("GALLERY_SNAPSHOT_MAX_AGE", "900"))
+
 # ------------------------------
 # Helper Functions for Supabase
 # ------------------------------
 
+def utc_timestamp() -> str:
+    """students.updated_at value: UTC with its offset, like the database's now() (the gallery sync watermark compares them)"""
+    return datetime.now(timezone.utc).isoformat()
+
 def decode_base64_embedding(data: str) -> Optional[bytes]:
     """Robust base64 decoding with error handling and cleanup"""
     try:
@@ -141,8 +316,190 @@ def get_all_students_including_no_face(limit: int = 2000) -> List[Dict]:
         print(f"Error fetching all students from Supabase: {e}")
         return []
 
-def save_embedding_to_supabase(register_number: str, embedding: np.ndarray, full_name: str = None) -> bool:
-    """Save face embedding to Supabase students table"""
+def parse_embedding_data(embedding_data) -> Optional[np.ndarray]:
+    """Convert a stored face_embedding (JSONB list, JSON string, legacy base64 or bytea) to float32"""
+    try:
+        if isinstance(embedding_data, list):
+            return np.array(embedding_data, dtype=np.float32)
+        if isinstance(embedding_data, str):
+            try:
+                parsed_data = json.loads(embedding_data)
+                if isinstance(parsed_data, list):
+                    return np.array(parsed_data, dtype=np.float32)
+            except json.JSONDecodeError:
+                pass
+            embedding_bytes = decode_base64_embedding(embedding_data)
+            if embedding_bytes is None:
+                return None
+            return np.frombuffer(embedding_bytes, dtype=np.float32)
+        if isinstance(embedding_data, bytes):
+            return np.frombuffer(embedding_data, dtype=np.float32)
+    except Exception as e:
+        print(f"Failed to parse embedding data: {e}")
+    return None
+
+_face_templates_supported: Optional[bool] = None
+
+def face_templates_supported() -> bool:
+    """Whether students.face_templates exists (migrations/002_face_templates.sql); probed once"""
+    global _face_templates_supported
+    if _face_templates_supported is None:
+        try:
+            supabase.table('students').select('face_templates').limit(1).execute()
+            _face_templates_supported = True
+        except Exception as e:
+            print(f"   students.face_templates not available ({e}); using one template per student")
+            _face_templates_supported = False
+    return _face_templates_supported
+
+def gallery_columns(*extra: str) -> str:
+    """Student columns selected for the face gallery"""
+    columns = ['id', 'register_number', 'full_name', 'hostel_status', 'face_embedding', *extra, 'updated_at']
+    if face_templates_supported():
+        columns.insert(5, 'face_templates')
+    return ', '.join(columns)
+
+def parse_face_templates(row: Dict) -> Optional[np.ndarray]:
+    """All face templates of a student row as (T, D) float32, falling back to face_embedding"""
+    templates = []
+    for data in row.get('face_templates') or []:
+        embedding = parse_embedding_data(data)
+        if embedding is not None:
+            templates.append(embedding)
+    if templates and len({t.shape[0] for t in templates}) == 1:
+        return np.stack(templates)
+    embedding = parse_embedding_data(row.get('face_embedding')) if row.get('face_embedding') is not None else None
+    return None if embedding is None else embedding.reshape(1, -1)
+
+def load_gallery_from_supabase(page_size: int = 1000) -> int:
+    """(Re)build the in-memory face gallery from every active student with face templates"""
+    entries = []
+    watermark = None
+    try:
+        start = 0
+        while True:
+            result = (
+                supabase.table('students')
+                .select(gallery_columns())
+                .eq('is_active', True)
+                .not_.is_('face_embedding', 'null')
+                .order('register_number')
+                .range(start, start + page_size - 1)
+                .execute()
+            )
+            rows = result.data or []
+            for row in rows:
+                if row.get('updated_at') and (watermark is None or row['updated_at'] > watermark):
+                    watermark = row['updated_at']
+                embedding = parse_face_templates(row)
+                if embedding is None:
+                    print(f"   Skipping {row.get('register_number')}: unreadable face embedding")
+                    continue
+                entries.append({**row, 'embedding': embedding})
+            if len(rows) < page_size:
+                break
+            start += page_size
+    except Exception as e:
+        print(f"❌ Error loading face gallery from Supabase: {e}")
+        return len(face_gallery)
+    count = face_gallery.load(entries)
+    gallery_sync.reset(watermark)
+    return count
+
+def fetch_student_changes(since: Optional[str], after_register_number: Optional[str], limit: int) -> List[Dict]:
+    """Students changed after the (updated_at, register_number) cursor, oldest first (for gallery sync)"""
+    query = (
+        supabase.table('students')
+        .select(gallery_columns('is_active'))
+    )
+    if since and after_register_number:
+        query = query.or_(
+            f'updated_at.gt."{since}",'
+            f'and(updated_at.eq."{since}",register_number.gt."{after_register_number}")'
+        )
+    elif since:
+        query = query.gte('updated_at', since)
+    result = query.order('updated_at').order('register_number').limit(limit).execute()
+    return result.data or []
+
+# Background poller applying updated_at deltas to the gallery (GALLERY_SYNC_INTERVAL=0 disables)
+GALLERY_SYNC_INTERVAL = float(os.environ.get("GALLERY_SYNC_INTERVAL", "5"))
+gallery_sync = GallerySync(
+    face_gallery,
+    fetch_changes=fetch_student_changes,
+    parse_templates=parse_face_templates,
+    interval=GALLERY_SYNC_INTERVAL or 5.0,
+)
+
+def save_gallery_index() -> None:
+    """Persist the gallery ANN index to GALLERY_ANN_PATH (no-op when ANN is disabled)"""
+    if gallery_index is None or not GALLERY_ANN_PATH:
+        return
+    try:
+        gallery_index.save(GALLERY_ANN_PATH)
+        print(f"💾 Saved gallery ANN index to {GALLERY_ANN_PATH} ({len(gallery_index)} vectors)")
+    except Exception as e:
+        print(f"Failed to save gallery ANN index: {e}")
+
+def open_gallery_snapshot() -> bool:
+    """
+    Map the on-disk gallery snapshot into the resident gallery if it is compatible and either
+    carries a sync watermark (then caught up from students.updated_at) or is fresh enough
+    """
+    if not GALLERY_SNAPSHOT_DIR:
+        return False
+    snap = open_snapshot(GALLERY_SNAPSHOT_DIR)
+    if snap is None:
+        return False
+    age = time.time() - float(snap.get("created_at", 0))
+    if not snap.get("watermark") and age > GALLERY_SNAPSHOT_MAX_AGE:
+        print(f"   Gallery snapshot v{snap['version']} is {age:.0f}s old (max {GALLERY_SNAPSHOT_MAX_AGE:.0f}s) with no sync watermark; reloading from Supabase")
+        return False
+    if snap.get("dtype") != face_gallery.dtype or snap.get("dim") != face_gallery.dim:
+        print(f"   Gallery snapshot v{snap['version']} is {snap.get('dtype')}/{snap.get('dim')}, need {face_gallery.dtype}/{face_gallery.dim}; reloading")
+        return False
+    try:
+        students = face_gallery.install(
+            snap["matrix"],
+            snap["scales"],
+            snap["student_ids"],
+            snap["register_numbers"],
+            snap["full_names"],
+            snap["hostel_statuses"],
+        )
+    except ValueError as e:
+        print(f"Could not install gallery snapshot: {e}")
+        return False
+    gallery_sync.reset(snap.get("watermark"))
+    print(f"📂 Mapped gallery snapshot v{snap['version']} ({students} students, {snap['count']} templates, {age:.0f}s old)")
+    if snap.get("watermark"):
+        # Catch up on students changed since the snapshot before serving
+        changed = gallery_sync.poll()
+        print(f"🔄 Gallery snapshot caught up: {changed} changed students since {snap['watermark']}")
+    return True
+
+def save_gallery_snapshot(only_if_changed: bool = False) -> None:
+    """
+    Write the current gallery as a new snapshot version for other workers / restarts.
+    only_if_changed skips it while the gallery is still the mapped snapshot it was opened from.
+    """
+    if not GALLERY_SNAPSHOT_DIR or not face_gallery.loaded:
+        return
+    if only_if_changed and face_gallery.stats()["mapped"]:
+        return
+    try:
+        version = write_snapshot(
+            GALLERY_SNAPSHOT_DIR,
+            face_gallery.view(),
+            face_gallery.dtype,
+            extra={"watermark": gallery_sync.watermark},
+        )
+        print(f"💾 Wrote gallery snapshot v{version} to {GALLERY_SNAPSHOT_DIR}")
+    except Exception as e:
+        print(f"Failed to write gallery snapshot: {e}")
+
+def save_embedding_to_supabase(register_number: str, embedding: np.ndarray, full_name: str = None, append: bool = False) -> bool:
+    """Save face embedding to Supabase students table (append=True adds it as another template when students.face_templates exists)"""
     try:
         # Convert embedding to list for JSONB storage
         embedding_list = embedding.astype(np.float32).tolist()
@@ -157,14 +514,39 @@ def save_embedding_to_supabase(register_number: str, embedding: np.ndarray, full
         existing_student = supabase.table('students').select('*').eq('register_number', register_number).execute()
         
         if existing_student.data:
-            # Update existing student with face embedding
-            result = supabase.table('students').update({
+            student_info = existing_student.data[0]
+            templates = [embedding.astype(np.float32)]
+            if append and not face_templates_supported():
+                # Without the face_templates column only face_embedding is stored; keep the
+                # gallery identical to what a reload or sync would read back
+                print("   face_templates column missing; replacing the template instead of appending")
+                append = False
+            if append:
+                previous = parse_face_templates(student_info)
+                if previous is not None and previous.shape[1] == embedding.shape[0]:
+                    templates = list(previous) + templates
+                templates = templates[-MAX_FACE_TEMPLATES:]
+                print(f"   Appending template ({len(templates)}/{MAX_FACE_TEMPLATES} kept)")
+
+            # Update existing student; face_embedding always holds the latest template
+            update = {
                 'face_embedding': embedding_list,
-                'updated_at': datetime.now().isoformat()
-            }).eq('register_number', register_number).execute()
-            
+                'updated_at': utc_timestamp()
+            }
+            if face_templates_supported():
+                update['face_templates'] = [t.tolist() for t in templates]
+            result = supabase.table('students').update(update).eq('register_number', register_number).execute()
+
+            if student_info.get('is_active', True):
+                face_gallery.upsert(
+                    register_number,
+                    np.stack(templates),
+                    student_id=student_info.get('id'),
+                    full_name=student_info.get('full_name'),
+                    hostel_status=student_info.get('hostel_status'),
+                )
+
             # Log the embedding update
-            student_info = existing_student.data[0]
             log_entry(
                 register_number=register_number,
                 student_name=student_info.get('full_name', f"Student {register_number}"),
@@ -174,14 +556,26 @@ def save_embedding_to_supabase(register_number: str, embedding: np.ndarray, full
             )
         else:
             # Create new student record
-            result = supabase.table('students').insert({
+            record = {
                 'register_number': register_number,
                 'full_name': full_name or f"Student {register_number}",
                 'face_embedding': embedding_list,
                 'hostel_status': 'resident',
                 'is_active': True
-            }).execute()
-            
+            }
+            if face_templates_supported():
+                record['face_templates'] = [embedding_list]
+            result = supabase.table('students').insert(record).execute()
+
+            new_student = result.data[0] if result.data else {}
+            face_gallery.upsert(
+                register_number,
+                embedding,
+                student_id=new_student.get('id'),
+                full_name=full_name or f"Student {register_number}",
+                hostel_status='resident',
+            )
+
             # Log the new registration
             log_entry(
                 register_number=register_number,
@@ -373,45 +767,99 @@ def get_student_by_register_number(register_number: str) -> Optional[Dict]:
 # ------------------------------
 # Preprocess face
 # ------------------------------
-def preprocess_face(image):
-    with mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5) as face_detection:
-        results = face_detection.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        if not results.detections:
-            return None
-        bbox = results.detections[0].location_data.relative_bounding_box
-        h, w, _ = image.shape
-        x1, y1 = max(0, int(bbox.xmin * w)), max(0, int(bbox.ymin * h))
-        x2, y2 = min(w, x1 + int(bbox.width * w)), min(h, y1 + int(bbox.height * h))
-        face = image[y1:y2, x1:x2]
-        if face.size == 0:
-            return None
-        face = cv2.resize(face, (112, 112))
-        # ArcFace ONNX export expects RGB input and ArcFace-style normalization.
-        face = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-        face = (face.astype(np.float32) - 127.5) / 128.0
-        return np.expand_dims(face, axis=0)
+def rejected_quality(detection: DetectionResult, scale: float = 1.0) -> Optional[QualityResult]:
+    """
+    Quality-gate result when the face is unusable (counted per reason), None when it may be embedded.
+    `scale` is decode_scale() of the upload, so QUALITY_MIN_FACE_PX holds in upload pixels.
+    """
+    if not QUALITY_GATE:
+        return None
+    return quality_rejection(assess_face(detection, QUALITY_THRESHOLDS, scale))
+
+def quality_rejection(quality: Optional[QualityResult]) -> Optional[QualityResult]:
+    """`quality` when the gate is on and it failed (counted per reason), else None"""
+    if not QUALITY_GATE or quality is None or quality.ok:
+        return None
+    quality_rejections[quality.reason] += 1
+    print(f"🚫 Face rejected by quality gate: {quality.reason} "
+          f"(size={quality.face_px}px, score={quality.score:.2f}, yaw={quality.yaw}, sharpness={quality.sharpness})")
+    return quality
+
+def detect_face(image) -> Optional[DetectionResult]:
+    """Most confident face in the image from one detector pass (bbox, keypoints, score, ArcFace crop), or None"""
+    detections = detect_faces(detector_pool, image, max_faces=1, detect_max_side=DETECT_MAX_SIDE, alignment=FACE_ALIGNMENT)
+    return detections[0] if detections else None
+
+def _analyze_upload(img_bytes: bytes):
+    image = decode_image(img_bytes, max_side=DECODE_MAX_SIDE)
+    detection = detect_face(image)
+    if detection is None:
+        return None, None, None, None
+    quality = assess_face(detection, QUALITY_THRESHOLDS, decode_scale(img_bytes, image))
+    faces = face_inputs([detection], FACE_INPUT)
+    if quality.ok or not QUALITY_GATE:
+        embedding = get_embeddings(faces)[0].copy()
+        embedding.setflags(write=False)
+        face = None
+    else:
+        # Gated out for recognition, but registration may still embed it: keep only the model input
+        embedding = None
+        face = faces.copy()
+        face.setflags(write=False)
+    # The decoded frame is dropped so cache entries stay small
+    return replace(detection, source=None), quality, face, embedding
+
+def analyze_upload(img_bytes: bytes):
+    """
+    Decode, detection, quality assessment and (unless gated out) embedding of one upload,
+    shared through upload_cache by every endpoint. Returns (detection without its frame,
+    QualityResult, gated-out model input, embedding); the arrays are read-only.
+    """
+    if upload_cache is None:
+        return _analyze_upload(img_bytes)
+    analysis, _ = upload_cache.get_or_compute(content_key(img_bytes), lambda: _analyze_upload(img_bytes))
+    return analysis
+
+def embed_upload(img_bytes: bytes):
+    """
+    CPU stage for one uploaded image: decode, detect, embed (ignores the quality gate).
+    Returns (detection, embedding); run it with run_cpu.
+    """
+    detection, _, face, embedding = analyze_upload(img_bytes)
+    if detection is not None and embedding is None:
+        embedding = get_embedding(face)
+    return detection, embedding
 
 # ------------------------------
 # Get embedding
 # ------------------------------
 def get_embedding(face_img):
-    outputs = onnx_session.run([onnx_output_name], {onnx_input.name: face_img})
-    embedding = np.asarray(outputs[0], dtype=np.float32).flatten()
-    # L2 normalize
-    embedding = embedding / np.linalg.norm(embedding)
-    
-    # Console log the extracted embedding details
-    print(f"🔍 Extracted face embedding:")
-    print(f"   Shape: {embedding.shape}")
-    print(f"   Length: {len(embedding)}")
-    print(f"   Data type: {embedding.dtype}")
-    print(f"   Min value: {embedding.min():.6f}")
-    print(f"   Max value: {embedding.max():.6f}")
-    print(f"   Mean: {embedding.mean():.6f}")
-    print(f"   L2 norm: {np.linalg.norm(embedding):.6f}")
-    print(f"   First 5 values: {embedding[:5]}")
-    
-    return embedding
+    # Goes through the micro-batching scheduler, so concurrent requests share ONNX calls.
+    # Copied out of the thread's output buffer: callers keep it past the next inference
+    return get_embeddings(face_img)[0].copy()
+
+# Concurrent requests' faces are coalesced into one ONNX call: the dispatcher waits up to
+# INFERENCE_BATCH_WAIT_MS after the oldest queued face, or until INFERENCE_BATCH_MAX faces.
+# Backends that run face by face (fixed batch-1 exports, TFLite) gain nothing from this.
+INFERENCE_BATCH_MAX = int(os.environ.get("INFERENCE_BATCH_MAX", "32"))
+INFERENCE_BATCH_WAIT_MS = float(os.environ.get("INFERENCE_BATCH_WAIT_MS", "2"))
+embedding_scheduler = (
+    MicroBatchScheduler(embedding_backend.embed, max_batch=INFERENCE_BATCH_MAX, max_wait_ms=INFERENCE_BATCH_WAIT_MS)
+    if INFERENCE_BATCHING and embedding_backend.batched
+    else None
+)
+
+def get_embeddings(faces: np.ndarray) -> np.ndarray:
+    """
+    Embed a stack of faces prepared with face_inputs(..., FACE_INPUT); rows L2-normalized.
+    The rows live in this thread's reusable output buffer until its next call.
+    """
+    if len(faces) == 0:
+        return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    out = embedding_buffer(len(faces), EMBEDDING_DIM)
+    if embedding_scheduler is not None:
+        return embedding_scheduler.embed(faces, out)
+    return embedding_backend.embed(faces, out)
 
 # ------------------------------
 # Dashboard HTML Template
@@ -1004,6 +1452,13 @@ DASHBOARD_HTML = """
                     addLog(`🎉 Welcome ${result.student.full_name}! (${result.confidence_percentage}% match)`, 'success');
                     addLog(`Entry logged at ${result.location}`, 'success');
                     loadStats(); // Refresh stats
+                } else if (result.quality_rejected) {
+                    // Face found but unusable (blurry, too small, turned away)
+                    resultDiv.className = 'mt-2 p-3 rounded-lg bg-yellow-100 border border-yellow-300';
+                    statusDiv.textContent = '⚠️ Please try again';
+                    detailsDiv.textContent = result.message;
+                    
+                    addLog(`📷 Frame skipped (${result.reason}): ${result.message}`, 'info');
                 } else if (result.success && !result.recognized) {
                     // Face detected but no match
                     resultDiv.className = 'mt-2 p-3 rounded-lg bg-yellow-100 border border-yellow-300';
@@ -1171,26 +1626,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def build_face_gallery():
+    """Map the gallery snapshot, or load every active student's embedding from Supabase"""
+    if not open_gallery_snapshot():
+        load_gallery_from_supabase()
+        save_gallery_snapshot()
+    print(f"🧠 Face gallery ready: {len(face_gallery)} students")
+    detector_pool.warm()
+    if embedding_scheduler is not None:
+        embedding_scheduler.start()
+    save_gallery_index()
+    if GALLERY_SYNC_INTERVAL > 0:
+        gallery_sync.start()
+
+@app.on_event("shutdown")
+async def persist_face_gallery():
+    """
+    Stop gallery sync, snapshot the gallery if it changed since it was mapped (so the next start
+    maps it instead of loading Supabase) and write the ANN index (if any) so the next start can
+    reuse its centroids
+    """
+    gallery_sync.stop()
+    save_gallery_snapshot(only_if_changed=True)
+    save_gallery_index()
+    cpu_executor.shutdown(wait=True)
+    if embedding_scheduler is not None:
+        embedding_scheduler.stop()
+    detector_pool.close()
+
+@app.get("/gallery/stats")
+async def gallery_stats():
+    """Resident gallery size/footprint and incremental sync lag"""
+    return {"success": True, "gallery": face_gallery.stats(), "sync": gallery_sync.stats()}
+
+@app.post("/gallery/reload")
+def reload_face_gallery():
+    """Rebuild the in-memory face gallery from Supabase (use after out-of-band edits)"""
+    count = load_gallery_from_supabase()
+    save_gallery_snapshot()
+    return {"success": True, "gallery": face_gallery.stats(), "loaded": count}
+
 @app.post("/register_from_dashboard/")
-async def register_from_dashboard(register_number: str = Form(...), file: UploadFile = File(...)):
+async def register_from_dashboard(register_number: str = Form(...), file: UploadFile = File(...), append: bool = Form(False)):
     """Register a student's face from the dashboard and save to database"""
     try:
         # Check if student exists in the system first
-        if not student_exists(register_number):
+        if not await run_in_threadpool(student_exists, register_number):
             raise HTTPException(status_code=404, detail="Student not found in the system")
 
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        face = preprocess_face(image)
-        if face is None:
+        detection, embedding = await run_cpu(embed_upload, img_bytes)
+        if detection is None:
             raise HTTPException(status_code=400, detail="No face detected in the image")
-
-        embedding = get_embedding(face)
         
         # Save to Supabase
-        success = save_embedding_to_supabase(register_number, embedding)
+        success = await run_in_threadpool(save_embedding_to_supabase, register_number, embedding, append=append)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to save face data to database")
@@ -1207,21 +1698,16 @@ async def register_from_dashboard(register_number: str = Form(...), file: Upload
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @app.post("/register/")
-async def register(register_number: str = Form(...), full_name: str = Form(None), file: UploadFile = File(...)):
+async def register(register_number: str = Form(...), full_name: str = Form(None), file: UploadFile = File(...), append: bool = Form(False)):
     """Register a student's face with their register number"""
     try:
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        face = preprocess_face(image)
-        if face is None:
+        detection, embedding = await run_cpu(embed_upload, img_bytes)
+        if detection is None:
             raise HTTPException(status_code=400, detail="No face detected in the image")
-
-        embedding = get_embedding(face)
         
         # Save to Supabase
-        success = save_embedding_to_supabase(register_number, embedding, full_name)
+        success = await run_in_threadpool(save_embedding_to_supabase, register_number, embedding, full_name, append=append)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to save face data to database")
@@ -1263,64 +1749,42 @@ async def authenticate(register_number: str = Form(...), file: UploadFile = File
     """Authenticate a student using their face and log entry/attendance"""
     try:
         # Check if student exists
-        student_info = get_student_by_register_number(register_number)
+        student_info = await run_in_threadpool(get_student_by_register_number, register_number)
         if not student_info:
             raise HTTPException(status_code=404, detail="Student not registered")
 
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        face = preprocess_face(image)
-        if face is None:
+        detection, embedding = await run_cpu(embed_upload, img_bytes)
+        if detection is None:
             raise HTTPException(status_code=400, detail="No face detected in the image")
-
-        embedding = get_embedding(face)
         
-        # Get stored embedding from Supabase
-        stored_embedding = get_embedding_from_supabase(register_number)
-        if stored_embedding is None:
-            raise HTTPException(status_code=404, detail="No face data found for this student")
-
-        # Calculate similarity
-        cosine_dist = cosine(stored_embedding, embedding)
-        raw_similarity = 1 - cosine_dist
-        similarity = raw_similarity  # Adjustment as in original code
+        # Score against every template the student holds in the gallery, fused like /recognize_face/
+        await ensure_gallery_loaded()
+        similarity = face_gallery.verify(register_number, embedding) if embedding.shape[0] == face_gallery.dim else None
+        templates = len(face_gallery.view().rows.get(register_number, ()))
+        if similarity is None:
+            # Not in the gallery (e.g. loaded before this student registered): fall back to the stored embedding
+            stored_embedding = await run_in_threadpool(get_embedding_from_supabase, register_number)
+            if stored_embedding is None:
+                raise HTTPException(status_code=404, detail="No face data found for this student")
+            similarity = 1 - cosine(stored_embedding, embedding)
+            templates = 1
         threshold = 0.75
         success = bool(similarity > threshold)
         
         print(f"🔐 Authentication comparison for {register_number}:")
         print(f"   Query embedding shape: {embedding.shape}")
-        print(f"   Stored embedding shape: {stored_embedding.shape}")
-        print(f"   Cosine distance: {cosine_dist:.6f}")
-        print(f"   Raw similarity: {raw_similarity:.6f}")
-        print(f"   Adjusted similarity: {similarity:.6f}")
+        print(f"   Templates compared: {templates} (fusion={face_gallery.fusion})")
+        print(f"   Similarity: {similarity:.6f}")
         print(f"   Threshold: {threshold}")
         print(f"   Authentication result: {'✅ SUCCESS' if success else '❌ FAILED'}")
 
         if success:
-            # Log entry to entry_logs table
-            entry_logged = log_entry(
-                register_number=register_number,
-                student_name=student_info['full_name'],
-                entry_type='entry',
-                confidence_score=float(similarity),
-                location=location
+            # Log entry to entry_logs table and mark attendance
+            entry_logged, attendance_logged = await run_in_threadpool(
+                record_recognized_entry, student_info, similarity, location
             )
             
-            # Log attendance (mark as present). marked_by must be a profile id, not student id.
-            system_profile_id = _get_system_profile_id_for_attendance()
-            attendance_logged = False
-            if system_profile_id:
-                attendance_logged = log_attendance(
-                    student_id=student_info['id'],
-                    marked_by=system_profile_id,
-                    status='present',
-                    notes=f'Auto-marked via face recognition (confidence: {similarity:.2%})'
-                )
-            else:
-                print("Skipping attendance log: no ATTENDANCE_SYSTEM_PROFILE_ID and no profile in DB.")
-            
             return {
                 "success": success, 
                 "similarity": float(similarity),
@@ -1333,7 +1797,8 @@ async def authenticate(register_number: str = Form(...), file: UploadFile = File
             }
         else:
             # Log failed entry attempt
-            log_entry(
+            await run_in_threadpool(
+                log_entry,
                 register_number=register_number,
                 student_name=student_info['full_name'],
                 entry_type='failed_attempt',
@@ -1353,7 +1818,7 @@ async def authenticate(register_number: str = Form(...), file: UploadFile = File
         raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
 
 @app.get("/student/{register_number}")
-async def get_student_info(register_number: str):
+def get_student_info(register_number: str):
     """Get student information by register number"""
     try:
         result = supabase.table('students').select('*').eq('register_number', register_number).eq('is_active', True).execute()
@@ -1372,16 +1837,18 @@ async def get_student_info(register_number: str):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve student info: {str(e)}")
 
 @app.delete("/student/{register_number}")
-async def delete_student(register_number: str):
+def delete_student(register_number: str):
     """Soft delete a student (set is_active to false)"""
     try:
         result = supabase.table('students').update({
             'is_active': False,
-            'updated_at': 'now()'
+            'updated_at': utc_timestamp()
         }).eq('register_number', register_number).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Student not found")
+
+        face_gallery.remove(register_number)
         
         return {"success": True, "message": f"Student {register_number} deactivated successfully"}
     except HTTPException:
@@ -1390,7 +1857,7 @@ async def delete_student(register_number: str):
         raise HTTPException(status_code=500, detail=f"Failed to deactivate student: {str(e)}")
 
 @app.post("/mark_attendance/")
-async def mark_attendance_manual(
+def mark_attendance_manual(
     register_number: str = Form(...),
     status: str = Form('present'),
     marked_by: str = Form(...),
@@ -1440,98 +1907,75 @@ async def process_face(file: UploadFile = File(...)):
     """Process face image and return detection points and embedding for visualization"""
     try:
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # One detection pass: bounding box, key points and the embedding crop, shared (cached)
+        # with the /recognize_face/ or /register_from_dashboard/ call that usually follows
+        detection, embedding = await run_cpu(embed_upload, img_bytes)
+        if detection is None:
+            raise HTTPException(status_code=400, detail="No face detected in the image")
+        # The coordinates are drawn over the uploaded image: map them back to its full size
+        detection = detection.rescaled(image_size(img_bytes) or detection.image_size)
+        
+        w, h = detection.image_size
+        x1, y1, x2, y2 = detection.bbox
+        key_points = [{"x": x, "y": y} for x, y in detection.keypoints]
+        
+        # Create face detection points for visualization
+        face_points = []
+        
+        # Add corner points of bounding box
+        face_points.extend([
+            {"x": x1, "y": y1, "type": "corner"},
+            {"x": x2, "y": y1, "type": "corner"},
+            {"x": x2, "y": y2, "type": "corner"},
+            {"x": x1, "y": y2, "type": "corner"}
+        ])
+        
+        # Add center point
+        center_x = (x1 + x2) // 2
+        center_y = (y1 + y2) // 2
+        face_points.append({"x": center_x, "y": center_y, "type": "center"})
+        
+        # Add key points if available
+        face_points.extend([{**kp, "type": "keypoint"} for kp in key_points])
+        
+        # Add some feature points based on embedding extraction areas
+        # These represent areas that are important for face recognition
+        face_width = x2 - x1
+        face_height = y2 - y1
+        
+        # Eye regions
+        eye_y = y1 + int(face_height * 0.3)
+        left_eye_x = x1 + int(face_width * 0.3)
+        right_eye_x = x1 + int(face_width * 0.7)
+        
+        face_points.extend([
+            {"x": left_eye_x, "y": eye_y, "type": "feature"},
+            {"x": right_eye_x, "y": eye_y, "type": "feature"}
+        ])
+        
+        # Nose region
+        nose_x = center_x
+        nose_y = y1 + int(face_height * 0.5)
+        face_points.append({"x": nose_x, "y": nose_y, "type": "feature"})
+        
+        # Mouth region
+        mouth_x = center_x
+        mouth_y = y1 + int(face_height * 0.7)
+        face_points.append({"x": mouth_x, "y": mouth_y, "type": "feature"})
+        
+        return {
+            "success": True,
+            "face_detected": True,
+            "bounding_box": {
+                "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+                "width": face_width, "height": face_height
+            },
+            "face_points": face_points,
+            "embedding_size": len(embedding),
+            "confidence": detection.score,
+            "image_dimensions": {"width": w, "height": h}
+        }
         
-        # Get face detection with landmarks
-        with mp_face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5) as face_detection:
-            results = face_detection.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            
-            if not results.detections:
-                raise HTTPException(status_code=400, detail="No face detected in the image")
-            
-            detection = results.detections[0]
-            bbox = detection.location_data.relative_bounding_box
-            h, w, _ = image.shape
-            
-            # Get face bounding box
-            x1, y1 = max(0, int(bbox.xmin * w)), max(0, int(bbox.ymin * h))
-            x2, y2 = min(w, x1 + int(bbox.width * w)), min(h, y1 + int(bbox.height * h))
-            
-            # Get key points (if available)
-            key_points = []
-            if hasattr(detection.location_data, 'relative_keypoints'):
-                for keypoint in detection.location_data.relative_keypoints:
-                    key_points.append({
-                        "x": int(keypoint.x * w),
-                        "y": int(keypoint.y * h)
-                    })
-            
-            # Preprocess face for embedding
-            face = preprocess_face(image)
-            if face is None:
-                raise HTTPException(status_code=400, detail="Failed to preprocess face")
-            
-            # Get embedding
-            embedding = get_embedding(face)
-            
-            # Create face detection points for visualization
-            face_points = []
-            
-            # Add corner points of bounding box
-            face_points.extend([
-                {"x": x1, "y": y1, "type": "corner"},
-                {"x": x2, "y": y1, "type": "corner"},
-                {"x": x2, "y": y2, "type": "corner"},
-                {"x": x1, "y": y2, "type": "corner"}
-            ])
-            
-            # Add center point
-            center_x = (x1 + x2) // 2
-            center_y = (y1 + y2) // 2
-            face_points.append({"x": center_x, "y": center_y, "type": "center"})
-            
-            # Add key points if available
-            face_points.extend([{**kp, "type": "keypoint"} for kp in key_points])
-            
-            # Add some feature points based on embedding extraction areas
-            # These represent areas that are important for face recognition
-            face_width = x2 - x1
-            face_height = y2 - y1
-            
-            # Eye regions
-            eye_y = y1 + int(face_height * 0.3)
-            left_eye_x = x1 + int(face_width * 0.3)
-            right_eye_x = x1 + int(face_width * 0.7)
-            
-            face_points.extend([
-                {"x": left_eye_x, "y": eye_y, "type": "feature"},
-                {"x": right_eye_x, "y": eye_y, "type": "feature"}
-            ])
-            
-            # Nose region
-            nose_x = center_x
-            nose_y = y1 + int(face_height * 0.5)
-            face_points.append({"x": nose_x, "y": nose_y, "type": "feature"})
-            
-            # Mouth region
-            mouth_x = center_x
-            mouth_y = y1 + int(face_height * 0.7)
-            face_points.append({"x": mouth_x, "y": mouth_y, "type": "feature"})
-            
-            return {
-                "success": True,
-                "face_detected": True,
-                "bounding_box": {
-                    "x1": x1, "y1": y1, "x2": x2, "y2": y2,
-                    "width": face_width, "height": face_height
-                },
-                "face_points": face_points,
-                "embedding_size": len(embedding),
-                "confidence": float(detection.score[0]) if detection.score else 0.0,
-                "image_dimensions": {"width": w, "height": h}
-            }
-            
     except HTTPException:
         raise
     except Exception as e:
@@ -1543,26 +1987,21 @@ async def dashboard():
     return DASHBOARD_HTML
 
 @app.post("/capture_and_register/")
-async def capture_and_register(register_number: str = Form(...), file: UploadFile = File(...)):
+async def capture_and_register(register_number: str = Form(...), file: UploadFile = File(...), append: bool = Form(False)):
     """Capture photo from camera and register face embedding"""
     try:
         # Check if student exists
-        student_info = get_student_by_register_number(register_number)
+        student_info = await run_in_threadpool(get_student_by_register_number, register_number)
         if not student_info:
             raise HTTPException(status_code=404, detail="Student not found in system")
 
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        face = preprocess_face(image)
-        if face is None:
+        detection, embedding = await run_cpu(embed_upload, img_bytes)
+        if detection is None:
             raise HTTPException(status_code=400, detail="No face detected in the captured image")
-
-        embedding = get_embedding(face)
         
         # Save to Supabase
-        success = save_embedding_to_supabase(register_number, embedding, student_info['full_name'])
+        success = await run_in_threadpool(save_embedding_to_supabase, register_number, embedding, student_info['full_name'], append=append)
         
         if not success:
             raise HTTPException(status_code=500, detail="Failed to save face data to database")
@@ -1579,162 +2018,290 @@ async def capture_and_register(register_number: str = Form(...), file: UploadFil
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
+def record_recognized_entry(student: Dict, similarity: float, location: str):
+    """Log the gate entry and mark attendance for a recognized student. Returns (entry_logged, attendance_logged)"""
+    entry_logged = log_entry(
+        register_number=student['register_number'],
+        student_name=student['full_name'],
+        entry_type='entry',
+        confidence_score=float(similarity),
+        location=location
+    )
+
+    # Log attendance (mark as present). marked_by must be a profile id, not student id.
+    system_profile_id = _get_system_profile_id_for_attendance()
+    attendance_logged = False
+    if system_profile_id:
+        attendance_logged = log_attendance(
+            student_id=student['id'],
+            marked_by=system_profile_id,
+            status='present',
+            notes=f'Auto-marked via face recognition (confidence: {similarity:.2%})'
+        )
+    else:
+        print("Skipping attendance log: no ATTENDANCE_SYSTEM_PROFILE_ID and no profile in DB.")
+    return entry_logged, attendance_logged
+
+def handle_unauthorized_attempt(confidence_score: Optional[float], location: str) -> Dict:
+    """Run the security agent for an unrecognized face, log the incident and email the admin"""
+    ts = datetime.now()
+    count_prev = get_attempt_count_last_5min(location)
+    attempt_count_last_5min = count_prev + 1  # include this attempt
+    print(f"   Previous attempts in last 5min: {count_prev}, total: {attempt_count_last_5min}")
+    
+    event = {
+        "timestamp": ts,
+        "face_match": False,
+        "confidence_score": confidence_score if confidence_score is not None else 0.0,
+        "person_id": None,
+        "gate_id": location,
+        "image_path": None,
+        "attempt_count_last_5min": attempt_count_last_5min,
+    }
+    print(f"   Calling security agent...")
+    try:
+        decision = security_agent(event)
+        severity = decision["decision"]
+        reason = decision["reason"]
+        reasoning = decision.get("reasoning") or ""
+        recommended_action = decision.get("recommended_action") or ""
+        
+        # Print agent decision for visibility
+        print(f"\n🤖 [SECURITY AGENT] Decision: {severity}")
+        print(f"   Reason: {reason}")
+        if reasoning:
+            print(f"   AI Reasoning: {reasoning}")
+        if recommended_action:
+            print(f"   Recommended Action: {recommended_action}\n")
+    except Exception as agent_err:
+        print(f"❌ [SECURITY AGENT] Error: {agent_err}")
+        import traceback
+        traceback.print_exc()
+        # Fallback to basic rule
+        severity = "medium_alert"
+        reason = f"Security agent error: {str(agent_err)}"
+        reasoning = ""
+        recommended_action = ""
+    
+    # Log incident (optional - skip if table doesn't exist)
+    try:
+        log_incident(
+            gate_id=location,
+            severity=severity,
+            confidence_score=confidence_score,
+            image_path=None,
+            attempt_count=attempt_count_last_5min,
+            resolved=False,
+        )
+    except Exception as e:
+        print(f"[security] Skipping DB log (table may not exist): {e}")
+    
+    # ALWAYS send email (for testing agentic AI)
+    send_alert_email_async(
+        severity=severity,
+        timestamp=ts.isoformat(),
+        gate_id=location,
+        confidence_score=confidence_score,
+        attempt_count=attempt_count_last_5min,
+        image_path=None,
+        reasoning=reasoning,
+        recommended_action=recommended_action,
+    )
+    return {
+        "decision": severity,
+        "reason": reason,
+        "reasoning": reasoning,
+        "recommended_action": recommended_action,
+    }
+
+async def ensure_gallery_loaded() -> None:
+    """Load the gallery on first use (startup normally does it) without blocking the event loop"""
+    if not face_gallery.loaded:
+        await run_in_threadpool(load_gallery_from_supabase)
+
+def recognize_upload(img_bytes: bytes):
+    """
+    CPU stage for /recognize_face/: the shared upload analysis (cached), quality gate and
+    a fresh gallery match in one task.
+    Returns (detection, rejected_quality, gallery view, MatchResult or None).
+    """
+    detection, quality, _, embedding = analyze_upload(img_bytes)
+    if detection is None:
+        return None, None, None, None
+    rejected = quality_rejection(quality)
+    if rejected is not None:
+        return detection, rejected, None, None
+    gallery, match = match_embedding(embedding)
+    return detection, None, gallery, match
+
+def match_embedding(embedding: np.ndarray):
+    """CPU stage: top-k gallery match for one embedding. Returns (gallery view, MatchResult or None)"""
+    gallery = face_gallery.view()
+    if embedding.shape[0] != face_gallery.dim:
+        print(f"Embedding size mismatch: gallery={face_gallery.dim}, query={embedding.shape[0]}")
+        return gallery, None
+    # One matrix-vector product over the whole gallery (or ANN probe), then top-k
+    return face_gallery.match(embedding, k=RECOGNITION_TOP_K)
+
+def match_all_faces(img_bytes: bytes):
+    """
+    CPU stage for multi-face recognition: decode, detect every face, quality-gate,
+    embed the usable ones as one batch and match them with one matrix-matrix product.
+    Returns (detections, rejections, matches keyed by id(detection), gallery view).
+    """
+    image = decode_image(img_bytes, max_side=DECODE_MAX_SIDE)
+    detected = detect_faces(
+        detector_pool, image, max_faces=MAX_FACES_PER_FRAME, detect_max_side=DETECT_MAX_SIDE, alignment=FACE_ALIGNMENT
+    )
+    scale = decode_scale(img_bytes, image)
+    rejections = [rejected_quality(d, scale) for d in detected]
+    usable = [d for d, rejected in zip(detected, rejections) if rejected is None]
+    embeddings = get_embeddings(face_inputs(usable, FACE_INPUT))
+    gallery = face_gallery.view()
+    matches = []
+    if embeddings.shape[1] == face_gallery.dim:
+        gallery, matches = face_gallery.match_batch(embeddings, k=RECOGNITION_TOP_K)
+    else:
+        print(f"Embedding size mismatch: gallery={face_gallery.dim}, query={embeddings.shape[1]}")
+    return detected, rejections, dict(zip(map(id, usable), matches)), gallery
+
+def face_results(detected, rejections, matches_by_face, gallery, tracks=None, tracker: Optional[FaceTracker] = None):
+    """
+    Per-face response dicts for match_all_faces output. Returns (faces, recognized as
+    [(face dict, student, similarity)], similarity of each unrecognized face or None).
+    With `tracks` from match_tracked_faces, each face carries its track_id, and an unmatched
+    face only counts as unrecognized once tracker.settled() its track (the gate worker's rule);
+    until then it is marked "pending".
+    """
+    faces = []
+    recognized = []
+    unrecognized_scores = []
+    for d, rejected, track in zip(detected, rejections, tracks or [None] * len(detected)):
+        out = {"bbox": list(d.bbox), "detection_score": d.score, "recognized": False}
+        if track is not None:
+            out["track_id"] = track.id
+        faces.append(out)
+        if rejected is not None:
+            out["quality_rejected"] = True
+            out["reason"] = rejected.reason
+            out["quality"] = rejected.to_dict()
+            continue
+        match = matches_by_face.get(id(d))
+        if match is not None and len(match):
+            out["similarity"] = match.best_score
+            out["margin"] = match.margin
+            out["candidates"] = candidates_to_dicts(match, gallery)
+        if match is not None and len(match) and match.best_score > RECOGNITION_THRESHOLD:
+            student = gallery.student(match.best_row)
+            out["recognized"] = True
+            out["student"] = {
+                "register_number": student['register_number'],
+                "full_name": student['full_name'],
+                "hostel_status": student.get('hostel_status') or 'unknown',
+            }
+            out["confidence_percentage"] = round(match.best_score * 100, 1)
+            recognized.append((out, student, match.best_score))
+        elif track is not None and not tracker.settled(track):
+            out["pending"] = True
+        else:
+            unrecognized_scores.append(out.get("similarity"))
+    return faces, recognized, unrecognized_scores
+
+async def recognize_all_faces(img_bytes: bytes, location: str) -> Dict:
+    """Embed every face in one frame as a batch and match each box (multi_face=true on /recognize_face/)"""
+    await ensure_gallery_loaded()
+    detected, rejections, matches_by_face, gallery = await run_cpu(match_all_faces, img_bytes)
+    if not detected:
+        return {
+            "success": False,
+            "message": "No face detected in the image",
+            "face_detected": False,
+            "faces": [],
+        }
+
+    faces, recognized, unrecognized_scores = face_results(detected, rejections, matches_by_face, gallery)
+    logged = set()
+    for out, student, similarity in recognized:
+        # The same student twice in one frame is logged once
+        if student['register_number'] not in logged:
+            logged.add(student['register_number'])
+            out["entry_logged"], out["attendance_logged"] = await run_in_threadpool(
+                record_recognized_entry, student, similarity, location
+            )
+            print(f"✅ STUDENT RECOGNIZED: {student['full_name']} ({student['register_number']}) "
+                  f"at {similarity:.2%}, box {out['bbox']}")
+
+    response = {
+        "success": True,
+        "face_detected": True,
+        "faces_detected": len(faces),
+        "recognized": sum(1 for f in faces if f["recognized"]),
+        "unrecognized": len(unrecognized_scores),
+        "quality_rejected": sum(1 for f in faces if f.get("quality_rejected")),
+        "threshold": RECOGNITION_THRESHOLD,
+        "students_checked": gallery.identities,
+        "location": location,
+        "faces": faces,
+    }
+    if unrecognized_scores:
+        print(f"\n🚨 [SECURITY] {len(unrecognized_scores)} unrecognized face(s) of {len(faces)} in frame at {location}")
+        best = max((score for score in unrecognized_scores if score is not None), default=None)
+        decision = await run_in_threadpool(handle_unauthorized_attempt, best, location)
+        response["security_decision"] = decision["decision"]
+        response["security_reason"] = decision["reason"]
+    return response
+
 @app.post("/recognize_face/")
-async def recognize_face(file: UploadFile = File(...), location: str = Form('Main Gate')):
-    """Recognize face from photo and log entry if match found"""
+async def recognize_face(file: UploadFile = File(...), location: str = Form('Main Gate'), multi_face: bool = Form(False)):
+    """Recognize face from photo and log entry if match found (multi_face=true: every face in the frame)"""
     try:
         img_bytes = await file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
-        face = preprocess_face(image)
-        if face is None:
+        if multi_face:
+            return await recognize_all_faces(img_bytes, location)
+
+        # Compare against the resident in-memory gallery (no database round trip)
+        await ensure_gallery_loaded()
+
+        # Decode, detection, quality gate, ArcFace and matching run on the CPU pool, off the event loop
+        detection, rejected, gallery, match = await run_cpu(recognize_upload, img_bytes)
+        if detection is None:
             return {
                 "success": False,
                 "message": "No face detected in the image",
                 "face_detected": False
             }
 
-        embedding = get_embedding(face)
-        
-        # Get all students with face embeddings (filter at database level)
-        students = get_all_students(limit=2000)
-        print(f"📊 Database query results:")
-        print(f"   Total students with face embeddings: {len(students)}")
-        
-        # Debug: Check the first few students
-        for i, student in enumerate(students[:3]):
-            print(f"   Student {i+1}: {student.get('register_number', 'N/A')} ({student.get('full_name', 'Unknown')}) - Face data: {type(student.get('face_embedding'))}")
-            if student.get('face_embedding'):
-                face_data = student['face_embedding']
-                if isinstance(face_data, list):
-                    print(f"     JSONB list length: {len(face_data)}")
-                    print(f"     First 3 values: {face_data[:3]}")
-                elif isinstance(face_data, str):
-                    print(f"     String length: {len(face_data)}")
-                    print(f"     First 50 chars: {face_data[:50]}...")
-                else:
-                    print(f"     Other type: {type(face_data)}")
-        
-        # All students returned should have face embeddings, but validate them
-        students_with_faces = []
-        students_with_face_data_count = 0
-        
-        for student in students:
-            face_data = student.get('face_embedding')
-            if face_data:  # Double-check since we filtered at DB level
-                # Additional check for valid data
-                if isinstance(face_data, list) and len(face_data) > 0:
-                    students_with_faces.append(student)
-                    students_with_face_data_count += 1
-                    print(f"   ✅ Student {student.get('register_number')} ({student.get('full_name', 'Unknown')}) has valid JSONB face data")
-                elif isinstance(face_data, str) and len(face_data) > 0:
-                    # Try to parse string as JSON array
-                    try:
-                        parsed_data = json.loads(face_data)
-                        if isinstance(parsed_data, list) and len(parsed_data) > 0:
-                            students_with_faces.append(student)
-                            students_with_face_data_count += 1
-                            print(f"   ✅ Student {student.get('register_number')} ({student.get('full_name', 'Unknown')}) has JSON string face data (length: {len(parsed_data)})")
-                        else:
-                            print(f"   ❌ Student {student.get('register_number')} has invalid JSON string data")
-                    except json.JSONDecodeError:
-                        # Legacy base64 string
-                        students_with_faces.append(student)
-                        students_with_face_data_count += 1
-                        print(f"   ✅ Student {student.get('register_number')} ({student.get('full_name', 'Unknown')}) has legacy base64 face data")
-                elif isinstance(face_data, bytes) and len(face_data) > 0:
-                    students_with_faces.append(student)
-                    students_with_face_data_count += 1
-                    print(f"   ✅ Student {student.get('register_number')} ({student.get('full_name', 'Unknown')}) has legacy bytes face data")
-                else:
-                    print(f"   ❌ Student {student.get('register_number')} has invalid face data: {type(face_data)}")
-        
-        print(f"📊 Face data summary: {students_with_face_data_count} students have valid face embeddings")
-        
+        # Unusable frames stop here: no inference, no security event
+        if rejected is not None:
+            return {
+                "success": False,
+                "face_detected": True,
+                "recognized": False,
+                "quality_rejected": True,
+                "reason": rejected.reason,
+                "quality": rejected.to_dict(),
+                "message": QUALITY_MESSAGES[rejected.reason],
+            }
+
         best_match = None
         best_similarity = 0.0
-        recognition_threshold = 0.75 # Threshold for face recognition
+        recognition_threshold = RECOGNITION_THRESHOLD
         
         print(f"🔍 Starting face recognition comparison...")
-        print(f"   Query embedding shape: {embedding.shape}")
-        print(f"   Students with face data: {len(students_with_faces)}")
+        print(f"   Query embedding shape: ({EMBEDDING_DIM},)")
+        print(f"   Students in gallery: {len(face_gallery)}")
         print(f"   Recognition threshold: {recognition_threshold}")
         
-        # Compare with all registered faces
-        comparison_count = 0
-        for student in students_with_faces:
-            try:
-                face_embedding_data = student.get('face_embedding')
-                if not face_embedding_data:
-                    continue
-                
-                comparison_count += 1
-                student_reg = student.get('register_number', 'unknown')
-                print(f"\n🔄 Comparing with student {student_reg} ({comparison_count}/{len(students_with_faces)})...")
-                
-                # Handle JSONB list format (current) and legacy formats
-                try:
-                    if isinstance(face_embedding_data, list):
-                        # JSONB list format (current)
-                        stored_embedding = np.array(face_embedding_data, dtype=np.float32)
-                    elif isinstance(face_embedding_data, str):
-                        # Try to parse as JSON array first
-                        try:
-                            parsed_data = json.loads(face_embedding_data)
-                            if isinstance(parsed_data, list):
-                                stored_embedding = np.array(parsed_data, dtype=np.float32)
-                                print(f"     Parsed JSON string to array with {len(parsed_data)} elements")
-                            else:
-                                raise ValueError("Parsed data is not a list")
-                        except (json.JSONDecodeError, ValueError):
-                            # Legacy base64 encoded data
-                            stored_embedding_bytes = decode_base64_embedding(face_embedding_data)
-                            if stored_embedding_bytes is None:
-                                print(f"Failed to decode base64 embedding for student {student.get('register_number', 'unknown')}")
-                                continue
-                            stored_embedding = np.frombuffer(stored_embedding_bytes, dtype=np.float32)
-                    elif isinstance(face_embedding_data, bytes):
-                        # Legacy raw bytes data
-                        stored_embedding = np.frombuffer(face_embedding_data, dtype=np.float32)
-                    else:
-                        print(f"Unknown embedding data type for student {student.get('register_number', 'unknown')}: {type(face_embedding_data)}")
-                        continue
-                    
-                    # Validate embedding size (should match query embedding size)
-                    if len(stored_embedding) != len(embedding):
-                        print(f"Embedding size mismatch for student {student.get('register_number', 'unknown')}: stored={len(stored_embedding)}, query={len(embedding)}")
-                        continue
-                        
-                except Exception as decode_error:
-                    print(f"Failed to process embedding for student {student.get('register_number', 'unknown')}: {decode_error}")
-                    continue
-                
-                # Calculate similarity
-                cosine_dist = cosine(stored_embedding, embedding)
-                similarity = 1 - cosine_dist
-                adjusted_similarity = similarity  # Adjustment as in original code
-                
-                print(f"   Similarity calculation:")
-                print(f"     Cosine distance: {cosine_dist:.6f}")
-                print(f"     Raw similarity: {similarity:.6f}")
-                print(f"     Adjusted similarity: {adjusted_similarity:.6f}")
-                print(f"     Above threshold ({recognition_threshold}): {adjusted_similarity > recognition_threshold}")
-                
-                if adjusted_similarity > best_similarity:
-                    print(f"     🎯 New best match! Previous best: {best_similarity:.6f}")
-                    best_similarity = adjusted_similarity
-                    best_match = student
-                else:
-                    print(f"     Current best remains: {best_similarity:.6f}")
-                    
-            except Exception as e:
-                print(f"Error comparing with student {student.get('register_number', 'unknown')}: {e}")
-                continue
+        if match is not None and len(match):
+            best_similarity = match.best_score
+            best_match = gallery.student(match.best_row)
+        candidates = candidates_to_dicts(match, gallery) if match is not None else []
+        margin = match.margin if match is not None else 0.0
         
         print(f"\n🏁 Face recognition completed:")
-        print(f"   Total comparisons: {comparison_count}")
-        print(f"   Best similarity: {best_similarity:.6f}")
+        print(f"   Total comparisons: {len(gallery)}")
+        print(f"   Best similarity: {best_similarity:.6f} (margin over runner-up: {margin:.6f})")
         print(f"   Recognition threshold: {recognition_threshold}")
         print(f"   Match found: {best_match is not None and best_similarity > recognition_threshold}")
         
@@ -1745,28 +2312,10 @@ async def recognize_face(file: UploadFile = File(...), location: str = Form('Mai
             print(f"   Confidence: {round(best_similarity * 100, 1)}%")
             print(f"   Location: {location}")
             
-            # Log entry for recognized student
-            entry_logged = log_entry(
-                register_number=best_match['register_number'],
-                student_name=best_match['full_name'],
-                entry_type='entry',
-                confidence_score=float(best_similarity),
-                location=location
+            entry_logged, attendance_logged = await run_in_threadpool(
+                record_recognized_entry, best_match, best_similarity, location
             )
             
-            # Log attendance (mark as present). marked_by must be a profile id, not student id.
-            system_profile_id = _get_system_profile_id_for_attendance()
-            attendance_logged = False
-            if system_profile_id:
-                attendance_logged = log_attendance(
-                    student_id=best_match['id'],
-                    marked_by=system_profile_id,
-                    status='present',
-                    notes=f'Auto-marked via face recognition (confidence: {best_similarity:.2%})'
-                )
-            else:
-                print("Skipping attendance log: no ATTENDANCE_SYSTEM_PROFILE_ID and no profile in DB.")
-            
             return {
                 "success": True,
                 "recognized": True,
@@ -1777,6 +2326,8 @@ async def recognize_face(file: UploadFile = File(...), location: str = Form('Mai
                 },
                 "similarity": float(best_similarity),
                 "confidence_percentage": round(best_similarity * 100, 1),
+                "margin": margin,
+                "candidates": candidates,
                 "location": location,
                 "entry_logged": entry_logged,
                 "attendance_logged": attendance_logged,
@@ -1788,76 +2339,21 @@ async def recognize_face(file: UploadFile = File(...), location: str = Form('Mai
             print(f"   Best similarity: {best_similarity:.4f} (threshold: {recognition_threshold})")
             print(f"   Location: {location}")
             
-            ts = datetime.now()
-            count_prev = get_attempt_count_last_5min(location)
-            attempt_count_last_5min = count_prev + 1  # include this attempt
-            print(f"   Previous attempts in last 5min: {count_prev}, total: {attempt_count_last_5min}")
-            
-            event = {
-                "timestamp": ts,
-                "face_match": False,
-                "confidence_score": float(best_similarity) if best_match else 0.0,
-                "person_id": None,
-                "gate_id": location,
-                "image_path": None,
-                "attempt_count_last_5min": attempt_count_last_5min,
-            }
-            print(f"   Calling security agent...")
-            try:
-                decision = security_agent(event)
-                severity = decision["decision"]
-                reason = decision["reason"]
-                reasoning = decision.get("reasoning") or ""
-                recommended_action = decision.get("recommended_action") or ""
-                
-                # Print agent decision for visibility
-                print(f"\n🤖 [SECURITY AGENT] Decision: {severity}")
-                print(f"   Reason: {reason}")
-                if reasoning:
-                    print(f"   AI Reasoning: {reasoning}")
-                if recommended_action:
-                    print(f"   Recommended Action: {recommended_action}\n")
-            except Exception as agent_err:
-                print(f"❌ [SECURITY AGENT] Error: {agent_err}")
-                import traceback
-                traceback.print_exc()
-                # Fallback to basic rule
-                severity = "medium_alert"
-                reason = f"Security agent error: {str(agent_err)}"
-                reasoning = ""
-                recommended_action = ""
-            
-            # Log incident (optional - skip if table doesn't exist)
-            try:
-                log_incident(
-                    gate_id=location,
-                    severity=severity,
-                    confidence_score=float(best_similarity) if best_match else None,
-                    image_path=None,
-                    attempt_count=attempt_count_last_5min,
-                    resolved=False,
-                )
-            except Exception as e:
-                print(f"[security] Skipping DB log (table may not exist): {e}")
-            
-            # ALWAYS send email (for testing agentic AI)
-            send_alert_email_async(
-                severity=severity,
-                timestamp=ts.isoformat(),
-                gate_id=location,
-                confidence_score=float(best_similarity) if best_match else None,
-                attempt_count=attempt_count_last_5min,
-                image_path=None,
-                reasoning=reasoning,
-                recommended_action=recommended_action,
+            decision = await run_in_threadpool(
+                handle_unauthorized_attempt, float(best_similarity) if best_match else None, location
             )
+            severity = decision["decision"]
+            reason = decision["reason"]
+            reasoning = decision["reasoning"]
+            recommended_action = decision["recommended_action"]
             out = {
                 "success": True,
                 "recognized": False,
                 "face_detected": True,  # IMPORTANT: Face WAS detected, just not recognized
                 "best_similarity": float(best_similarity) if best_match else 0.0,
                 "threshold": recognition_threshold,
-                "students_checked": len(students_with_faces),
+                "students_checked": gallery.identities,
+                "margin": margin,
                 "message": f"Face detected (similarity: {best_similarity:.2%}) but no matching student found (threshold: {recognition_threshold}).",
                 "security_decision": severity,
                 "security_reason": reason,
@@ -1877,8 +2373,342 @@ async def recognize_face(file: UploadFile = File(...), location: str = Form('Mai
             "message": "An error occurred during face recognition."
         }
 
+def match_uploads(blobs: List[tuple]):
+    """
+    CPU stage for /recognize_faces/batch: detect and quality-gate one face per image,
+    embed all usable faces in one ONNX batch and match them with one matrix-matrix product.
+    Returns (per-image results, [(index, detection)], matches, gallery view, stage timings in ms).
+    """
+    started = time.perf_counter()
+    results = []
+    faces = []
+    for index, (filename, img_bytes) in enumerate(blobs):
+        image = decode_image(img_bytes, max_side=DECODE_MAX_SIDE)
+        detection = detect_face(image)
+        results.append({
+            "index": index,
+            "filename": filename,
+            "face_detected": detection is not None,
+            "recognized": False,
+        })
+        if detection is not None:
+            results[-1]["bbox"] = list(detection.bbox)
+            rejected = rejected_quality(detection, decode_scale(img_bytes, image))
+            if rejected is not None:
+                results[-1]["quality_rejected"] = True
+                results[-1]["reason"] = rejected.reason
+            else:
+                faces.append((index, detection))
+    decoded = time.perf_counter()
+
+    embeddings = get_embeddings(face_inputs([detection for _, detection in faces], FACE_INPUT))
+    embedded = time.perf_counter()
+
+    gallery = face_gallery.view()
+    matches = []
+    if len(embeddings) and embeddings.shape[1] == face_gallery.dim:
+        gallery, matches = face_gallery.match_batch(embeddings, k=RECOGNITION_TOP_K)
+    elif len(embeddings):
+        print(f"Embedding size mismatch: gallery={face_gallery.dim}, query={embeddings.shape[1]}")
+    matched = time.perf_counter()
+    timing = {
+        "decode_detect": round((decoded - started) * 1000, 2),
+        "embed": round((embedded - decoded) * 1000, 2),
+        "match": round((matched - embedded) * 1000, 2),
+    }
+    return results, faces, matches, gallery, timing
+
+@app.post("/recognize_faces/batch")
+async def recognize_faces_batch(files: List[UploadFile] = File(...), location: str = Form('Main Gate')):
+    """
+    Recognize one face in each of several images (e.g. frames buffered by a gate kiosk).
+    All faces are embedded in one ONNX batch and matched with one matrix-matrix product.
+    Each recognized student is logged once per batch; the security agent runs once
+    when faces were seen but nobody was recognized.
+    """
+    if len(files) > RECOGNITION_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {RECOGNITION_BATCH_MAX} images per batch")
+    try:
+        blobs = [(upload.filename, await upload.read()) for upload in files]
+        await ensure_gallery_loaded()
+        started = time.perf_counter()
+        results, faces, matches, gallery, timing = await run_cpu(match_uploads, blobs)
+
+        # Best frame per recognized student, so a buffered burst logs one entry each
+        best_by_student: Dict[str, tuple] = {}
+        for (index, _), match in zip(faces, matches):
+            out = results[index]
+            out["similarity"] = match.best_score
+            out["margin"] = match.margin
+            out["candidates"] = candidates_to_dicts(match, gallery)
+            if len(match) and match.best_score > RECOGNITION_THRESHOLD:
+                student = gallery.student(match.best_row)
+                out["recognized"] = True
+                out["student"] = {
+                    "register_number": student['register_number'],
+                    "full_name": student['full_name'],
+                    "hostel_status": student.get('hostel_status') or 'unknown',
+                }
+                out["confidence_percentage"] = round(match.best_score * 100, 1)
+                previous = best_by_student.get(student['register_number'])
+                if previous is None or match.best_score > previous[1]:
+                    best_by_student[student['register_number']] = (student, match.best_score)
+
+        entries = []
+        for register_number, (student, similarity) in best_by_student.items():
+            entry_logged, attendance_logged = await run_in_threadpool(record_recognized_entry, student, similarity, location)
+            entries.append({
+                "register_number": register_number,
+                "full_name": student['full_name'],
+                "similarity": float(similarity),
+                "entry_logged": entry_logged,
+                "attendance_logged": attendance_logged,
+            })
+
+        response = {
+            "success": True,
+            "images": len(files),
+            "faces_detected": sum(1 for r in results if r["face_detected"]),
+            "quality_rejected": sum(1 for r in results if r.get("quality_rejected")),
+            "recognized": len(entries),
+            "threshold": RECOGNITION_THRESHOLD,
+            "students_checked": gallery.identities,
+            "location": location,
+            "results": results,
+            "entries": entries,
+            "timing_ms": timing,
+        }
+        if faces and not entries:
+            best = max((m.best_score for m in matches if len(m)), default=None)
+            print(f"\n🚨 [SECURITY] Unauthorized attempt detected in batch of {len(files)} images!")
+            decision = await run_in_threadpool(handle_unauthorized_attempt, best, location)
+            response["security_decision"] = decision["decision"]
+            response["security_reason"] = decision["reason"]
+        print(f"📦 Batch recognition: {len(files)} images, {len(faces)} faces, {len(entries)} students "
+              f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return response
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "An error occurred during batch face recognition."
+        }
+
+# Continuous streams: one entry/attendance log per student and one security-agent run per
+# unknown face per STREAM_EVENT_COOLDOWN seconds, instead of one per frame
+STREAM_EVENT_COOLDOWN = float(os.environ.get("STREAM_EVENT_COOLDOWN", "30"))
+STREAM_MAX_FRAME_BYTES = int(os.environ.get("STREAM_MAX_FRAME_BYTES", str(4 * 1024 * 1024)))
+stream_stats: Counter = Counter()
+
+# Motion gating: frames where nothing moved inside MOTION_ROI ("x0,y0,x1,y1" fractions of the
+# frame, empty = whole frame) skip detection; used by /ws/recognize and gate_worker.py
+MOTION_GATE = os.environ.get("MOTION_GATE", "true").strip().lower() in ("1", "true", "yes")
+MOTION_ROI = parse_roi(os.environ.get("MOTION_ROI", ""))
+MOTION_THRESHOLD = int(os.environ.get("MOTION_THRESHOLD", "25"))
+MOTION_MIN_AREA = float(os.environ.get("MOTION_MIN_AREA", "0.005"))
+MOTION_HOLD_S = float(os.environ.get("MOTION_HOLD_S", "2"))
+MOTION_REFRESH_S = float(os.environ.get("MOTION_REFRESH_S", "0"))
+
+def new_motion_gate() -> Optional[MotionGate]:
+    """Motion gate for one camera, or None when MOTION_GATE is off"""
+    if not MOTION_GATE:
+        return None
+    return MotionGate(
+        roi=MOTION_ROI,
+        threshold=MOTION_THRESHOLD,
+        min_area=MOTION_MIN_AREA,
+        hold_s=MOTION_HOLD_S,
+        refresh_s=MOTION_REFRESH_S,
+    )
+
+# Face tracking: a face seen on consecutive frames is embedded until its match is confident
+# (TRACK_CONFIDENT_SCORE) or TRACK_MAX_EMBEDS embeddings have been fused, then re-checked every
+# TRACK_RETRY_S seconds - a re-check that names someone else restarts the track under a new id;
+# other frames reuse the track's match (see streaming.tracker)
+FACE_TRACKING = os.environ.get("FACE_TRACKING", "true").strip().lower() in ("1", "true", "yes")
+TRACK_MAX_EMBEDS = int(os.environ.get("TRACK_MAX_EMBEDS", "3"))
+TRACK_RETRY_S = float(os.environ.get("TRACK_RETRY_S", "2"))
+TRACK_MAX_AGE_S = float(os.environ.get("TRACK_MAX_AGE_S", "1"))
+TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", "0.3"))
+TRACK_CONFIDENT_SCORE = float(os.environ.get("TRACK_CONFIDENT_SCORE", str(RECOGNITION_THRESHOLD)))
+
+def new_face_tracker() -> Optional[FaceTracker]:
+    """Face tracker for one camera, or None when FACE_TRACKING is off"""
+    if not FACE_TRACKING:
+        return None
+    return FaceTracker(
+        iou_threshold=TRACK_IOU_THRESHOLD,
+        max_age_s=TRACK_MAX_AGE_S,
+        max_embeds=TRACK_MAX_EMBEDS,
+        retry_s=TRACK_RETRY_S,
+        confident_score=TRACK_CONFIDENT_SCORE,
+    )
+
+def match_tracks(tracker: FaceTracker, tracks):
+    """Re-match the tracks whose embedding or gallery changed; returns the view their matches refer to"""
+    mismatched = next((t.fused for t in tracks if t.fused is not None and len(t.fused) != face_gallery.dim), None)
+    if mismatched is not None:
+        print(f"Embedding size mismatch: gallery={face_gallery.dim}, query={len(mismatched)}")
+        return face_gallery.view()
+    return tracker.refresh(tracks, face_gallery.view, lambda queries: face_gallery.match_batch(queries, k=RECOGNITION_TOP_K))
+
+def match_tracked_faces(img_bytes: bytes, tracker: FaceTracker):
+    """
+    match_all_faces for a continuous stream: faces are followed across frames by `tracker` and
+    only embedded while their track still needs it. Returns the match_all_faces tuple plus the
+    track of each detection.
+    """
+    image = decode_image(img_bytes, max_side=DECODE_MAX_SIDE)
+    detected = detect_faces(
+        detector_pool, image, max_faces=MAX_FACES_PER_FRAME, detect_max_side=DETECT_MAX_SIDE, alignment=FACE_ALIGNMENT
+    )
+    scale = decode_scale(img_bytes, image)
+    rejections = [rejected_quality(d, scale) for d in detected]
+    tracks = tracker.update([d.bbox for d in detected])
+    usable = [(d, t) for d, t, rejected in zip(detected, tracks, rejections) if rejected is None]
+    todo = [(d, t) for d, t in usable if tracker.claim(t)]
+    if todo:
+        embeddings = get_embeddings(face_inputs([d for d, _ in todo], FACE_INPUT))
+        for (_, track), embedding in zip(todo, embeddings):
+            tracker.add_embedding(track, embedding)
+    gallery = match_tracks(tracker, [t for _, t in usable])
+    matches = {id(d): t.match for d, t in usable if t.match is not None}
+    return detected, rejections, matches, gallery, tracks
+
+def frame_has_motion(gate: MotionGate, data: bytes) -> bool:
+    """Motion check on a 1/8-scale grayscale decode; undecodable frames go on to get a proper error"""
+    thumbnail = decode_thumbnail(data)
+    return thumbnail is None or gate.moving(thumbnail)
+
+@app.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket, location: str = 'Main Gate'):
+    """
+    Continuous recognition for gate cameras over one WebSocket.
+    The client sends JPEG/PNG frames as binary messages and gets one JSON "result" event per
+    processed frame (every face, as multi_face on /recognize_face/). While a frame is being
+    processed only the newest incoming frame is kept; older ones are dropped and counted in
+    each event, so results never lag behind the camera. With MOTION_GATE on, frames where
+    nothing moved are skipped without detection or an event (counted as motion_skipped).
+    With FACE_TRACKING on, each face carries a track_id and is only re-embedded while its
+    track still needs it (see match_tracked_faces); an unmatched face is reported as
+    "pending" rather than unrecognized until its track has TRACK_MAX_EMBEDS embeddings.
+    Text messages: "ping" -> {"type": "pong"}; {"type": "config", "location": "..."}.
+    """
+    await websocket.accept()
+    await ensure_gallery_loaded()
+    slot = LatestSlot()
+    cooldown = Cooldown(STREAM_EVENT_COOLDOWN)
+    motion_gate = new_motion_gate()
+    tracker = new_face_tracker()
+    send_lock = asyncio.Lock()
+    state = {"location": location}
+    stream_stats["connections"] += 1
+    stream_stats["active"] += 1
+
+    async def send(event: Dict) -> None:
+        async with send_lock:
+            await websocket.send_json(event)
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if data is not None:
+                    if len(data) > STREAM_MAX_FRAME_BYTES:
+                        stream_stats["oversized"] += 1
+                        await send({"type": "error", "message": f"Frame larger than {STREAM_MAX_FRAME_BYTES} bytes"})
+                        continue
+                    stream_stats["received"] += 1
+                    if slot.put(data):
+                        stream_stats["dropped"] += 1
+                    continue
+                text = (message.get("text") or "").strip()
+                if text == "ping":
+                    await send({"type": "pong"})
+                    continue
+                try:
+                    control = json.loads(text)
+                except ValueError:
+                    control = None
+                if isinstance(control, dict) and control.get("type") == "config":
+                    state["location"] = str(control.get("location") or state["location"])
+                    await send({"type": "config", "location": state["location"]})
+                else:
+                    await send({"type": "error", "message": "Expected binary frames, \"ping\" or a config message"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            slot.close()
+
+    receiver = asyncio.create_task(receive_frames())
+    print(f"📡 Stream opened at {state['location']}")
+    try:
+        while True:
+            frame = await slot.get()
+            if frame is None:
+                break
+            seq, data, received_at = frame
+            started = time.perf_counter()
+            if motion_gate is not None and not await run_cpu(frame_has_motion, motion_gate, data):
+                stream_stats["motion_skipped"] += 1
+                continue
+            try:
+                if tracker is not None:
+                    detected, rejections, matches_by_face, gallery, tracks = await run_cpu(match_tracked_faces, data, tracker)
+                else:
+                    detected, rejections, matches_by_face, gallery = await run_cpu(match_all_faces, data)
+                    tracks = [None] * len(detected)
+            except Exception as e:
+                stream_stats["errors"] += 1
+                await send({"type": "error", "frame": seq, "message": str(e)})
+                continue
+            faces, recognized, unrecognized_scores = face_results(detected, rejections, matches_by_face, gallery, tracks, tracker)
+            processed = time.perf_counter()
+            stream_stats["processed"] += 1
+
+            location_now = state["location"]
+            for out, student, similarity in recognized:
+                if cooldown.ready(student['register_number']):
+                    out["entry_logged"], out["attendance_logged"] = await run_in_threadpool(
+                        record_recognized_entry, student, similarity, location_now
+                    )
+                    print(f"✅ [STREAM] {student['full_name']} ({student['register_number']}) at {similarity:.2%}, {location_now}")
+            event = {
+                "type": "result",
+                "frame": seq,
+                "face_detected": bool(faces),
+                "faces": faces,
+                "recognized": len(recognized),
+                "unrecognized": len(unrecognized_scores),
+                "threshold": RECOGNITION_THRESHOLD,
+                "location": location_now,
+                "dropped": slot.dropped,
+                "motion_skipped": motion_gate.stats()["skipped"] if motion_gate is not None else 0,
+                "processing_ms": round((processed - started) * 1000, 2),
+                "latency_ms": round((processed - received_at) * 1000, 2),
+            }
+            if unrecognized_scores and cooldown.ready(("unknown", location_now)):
+                best = max((score for score in unrecognized_scores if score is not None), default=None)
+                print(f"\n🚨 [SECURITY] Unrecognized face in stream at {location_now}")
+                decision = await run_in_threadpool(handle_unauthorized_attempt, best, location_now)
+                event["security_decision"] = decision["decision"]
+                event["security_reason"] = decision["reason"]
+            await send(event)
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away mid-frame (send after close raises RuntimeError in Starlette)
+        pass
+    finally:
+        receiver.cancel()
+        stream_stats["active"] -= 1
+        skipped = motion_gate.stats()["skipped"] if motion_gate is not None else 0
+        tracked = f", {tracker.stats()['created']} face tracks / {tracker.embeds} embeddings" if tracker is not None else ""
+        print(f"📡 Stream closed at {state['location']}: {slot.received} frames, {slot.dropped} dropped, {skipped} without motion{tracked}")
+
 @app.get("/cleanup_embeddings")
-async def cleanup_invalid_embeddings():
+def cleanup_invalid_embeddings():
     """Clean up invalid face embeddings from the database"""
     try:
         students = get_all_students(limit=2000)
@@ -1898,7 +2728,7 @@ async def cleanup_invalid_embeddings():
                     # JSONB list format (current)
                     try:
                         embedding = np.array(embedding_data, dtype=np.float32)
-                        if len(embedding) != 512:
+                        if len(embedding) != EMBEDDING_DIM:
                             print(f"Invalid embedding size for {register_number}: {len(embedding)}")
                             invalid_count += 1
                             continue
@@ -1917,7 +2747,7 @@ async def cleanup_invalid_embeddings():
                     
                     try:
                         embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
-                        if len(embedding) != 512:
+                        if len(embedding) != EMBEDDING_DIM:
                             print(f"Invalid embedding size for {register_number}: {len(embedding)}")
                             invalid_count += 1
                             continue
@@ -1926,10 +2756,17 @@ async def cleanup_invalid_embeddings():
                         embedding_list = embedding.tolist()
                         supabase.table('students').update({
                             'face_embedding': embedding_list,
-                            'updated_at': datetime.now().isoformat()
+                            'updated_at': utc_timestamp()
                         }).eq('register_number', register_number).execute()
                         fixed_count += 1
                         print(f"Converted legacy embedding for {register_number} to JSONB format")
+                        face_gallery.upsert(
+                            register_number,
+                            embedding,
+                            student_id=student.get('id'),
+                            full_name=student.get('full_name'),
+                            hostel_status=student.get('hostel_status'),
+                        )
                         
                     except Exception as e:
                         print(f"Failed to decode embedding for {register_number}: {e}")
@@ -1940,7 +2777,7 @@ async def cleanup_invalid_embeddings():
                     # Legacy raw bytes data - convert to JSONB list
                     try:
                         embedding = np.frombuffer(embedding_data, dtype=np.float32)
-                        if len(embedding) != 512:
+                        if len(embedding) != EMBEDDING_DIM:
                             print(f"Invalid embedding size for {register_number}: {len(embedding)}")
                             invalid_count += 1
                             continue
@@ -1949,10 +2786,17 @@ async def cleanup_invalid_embeddings():
                         embedding_list = embedding.tolist()
                         supabase.table('students').update({
                             'face_embedding': embedding_list,
-                            'updated_at': datetime.now().isoformat()
+                            'updated_at': utc_timestamp()
                         }).eq('register_number', register_number).execute()
                         fixed_count += 1
                         print(f"Converted legacy embedding for {register_number} to JSONB format")
+                        face_gallery.upsert(
+                            register_number,
+                            embedding,
+                            student_id=student.get('id'),
+                            full_name=student.get('full_name'),
+                            hostel_status=student.get('hostel_status'),
+                        )
                         
                     except Exception as e:
                         print(f"Failed to decode raw bytes for {register_number}: {e}")
@@ -1983,11 +2827,11 @@ async def cleanup_invalid_embeddings():
         }
 
 @app.get("/test_embedding")
-async def test_embedding():
+def test_embedding():
     """Test endpoint to verify embedding conversion"""
     try:
         # Create a test embedding
-        test_embedding = np.random.rand(512).astype(np.float32)
+        test_embedding = np.random.rand(EMBEDDING_DIM).astype(np.float32)
         
         # Convert to JSONB list format
         embedding_list = test_embedding.tolist()
@@ -2010,7 +2854,7 @@ async def test_embedding():
         }
 
 @app.get("/api/students")
-async def get_students_endpoint(search: Optional[str] = None):
+def get_students_endpoint(search: Optional[str] = None):
     """Get all students from Supabase, optionally filtered by search term"""
     try:
         if search and search.strip():
@@ -2067,7 +2911,7 @@ async def get_students_endpoint(search: Optional[str] = None):
         raise HTTPException(status_code=500, detail=f"Failed to fetch students: {str(e)}")
 
 @app.get("/api/students/search")
-async def search_students_endpoint(query: str):
+def search_students_endpoint(query: str):
     """Search students by name or register number (dedicated search endpoint)"""
     try:
         if not query or not query.strip():
@@ -2115,7 +2959,7 @@ async def search_students_endpoint(query: str):
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 @app.get("/api/stats")
-async def get_dashboard_stats():
+def get_dashboard_stats():
     """Get dashboard statistics"""
     try:
         # Total students
@@ -2147,7 +2991,7 @@ async def get_dashboard_stats():
         }
 
 @app.get("/api/recent_entries")
-async def get_recent_entries(limit: int = 20):
+def get_recent_entries(limit: int = 20):
     """Get recent entry logs"""
     try:
         result = supabase.table('entry_logs').select('*').order('created_at', desc=True).limit(limit).execute()
@@ -2156,7 +3000,7 @@ async def get_recent_entries(limit: int = 20):
         raise HTTPException(status_code=500, detail=f"Failed to get recent entries: {str(e)}")
 
 @app.get("/api/attendance_today")
-async def get_attendance_today():
+def get_attendance_today():
     """Get today's attendance records"""
     try:
         today = date.today().isoformat()
@@ -2166,7 +3010,7 @@ async def get_attendance_today():
         raise HTTPException(status_code=500, detail=f"Failed to get today's attendance: {str(e)}")
 
 @app.get("/debug/students")
-async def debug_students(register_number: Optional[str] = None):
+def debug_students(register_number: Optional[str] = None):
     """Debug endpoint to check student data in database"""
     try:
         print("🔍 Debug: Checking student data...")
@@ -2246,7 +3090,19 @@ async def debug_students(register_number: Optional[str] = None):
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "face-recognition-api"}
+    return {
+        "status": "healthy",
+        "service": "face-recognition-api",
+        "gallery": face_gallery.stats(),
+        "gallery_sync_lag_s": gallery_sync.stats()["lag_s"],
+        "detector_pool": detector_pool.stats(),
+        "cpu_workers": RECOGNITION_WORKERS,
+        "upload_cache": upload_cache.stats() if upload_cache is not None else None,
+        "streams": dict(stream_stats),
+        "embedding_backend": embedding_backend.info(),
+        "inference_scheduler": embedding_scheduler.stats() if embedding_scheduler is not None else None,
+        "quality_rejections": dict(quality_rejections),
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,27 @@
+# Face gallery layer for the face recognition service
+# In-memory store of student embeddings and the vectorized matcher used on the recognition read path.
+
+from .store import FaceGallery, GalleryView, l2_normalize
+from .matcher import FUSION_MODES, MatchResult, fuse_scores, match_top_k, match_top_k_batch, top_k_from_scores, candidates_to_dicts
+from .ann import IVFIndex
+from .quantize import STORAGE_DTYPES
+from .snapshot import open_snapshot, write_snapshot
+from .sync import GallerySync
+
+__all__ = [
+    "FaceGallery",
+    "GalleryView",
+    "l2_normalize",
+    "MatchResult",
+    "FUSION_MODES",
+    "fuse_scores",
+    "match_top_k",
+    "match_top_k_batch",
+    "top_k_from_scores",
+    "candidates_to_dicts",
+    "IVFIndex",
+    "STORAGE_DTYPES",
+    "open_snapshot",
+    "write_snapshot",
+    "GallerySync",
+]
@@ -0,0 +1,232 @@
+"""
+Approximate nearest-neighbour index for very large galleries (IVF, pure numpy).
+
+Templates are clustered with spherical k-means into `nlist` inverted lists; a
+query is scored against the centroids first and only the `nprobe` closest
+lists are scanned exactly. Supports incremental add/remove (registrations and
+deactivations) and save/load to a single .npz file.
+
+Tune `nlist` / `nprobe` with scripts/bench_ann.py.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows scored per block during k-means assignment (bounds peak memory)
+_ASSIGN_CHUNK = 8192
+
+
+def _auto_nlist(n: int) -> int:
+    return int(max(1, min(n, round(4 * np.sqrt(max(n, 1))))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (max dot product) for every row."""
+    out = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], _ASSIGN_CHUNK):
+        block = vectors[start:start + _ASSIGN_CHUNK]
+        out[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    max_train: int = 100_000,
+    seed: int = 0,
+) -> np.ndarray:
+    """Unit-norm centroids (nlist, D) for L2-normalized `vectors`."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    train = vectors
+    if n > max_train:
+        train = vectors[rng.choice(n, size=max_train, replace=False)]
+    nlist = max(1, min(nlist, train.shape[0]))
+    centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random training points
+            sums[empty] = train[rng.choice(train.shape[0], size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized vectors keyed by string
+    (register_number). Inner product == cosine similarity.
+    """
+
+    def __init__(self, dim: int, nlist: Optional[int] = None, nprobe: int = 8):
+        self.dim = int(dim)
+        self.nlist = nlist
+        self.nprobe = int(nprobe)
+        self.centroids: Optional[np.ndarray] = None
+        self._keys: List[List[str]] = []
+        self._vectors: List[np.ndarray] = []
+        self._where: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def keys(self) -> List[str]:
+        """Indexed keys, grouped by inverted list."""
+        with self._lock:
+            return [key for lst in self._keys for key in lst]
+
+    def items(self) -> Tuple[List[str], np.ndarray]:
+        """(keys, (N, dim) vectors) in the same order as keys() - a copy of the index contents."""
+        with self._lock:
+            return self._items_locked()
+
+    def _items_locked(self) -> Tuple[List[str], np.ndarray]:
+        keys = [key for lst in self._keys for key in lst]
+        vectors = np.concatenate(self._vectors, axis=0) if self._vectors else np.zeros((0, self.dim), np.float32)
+        return keys, vectors
+
+    def _reset_lists(self, nlist: int) -> None:
+        self._keys = [[] for _ in range(nlist)]
+        self._vectors = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(nlist)]
+        self._where = {}
+
+    def build(self, keys: Sequence[str], vectors: np.ndarray, retrain: bool = False) -> None:
+        """
+        (Re)populate the index from scratch. Centroids are kept from a previous
+        build/load unless `retrain` is set or there are none yet.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            if not retrain and self.centroids is not None and self.nlist is None:
+                # Centroids trained on a much smaller/larger gallery no longer fit
+                wanted = _auto_nlist(vectors.shape[0])
+                have = self.centroids.shape[0]
+                retrain = have * 2 < wanted or have > wanted * 2
+            if retrain or self.centroids is None or self.centroids.shape[1] != self.dim:
+                if vectors.shape[0] == 0:
+                    self.centroids = None
+                    self._reset_lists(0)
+                    return
+                nlist = self.nlist or _auto_nlist(vectors.shape[0])
+                self.centroids = spherical_kmeans(vectors, nlist)
+            nlist = self.centroids.shape[0]
+            self._reset_lists(nlist)
+            if vectors.shape[0] == 0:
+                return
+            labels = _assign(vectors, self.centroids)
+            order = np.argsort(labels, kind="stable")
+            bounds = np.searchsorted(labels[order], np.arange(nlist + 1))
+            for lst in range(nlist):
+                members = order[bounds[lst]:bounds[lst + 1]]
+                self._vectors[lst] = vectors[members]
+                self._keys[lst] = [keys[i] for i in members]
+                for i in members:
+                    self._where[keys[i]] = lst
+
+    def add(self, key: str, vector: np.ndarray) -> None:
+        """Insert or replace one vector. Untrained indexes become a single list."""
+        vec = np.asarray(vector, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            self._remove_locked(key)
+            if self.centroids is None:
+                self.centroids = vec.copy()
+                self._reset_lists(1)
+            lst = int(np.argmax(self.centroids @ vec[0]))
+            self._vectors[lst] = np.concatenate([self._vectors[lst], vec], axis=0)
+            self._keys[lst].append(key)
+            self._where[key] = lst
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            return self._remove_locked(key)
+
+    def _remove_locked(self, key: str) -> bool:
+        lst = self._where.pop(key, None)
+        if lst is None:
+            return False
+        pos = self._keys[lst].index(key)
+        del self._keys[lst][pos]
+        self._vectors[lst] = np.delete(self._vectors[lst], pos, axis=0)
+        return True
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> Tuple[List[str], np.ndarray]:
+        """Approximate top-k: (keys best first, float32 scores)."""
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        keys: List[str] = []
+        scores: List[np.ndarray] = []
+        with self._lock:
+            if self.centroids is None or len(self) == 0:
+                return [], np.empty(0, dtype=np.float32)
+            nlist = self.centroids.shape[0]
+            nprobe = max(1, min(nprobe or self.nprobe, nlist))
+            coarse = self.centroids @ q
+            probe = np.argpartition(coarse, nlist - nprobe)[nlist - nprobe:] if nprobe < nlist else np.arange(nlist)
+            for lst in probe:
+                vecs = self._vectors[lst]
+                if vecs.shape[0] == 0:
+                    continue
+                scores.append(vecs @ q)
+                keys.extend(self._keys[lst])
+        if not keys:
+            return [], np.empty(0, dtype=np.float32)
+        all_scores = np.concatenate(scores)
+        k = min(k, all_scores.shape[0])
+        top = np.argpartition(all_scores, all_scores.shape[0] - k)[all_scores.shape[0] - k:]
+        top = top[np.argsort(all_scores[top])[::-1]]
+        return [keys[i] for i in top], all_scores[top]
+
+    def save(self, path: str) -> None:
+        """Write centroids and inverted lists to `path` (.npz)."""
+        with self._lock:
+            nlist = 0 if self.centroids is None else self.centroids.shape[0]
+            sizes = np.array([len(k) for k in self._keys], dtype=np.int64)
+            keys, vectors = self._items_locked()
+            tmp = path + ".tmp.npz"
+            np.savez(
+                tmp,
+                dim=np.int64(self.dim),
+                nprobe=np.int64(self.nprobe),
+                centroids=self.centroids if nlist else np.zeros((0, self.dim), np.float32),
+                sizes=sizes,
+                keys=np.array(keys, dtype=str),
+                vectors=vectors,
+            )
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(int(data["dim"]), nprobe=int(data["nprobe"]))
+            centroids = data["centroids"]
+            sizes = data["sizes"]
+            keys = data["keys"].tolist()
+            vectors = data["vectors"]
+        if centroids.shape[0] == 0:
+            return index
+        index.centroids = centroids.astype(np.float32)
+        index.nlist = centroids.shape[0]
+        index._reset_lists(centroids.shape[0])
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        for lst in range(centroids.shape[0]):
+            lo, hi = int(offsets[lst]), int(offsets[lst + 1])
+            index._vectors[lst] = vectors[lo:hi]
+            index._keys[lst] = keys[lo:hi]
+            for key in index._keys[lst]:
+                index._where[key] = lst
+        return index
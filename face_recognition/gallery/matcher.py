@@ -0,0 +1,189 @@
+"""
+Vectorized top-k matcher: score one query embedding against every gallery
+template with a single matrix-vector product (or a batch of queries with one
+matrix-matrix product).
+
+Gallery rows are L2-normalized, so the dot product equals cosine similarity
+(the old per-student `1 - scipy.spatial.distance.cosine`). Compact (float16 /
+int8) galleries are scored in float32 and the top candidates rescored on
+dequantized rows, see gallery.quantize.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from . import quantize
+
+
+@dataclass(frozen=True)
+class MatchResult:
+    """Top-k candidates, best first. `margin` is best minus second-best score."""
+
+    rows: np.ndarray    # (k,) int gallery row indices
+    scores: np.ndarray  # (k,) float32 cosine similarities
+
+    @property
+    def best_row(self) -> int:
+        return int(self.rows[0]) if len(self.rows) else -1
+
+    @property
+    def best_score(self) -> float:
+        return float(self.scores[0]) if len(self.scores) else 0.0
+
+    @property
+    def margin(self) -> float:
+        if len(self.scores) == 0:
+            return 0.0
+        if len(self.scores) == 1:
+            return float(self.scores[0])
+        return float(self.scores[0] - self.scores[1])
+
+    def __len__(self) -> int:
+        return int(len(self.rows))
+
+
+def _normalize_query(query: np.ndarray) -> np.ndarray:
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(q))
+    return q / norm if norm > 0 else q
+
+
+def top_k_from_scores(scores: np.ndarray, k: int) -> MatchResult:
+    """Pick the k best of a 1-D score vector (argpartition, then sort only those k)."""
+    n = scores.shape[0]
+    k = max(0, min(int(k), n))
+    if k == 0:
+        return MatchResult(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    if k < n:
+        rows = np.argpartition(scores, n - k)[n - k:]
+    else:
+        rows = np.arange(n)
+    rows = rows[np.argsort(scores[rows])[::-1]]
+    return MatchResult(rows.astype(np.int64), scores[rows].astype(np.float32))
+
+
+FUSION_MODES = ("max", "mean")
+
+
+def fuse_scores(scores: np.ndarray, identity: np.ndarray, n_identities: int, mode: str = "max") -> np.ndarray:
+    """Per-identity score from per-template scores: max or mean over each identity's templates."""
+    if mode == "mean":
+        sums = np.bincount(identity, weights=scores, minlength=n_identities)
+        counts = np.bincount(identity, minlength=n_identities)
+        return (sums / np.maximum(counts, 1)).astype(np.float32)
+    if mode != "max":
+        raise ValueError(f"Unknown fusion mode {mode!r} (expected one of {FUSION_MODES})")
+    fused = np.full(n_identities, -np.inf, dtype=np.float32)
+    np.maximum.at(fused, identity, scores)
+    return fused
+
+
+def _rank(
+    scores: np.ndarray,
+    matrix: np.ndarray,
+    q: np.ndarray,
+    k: int,
+    scales: Optional[np.ndarray],
+    rescore: int,
+    identity: Optional[np.ndarray],
+    representative: Optional[np.ndarray],
+    fusion: str,
+) -> MatchResult:
+    """Top-k from one query's coarse scores: exact rescoring for compact storage, then fusion."""
+    if matrix.dtype != np.float32:
+        shortlist = top_k_from_scores(scores, max(k, rescore))
+        rows = shortlist.rows
+        templates = quantize.decode(matrix[rows], None if scales is None else scales[rows])
+        norms = np.linalg.norm(templates, axis=1)
+        norms[norms == 0] = 1.0
+        exact = ((templates @ q) / norms).astype(np.float32)
+        if identity is None:
+            result = top_k_from_scores(exact, k)
+            return MatchResult(rows[result.rows], result.scores)
+        # The caller's scores stay the coarse ones (batch rows are views of one array)
+        scores = scores.copy()
+        scores[rows] = exact
+
+    if identity is None:
+        return top_k_from_scores(scores, k)
+    fused = fuse_scores(scores, identity, representative.shape[0], fusion)
+    result = top_k_from_scores(fused, k)
+    return MatchResult(representative[result.rows], result.scores)
+
+
+def match_top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    k: int = 5,
+    scales: Optional[np.ndarray] = None,
+    rescore: int = 32,
+    identity: Optional[np.ndarray] = None,
+    representative: Optional[np.ndarray] = None,
+    fusion: str = "max",
+) -> MatchResult:
+    """
+    Score `query` (D,) against `matrix` (N, D) of L2-normalized rows and
+    return the k best rows. The query is normalized here.
+
+    `matrix` may be float32, float16 or int8 codes (with per-row `scales`);
+    for compact storage the best max(k, rescore) rows of the coarse pass are
+    rescored exactly against their dequantized, re-normalized templates.
+
+    When students hold several templates, `identity` maps each row to its
+    identity index and `representative` each identity to one of its rows;
+    template scores are then fused per identity (`fusion` = "max" | "mean")
+    and the returned rows are the identities' representative rows.
+    """
+    if matrix.shape[0] == 0:
+        return top_k_from_scores(np.empty(0, dtype=np.float32), k)
+    q = _normalize_query(query)
+    if q.shape[0] != matrix.shape[1]:
+        raise ValueError(f"query size {q.shape[0]} != gallery dim {matrix.shape[1]}")
+    scores = quantize.scores(matrix, q, scales)
+    return _rank(scores, matrix, q, k, scales, rescore, identity, representative, fusion)
+
+
+def match_top_k_batch(
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int = 5,
+    scales: Optional[np.ndarray] = None,
+    rescore: int = 32,
+    identity: Optional[np.ndarray] = None,
+    representative: Optional[np.ndarray] = None,
+    fusion: str = "max",
+) -> List[MatchResult]:
+    """
+    `match_top_k` for a stack of queries (B, D): the gallery is scored with one
+    matrix-matrix product, so it is streamed through the cache once per batch
+    instead of once per query. Returns one MatchResult per query, in order.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim != 2:
+        raise ValueError(f"queries must be (B, D), got shape {queries.shape}")
+    if matrix.shape[0] == 0:
+        return [top_k_from_scores(np.empty(0, dtype=np.float32), k) for _ in range(queries.shape[0])]
+    if queries.shape[1] != matrix.shape[1]:
+        raise ValueError(f"query size {queries.shape[1]} != gallery dim {matrix.shape[1]}")
+    norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    queries = queries / norms
+    scores = quantize.scores_batch(matrix, queries, scales)
+    return [
+        _rank(scores[i], matrix, queries[i], k, scales, rescore, identity, representative, fusion)
+        for i in range(queries.shape[0])
+    ]
+
+
+def candidates_to_dicts(result: MatchResult, gallery_view) -> List[dict]:
+    """Render a MatchResult as JSON-friendly dicts using a GalleryView for names."""
+    out = []
+    for row, score in zip(result.rows, result.scores):
+        out.append({
+            "register_number": gallery_view.register_numbers[row],
+            "full_name": gallery_view.full_names[row],
+            "similarity": float(score),
+        })
+    return out
@@ -0,0 +1,74 @@
+"""
+Compact gallery storage: float16, or int8 with a per-vector scale.
+
+Templates are stored compactly but always scored in float32: the coarse pass
+converts the gallery block by block (so no full float32 copy is ever made),
+and the top candidates are rescored on dequantized, re-normalized rows.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time during the coarse pass (keeps the temp in cache)
+_SCORE_CHUNK = 1024
+
+
+def encode(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode float32 rows for storage. Returns (codes, scales); scales is a
+    (N,) float32 array for int8 and None otherwise.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=-1) / 127.0 if matrix.size else np.zeros(matrix.shape[:-1], np.float32)
+        scales = np.asarray(scales, dtype=np.float32)
+        safe = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.rint(matrix / safe[..., None]).clip(-127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown gallery storage dtype {dtype!r} (expected one of {STORAGE_DTYPES})")
+
+
+def decode(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """float32 rows back from stored codes."""
+    out = codes.astype(np.float32)
+    if scales is not None:
+        out *= scales[..., None]
+    return out
+
+
+def scores(codes: np.ndarray, q: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Dot product of every stored row with float32 query `q`, accumulated in float32."""
+    if codes.dtype == np.float32:
+        return codes @ q
+    out = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], _SCORE_CHUNK):
+        block = codes[start:start + _SCORE_CHUNK]
+        np.matmul(block.astype(np.float32), q, out=out[start:start + block.shape[0]])
+    if scales is not None:
+        out *= scales
+    return out
+
+
+def scores_batch(codes: np.ndarray, queries: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """(B, N) dot products of every stored row with each float32 query row (B, D)."""
+    out = np.empty((queries.shape[0], codes.shape[0]), dtype=np.float32)
+    if codes.dtype == np.float32:
+        np.matmul(queries, codes.T, out=out)
+    else:
+        for start in range(0, codes.shape[0], _SCORE_CHUNK):
+            block = codes[start:start + _SCORE_CHUNK]
+            np.matmul(queries, block.astype(np.float32).T, out=out[:, start:start + block.shape[0]])
+    if scales is not None:
+        out *= scales
+    return out
+
+
+def nbytes(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> int:
+    return int(codes.nbytes + (scales.nbytes if scales is not None else 0))
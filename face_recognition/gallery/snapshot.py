@@ -0,0 +1,150 @@
+"""
+Versioned on-disk gallery snapshot shared by every worker on a box.
+
+Layout in the snapshot directory:
+    gallery-v<N>.npy          raw (N, D) matrix in the gallery storage dtype
+    gallery-v<N>.scales.npy   per-row scales (int8 storage only)
+    gallery-v<N>.json         ids / register numbers / names / statuses sidecar
+    manifest.json             points at the current version
+
+Workers open the matrix with np.memmap (via np.load(mmap_mode="r")), so startup
+takes milliseconds and all workers share the same pages through the OS page
+cache instead of each holding a private copy.
+
+The sharing lasts until a worker's gallery first changes: FaceGallery.apply
+(sync deltas, enrollments, removals) builds a new private matrix, so from then
+on that worker holds its own copy, as if it had loaded from Supabase. A worker
+whose gallery changed writes a new snapshot on shutdown, and the next start
+maps it. The sidecar keeps the sync watermark, so a snapshot of any age is
+usable: the worker maps it and lets gallery.sync catch up on the rows changed
+since. `FaceGallery.stats()["mapped"]` tells whether a worker is still on the
+mapped matrix.
+
+Several workers may write at once (e.g. all of them shutting down); each
+claims its version number by creating that version's sidecar exclusively.
+"""
+
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+# Older versions kept on disk so workers still mapping them are unaffected
+KEEP_VERSIONS = 2
+
+
+def _paths(directory: str, version: int) -> Dict[str, str]:
+    base = os.path.join(directory, f"gallery-v{version}")
+    return {"matrix": base + ".npy", "scales": base + ".scales.npy", "meta": base + ".json"}
+
+
+def _atomic_write_json(path: str, payload: Dict[str, Any]) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path: str, array: np.ndarray) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp, path)
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _claim_version(directory: str, version: int) -> int:
+    """First version from `version` on whose sidecar this process could create (replaced once written)."""
+    while True:
+        try:
+            os.close(os.open(_paths(directory, version)["meta"], os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return version
+        except FileExistsError:
+            version += 1
+
+
+def write_snapshot(directory: str, view, dtype: str, extra: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Persist a GalleryView as a new snapshot version and point the manifest at
+    it. Returns the new version number.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory) or {}
+    version = _claim_version(directory, int(manifest.get("version", 0)) + 1)
+    paths = _paths(directory, version)
+
+    _atomic_save_npy(paths["matrix"], view.matrix)
+    if view.scales is not None:
+        _atomic_save_npy(paths["scales"], view.scales)
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "dtype": dtype,
+        "dim": int(view.matrix.shape[1]),
+        "count": len(view),
+        "created_at": time.time(),
+        "student_ids": [None if v is None else str(v) for v in view.student_ids],
+        "register_numbers": [str(v) for v in view.register_numbers],
+        "full_names": [v or "" for v in view.full_names],
+        "hostel_statuses": [v or "unknown" for v in view.hostel_statuses],
+        **(extra or {}),
+    }
+    _atomic_write_json(paths["meta"], meta)
+    _atomic_write_json(os.path.join(directory, MANIFEST), {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "created_at": meta["created_at"],
+        **(extra or {}),
+    })
+
+    # Prune old versions (POSIX keeps unlinked files alive for existing maps)
+    for old in glob.glob(os.path.join(directory, "gallery-v*.json")):
+        try:
+            old_version = int(os.path.basename(old)[len("gallery-v"):-len(".json")])
+        except ValueError:
+            continue
+        if old_version <= version - KEEP_VERSIONS:
+            for p in _paths(directory, old_version).values():
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+    return version
+
+
+def open_snapshot(directory: str) -> Optional[Dict[str, Any]]:
+    """
+    Open the current snapshot read-only. Returns the sidecar metadata with
+    "matrix" (np.memmap) and "scales" (np.memmap or None) added, or None when
+    there is no usable snapshot.
+    """
+    manifest = read_manifest(directory)
+    if not manifest or manifest.get("format") != SNAPSHOT_FORMAT:
+        return None
+    paths = _paths(directory, int(manifest["version"]))
+    try:
+        with open(paths["meta"], encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.load(paths["matrix"], mmap_mode="r")
+        scales = np.load(paths["scales"], mmap_mode="r") if os.path.exists(paths["scales"]) else None
+    except (OSError, ValueError) as e:
+        print(f"[gallery.snapshot] Could not open snapshot v{manifest.get('version')}: {e}")
+        return None
+    if matrix.shape[0] != len(meta["register_numbers"]):
+        print(f"[gallery.snapshot] Snapshot v{meta['version']} is inconsistent; ignoring")
+        return None
+    meta["matrix"] = matrix
+    meta["scales"] = scales
+    return meta
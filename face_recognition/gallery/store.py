@@ -0,0 +1,463 @@
+"""
+Resident face gallery: every active student's templates held in memory as one
+contiguous matrix of L2-normalized rows, plus parallel id/name arrays. Rows are
+float32 by default, or float16 / int8 + per-row scale (see gallery.quantize).
+
+Built once at startup and patched whenever a student row changes, so the
+recognition read path never has to query Supabase.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import quantize
+from .matcher import FUSION_MODES, MatchResult, fuse_scores, match_top_k, match_top_k_batch, top_k_from_scores
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """Return float32 copy of `vectors` with each row scaled to unit L2 norm."""
+    out = np.array(vectors, dtype=np.float32, copy=True)
+    norms = np.linalg.norm(out, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    out /= norms
+    return out
+
+
+# hostel_status of students whose row has none (load, sync and upserts alike)
+DEFAULT_HOSTEL_STATUS = "unknown"
+
+# Separator between register_number and template number in ANN keys
+_KEY_SEP = "\x1f"
+
+
+def template_key(register_number: str, template: int) -> str:
+    """ANN index key of one template ("<register_number>" for the first)."""
+    return register_number if template == 0 else f"{register_number}{_KEY_SEP}{template}"
+
+
+def split_template_key(key: str) -> Tuple[str, int]:
+    reg, sep, t = key.rpartition(_KEY_SEP)
+    return (reg, int(t)) if sep else (key, 0)
+
+
+@dataclass(frozen=True)
+class GalleryView:
+    """
+    Immutable snapshot of the gallery. A request grabs one view and uses it
+    throughout, so concurrent upserts/removals never change rows under it.
+
+    Each row is one template; a student with several templates has several
+    rows sharing the same register_number and student fields.
+    """
+
+    matrix: np.ndarray            # (N, D) float32 / float16 / int8 codes, rows L2-normalized
+    student_ids: np.ndarray       # (N,) object
+    register_numbers: np.ndarray  # (N,) object
+    full_names: np.ndarray        # (N,) object
+    hostel_statuses: np.ndarray   # (N,) object
+    version: int
+    rows: Dict[str, List[int]] = field(default_factory=dict)  # register_number -> template rows
+    scales: Optional[np.ndarray] = None  # (N,) float32 per-row scale for int8 codes
+    identity: Optional[np.ndarray] = None        # (N,) identity index per row; None if one template each
+    representative: Optional[np.ndarray] = None  # (M,) first row of each identity
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @property
+    def identities(self) -> int:
+        return len(self.rows)
+
+    def student(self, row: int) -> Dict[str, Any]:
+        """Student fields for gallery row `row` (same keys as a `students` row)."""
+        return {
+            "id": self.student_ids[row],
+            "register_number": self.register_numbers[row],
+            "full_name": self.full_names[row],
+            "hostel_status": self.hostel_statuses[row],
+        }
+
+
+def _make_view(matrix, scales, student_ids, register_numbers, full_names, hostel_statuses, version) -> GalleryView:
+    rows: Dict[str, List[int]] = {}
+    for i, reg in enumerate(register_numbers):
+        rows.setdefault(reg, []).append(i)
+    identity = representative = None
+    if len(rows) != len(register_numbers):
+        identity = np.empty(len(register_numbers), dtype=np.int64)
+        representative = np.empty(len(rows), dtype=np.int64)
+        for j, members in enumerate(rows.values()):
+            identity[members] = j
+            representative[j] = members[0]
+    return GalleryView(
+        matrix=matrix,
+        scales=scales,
+        student_ids=student_ids,
+        register_numbers=register_numbers,
+        full_names=full_names,
+        hostel_statuses=hostel_statuses,
+        version=version,
+        rows=rows,
+        identity=identity,
+        representative=representative,
+    )
+
+
+def _empty_view(dim: int, dtype: str = "float32", version: int = 0) -> GalleryView:
+    codes, scales = quantize.encode(np.zeros((0, dim), dtype=np.float32), dtype)
+    empty = np.empty(0, dtype=object)
+    return _make_view(codes, scales, empty, empty, empty, empty, version)
+
+
+def _object_column(values: Iterable[Any]) -> np.ndarray:
+    values = list(values)
+    col = np.empty(len(values), dtype=object)
+    col[:] = values
+    return col
+
+
+def _template_matrix(embedding: Any, dim: int) -> np.ndarray:
+    """(T, D) float32 from one embedding (D,) or a stack of templates (T, D)."""
+    arr = np.asarray(embedding, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr.reshape(1, -1)
+    if arr.ndim != 2 or arr.shape[1] != dim or arr.shape[0] == 0:
+        raise ValueError(f"embedding shape {arr.shape} does not match gallery dim {dim}")
+    return arr
+
+
+def _template_keys(register_numbers: Iterable[str]) -> List[str]:
+    seen: Dict[str, int] = {}
+    keys = []
+    for reg in register_numbers:
+        t = seen.get(reg, 0)
+        seen[reg] = t + 1
+        keys.append(template_key(reg, t))
+    return keys
+
+
+class FaceGallery:
+    """
+    Thread-safe in-memory gallery keyed by register_number.
+
+    Writers (load/upsert/remove) build new arrays under a lock and swap the
+    published view; readers call `view()` and never block.
+
+    Students may hold several templates; `match()` scores every template in
+    one pass and fuses them per student with `fusion` ("max" or "mean").
+
+    An optional ANN index (gallery.ann.IVFIndex) can be attached; it is kept in
+    step with every write and used by `match()` once the gallery has at least
+    `ann_min_size` rows.
+
+    `dtype` selects the storage of the gallery matrix: "float32", "float16"
+    (2x smaller) or "int8" with per-row scale (~4x smaller).
+    """
+
+    def __init__(
+        self,
+        dim: int = 512,
+        index=None,
+        ann_min_size: int = 50_000,
+        dtype: str = "float32",
+        fusion: str = "max",
+    ):
+        if dtype not in quantize.STORAGE_DTYPES:
+            raise ValueError(f"Unknown gallery storage dtype {dtype!r} (expected one of {quantize.STORAGE_DTYPES})")
+        if fusion not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode {fusion!r} (expected one of {FUSION_MODES})")
+        self.dim = int(dim)
+        self.dtype = dtype
+        self.fusion = fusion
+        self._lock = threading.Lock()
+        self._view = _empty_view(self.dim, self.dtype)
+        self.index = index
+        self.ann_min_size = int(ann_min_size)
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def view(self) -> GalleryView:
+        return self._view
+
+    def load(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        Replace the whole gallery. Each entry needs `register_number` and
+        `embedding`, either one template (D,) or several (T, D); `id`,
+        `full_name` and `hostel_status` are carried along for the response.
+        Entries with the wrong embedding size are skipped. Returns the number
+        of students loaded.
+        """
+        by_reg: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            try:
+                templates = _template_matrix(entry.get("embedding"), self.dim)
+            except ValueError as e:
+                print(f"[gallery] Skipping {entry.get('register_number')}: {e}")
+                continue
+            by_reg[entry["register_number"]] = {**entry, "embedding": templates}
+
+        regs, blocks = [], []
+        for reg, entry in by_reg.items():
+            regs.extend([reg] * entry["embedding"].shape[0])
+            blocks.append(entry["embedding"])
+        matrix = l2_normalize(np.concatenate(blocks, axis=0)) if blocks else np.zeros((0, self.dim), np.float32)
+        codes, scales = quantize.encode(matrix, self.dtype)
+
+        def column(key: str, default: Any = None) -> np.ndarray:
+            # Same rule as apply(): a missing or null field takes the default
+            return _object_column(by_reg[reg].get(key) or default for reg in regs)
+
+        with self._lock:
+            self._view = _make_view(
+                codes,
+                scales,
+                column("id"),
+                _object_column(regs),
+                column("full_name", ""),
+                column("hostel_status", DEFAULT_HOSTEL_STATUS),
+                version=self._view.version + 1,
+            )
+            if self.index is not None:
+                self.index.build(_template_keys(regs), matrix)
+            self.loaded = True
+        print(f"[gallery] Loaded {len(by_reg)} students / {len(regs)} templates (dim={self.dim})")
+        return len(by_reg)
+
+    def install(
+        self,
+        matrix: np.ndarray,
+        scales: Optional[np.ndarray],
+        student_ids: Iterable[Any],
+        register_numbers: Iterable[str],
+        full_names: Iterable[str],
+        hostel_statuses: Iterable[str],
+    ) -> int:
+        """
+        Publish already-encoded rows (e.g. a memory-mapped snapshot) as the
+        gallery without copying the matrix. The pages stay shared only until
+        the first upsert/remove/apply, which copies the kept rows into a new
+        private matrix (see gallery.snapshot).
+        """
+        if matrix.ndim != 2 or matrix.shape[1] != self.dim:
+            raise ValueError(f"snapshot matrix shape {matrix.shape} does not match gallery dim {self.dim}")
+        if np.dtype(matrix.dtype).name != self.dtype:
+            raise ValueError(f"snapshot dtype {matrix.dtype} does not match gallery dtype {self.dtype}")
+
+        regs = _object_column(register_numbers)
+        with self._lock:
+            self._view = _make_view(
+                matrix,
+                scales,
+                _object_column(student_ids),
+                regs,
+                _object_column(full_names),
+                _object_column(hostel_statuses),
+                version=self._view.version + 1,
+            )
+            if self.index is not None:
+                self.index.build(_template_keys(regs), quantize.decode(matrix, scales))
+            self.loaded = True
+        print(f"[gallery] Installed {self._view.identities} students / {len(regs)} templates from snapshot "
+              f"(dim={self.dim}, dtype={self.dtype})")
+        return self._view.identities
+
+    def apply(
+        self,
+        upserts: Iterable[Dict[str, Any]] = (),
+        removals: Iterable[str] = (),
+    ) -> Dict[str, int]:
+        """
+        Apply a batch of changes with a single copy of the arrays. Each upsert
+        needs `register_number` and `embedding` ((D,) or (T, D) templates,
+        replacing all of that student's templates); `id`, `full_name` and
+        `hostel_status` are optional (None keeps the current value). A
+        register_number in both lists is upserted. Returns
+        {"upserted": n, "removed": n} counted in students.
+        """
+        prepared: Dict[str, Dict[str, Any]] = {}
+        for entry in upserts:
+            prepared[entry["register_number"]] = {**entry, "embedding": _template_matrix(entry["embedding"], self.dim)}
+        removals = [reg for reg in set(removals) if reg not in prepared]
+        if not prepared and not removals:
+            return {"upserted": 0, "removed": 0}
+
+        new_regs: List[str] = []
+        blocks = []
+        for reg, entry in prepared.items():
+            new_regs.extend([reg] * entry["embedding"].shape[0])
+            blocks.append(entry["embedding"])
+        normalized = l2_normalize(np.concatenate(blocks, axis=0)) if blocks else np.zeros((0, self.dim), np.float32)
+        codes, code_scales = quantize.encode(normalized, self.dtype)
+
+        with self._lock:
+            old = self._view
+            removed = [reg for reg in removals if reg in old.rows]
+            replaced = [reg for reg in prepared if reg in old.rows]
+            drop = [row for reg in removed + replaced for row in old.rows[reg]]
+
+            # Keep existing student fields where an upsert leaves them as None
+            for reg in replaced:
+                first = old.rows[reg][0]
+                entry = prepared[reg]
+                for key, col in (("id", old.student_ids), ("full_name", old.full_names), ("hostel_status", old.hostel_statuses)):
+                    if entry.get(key) is None:
+                        entry[key] = col[first]
+
+            keep = np.ones(len(old), dtype=bool)
+            keep[drop] = False
+
+            def column(key: str, default: Any) -> np.ndarray:
+                return _object_column(prepared[reg].get(key) or default for reg in new_regs)
+
+            matrix = np.concatenate([np.asarray(old.matrix[keep]), codes], axis=0)
+            scales = None if old.scales is None else np.concatenate([np.asarray(old.scales[keep]), code_scales])
+            self._view = _make_view(
+                matrix,
+                scales,
+                np.concatenate([old.student_ids[keep], column("id", None)]),
+                np.concatenate([old.register_numbers[keep], _object_column(new_regs)]),
+                np.concatenate([old.full_names[keep], column("full_name", "")]),
+                np.concatenate([old.hostel_statuses[keep], column("hostel_status", DEFAULT_HOSTEL_STATUS)]),
+                version=old.version + 1,
+            )
+            if self.index is not None:
+                for reg in removed + replaced:
+                    for t in range(len(old.rows[reg])):
+                        self.index.remove(template_key(reg, t))
+                for key, vec in zip(_template_keys(new_regs), normalized):
+                    self.index.add(key, vec)
+        return {"upserted": len(prepared), "removed": len(removed)}
+
+    def upsert(
+        self,
+        register_number: str,
+        embedding: np.ndarray,
+        student_id: Any = None,
+        full_name: Optional[str] = None,
+        hostel_status: Optional[str] = None,
+    ) -> None:
+        """Insert or replace one student's template(s)."""
+        self.apply(upserts=[{
+            "register_number": register_number,
+            "embedding": embedding,
+            "id": student_id,
+            "full_name": full_name,
+            "hostel_status": hostel_status,
+        }])
+
+    def remove(self, register_number: str) -> bool:
+        """Drop a student from the gallery. Returns False if they were not in it."""
+        return self.apply(removals=[register_number])["removed"] > 0
+
+    def _use_ann(self, view: GalleryView) -> bool:
+        return self.index is not None and len(view) >= self.ann_min_size
+
+    def _match_ann(self, view: GalleryView, query: np.ndarray, k: int) -> MatchResult:
+        """
+        Top-k students among the index's candidates. Every template of a
+        candidate student is scored from the view and fused with `self.fusion`,
+        exactly as match_top_k does, so results do not depend on whether the
+        gallery has passed `ann_min_size`.
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(q))
+        q = q / norm if norm > 0 else q
+        # Over-fetch so fusion still has k distinct students to choose from
+        keys, _ = self.index.search(q, k * 4)
+        candidates = list(dict.fromkeys(reg for reg, _ in map(split_template_key, keys) if reg in view.rows))
+        if not candidates:
+            return top_k_from_scores(np.empty(0, dtype=np.float32), k)
+
+        members = [view.rows[reg] for reg in candidates]
+        rows = np.concatenate(members)
+        templates = quantize.decode(np.asarray(view.matrix[rows]), None if view.scales is None else view.scales[rows])
+        norms = np.linalg.norm(templates, axis=1)
+        norms[norms == 0] = 1.0
+        scores = ((templates @ q) / norms).astype(np.float32)
+        identity = np.repeat(np.arange(len(candidates)), [len(m) for m in members])
+        result = top_k_from_scores(fuse_scores(scores, identity, len(candidates), self.fusion), k)
+        return MatchResult(np.array([members[i][0] for i in result.rows], dtype=np.int64), result.scores)
+
+    def match(self, query: np.ndarray, k: int = 5) -> Tuple[GalleryView, MatchResult]:
+        """
+        Top-k students for `query` in the current view: exact matmul over every
+        template (fused per student), or the ANN index when one is attached and
+        the gallery is large enough. Returned rows are each student's first row.
+        """
+        view = self._view
+        if self._use_ann(view):
+            return view, self._match_ann(view, query, k)
+        return view, match_top_k(
+            view.matrix,
+            query,
+            k,
+            scales=view.scales,
+            identity=view.identity,
+            representative=view.representative,
+            fusion=self.fusion,
+        )
+
+    def verify(self, register_number: str, query: np.ndarray) -> Optional[float]:
+        """
+        1:1 score of `query` against one student's templates, fused with
+        `self.fusion` like match(). None when the student is not in the gallery.
+        """
+        view = self._view
+        rows = view.rows.get(register_number)
+        if not rows:
+            return None
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        if q.shape[0] != self.dim:
+            raise ValueError(f"query size {q.shape[0]} != gallery dim {self.dim}")
+        norm = float(np.linalg.norm(q))
+        q = q / norm if norm > 0 else q
+        templates = quantize.decode(np.asarray(view.matrix[rows]), None if view.scales is None else view.scales[rows])
+        norms = np.linalg.norm(templates, axis=1)
+        norms[norms == 0] = 1.0
+        scores = ((templates @ q) / norms).astype(np.float32)
+        return float(fuse_scores(scores, np.zeros(len(rows), dtype=np.int64), 1, self.fusion)[0])
+
+    def match_batch(self, queries: np.ndarray, k: int = 5) -> Tuple[GalleryView, List[MatchResult]]:
+        """
+        `match()` for a stack of queries (B, D) against one view, scored with a
+        single matrix-matrix product. Returns one MatchResult per query.
+        """
+        view = self._view
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if self._use_ann(view):
+            return view, [self._match_ann(view, q, k) for q in queries]
+        return view, match_top_k_batch(
+            view.matrix,
+            queries,
+            k,
+            scales=view.scales,
+            identity=view.identity,
+            representative=view.representative,
+            fusion=self.fusion,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        v = self._view
+        return {
+            "loaded": self.loaded,
+            "size": v.identities,
+            "templates": len(v),
+            "dim": self.dim,
+            "version": v.version,
+            "dtype": self.dtype,
+            "fusion": self.fusion,
+            "bytes": quantize.nbytes(v.matrix, v.scales),
+            # Still serving the memory-mapped snapshot (no change applied since it was installed)
+            "mapped": isinstance(v.matrix, np.memmap),
+            "ann": None if self.index is None else {
+                "size": len(self.index),
+                "nlist": 0 if self.index.centroids is None else int(self.index.centroids.shape[0]),
+                "nprobe": self.index.nprobe,
+                "active": len(v) >= self.ann_min_size,
+            },
+        }
@@ -0,0 +1,145 @@
+"""
+Incremental gallery synchronisation driven by `students.updated_at`.
+
+A background thread polls only the rows changed since the last watermark and
+applies them to the resident gallery: active rows with a readable embedding
+are upserted, anything else (deactivated, embedding cleared) is removed.
+
+Runs in a daemon thread so it never blocks the recognition request path.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class GallerySync:
+    """
+    Poll `fetch_changes(since, after_register_number, limit)` every
+    `interval` seconds.
+
+    `fetch_changes` returns student rows (id, register_number, full_name,
+    hostel_status, face_embedding, is_active, updated_at) strictly after the
+    (updated_at, register_number) cursor, ordered by both; a None `since`
+    means from the beginning. `parse_templates` turns a student row into its
+    float32 templates, (D,) or (T, D), or None when it has no usable face.
+    """
+
+    def __init__(
+        self,
+        gallery,
+        fetch_changes: Callable[[Optional[str], Optional[str], int], List[Dict[str, Any]]],
+        parse_templates: Callable[[Dict[str, Any]], Optional[np.ndarray]],
+        interval: float = 5.0,
+        page_size: int = 500,
+    ):
+        self.gallery = gallery
+        self.fetch_changes = fetch_changes
+        self.parse_templates = parse_templates
+        self.interval = float(interval)
+        self.page_size = int(page_size)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Keyset cursor: last applied (updated_at, register_number)
+        self.watermark: Optional[str] = None
+        self._after_register_number: Optional[str] = None
+        self.polls = 0
+        self.errors = 0
+        self.total_upserts = 0
+        self.total_removals = 0
+        self.last_rows = 0
+        self.last_sync_at: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def reset(self, watermark: Optional[str]) -> None:
+        """Start from `watermark` (e.g. after a full load or snapshot)."""
+        with self._lock:
+            self.watermark = watermark
+            self._after_register_number = None
+            self.last_sync_at = time.time()
+
+    def poll(self) -> int:
+        """Fetch and apply every change since the watermark. Returns rows applied."""
+        with self._lock:
+            started = time.time()
+            applied = 0
+            try:
+                while True:
+                    rows = self.fetch_changes(self.watermark, self._after_register_number, self.page_size)
+                    applied += self._apply(rows)
+                    if rows and rows[-1].get("updated_at") is not None:
+                        self.watermark = rows[-1]["updated_at"]
+                        self._after_register_number = rows[-1].get("register_number")
+                    if len(rows) < self.page_size:
+                        break
+                self.last_error = None
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"[gallery.sync] poll failed: {e}")
+                return applied
+            finally:
+                self.polls += 1
+                self.last_duration = time.time() - started
+            self.last_rows = applied
+            self.last_sync_at = started
+            return applied
+
+    def _apply(self, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        upserts, removals = [], []
+        for row in rows:
+            reg = row.get("register_number")
+            if not reg:
+                continue
+            embedding = self.parse_templates(row) if row.get("is_active", True) else None
+            if embedding is not None and embedding.shape[-1] == self.gallery.dim:
+                upserts.append({**row, "embedding": embedding})
+            else:
+                removals.append(reg)
+        result = self.gallery.apply(upserts=upserts, removals=removals)
+        self.total_upserts += result["upserted"]
+        self.total_removals += result["removed"]
+        if result["upserted"] or result["removed"]:
+            print(f"[gallery.sync] +{result['upserted']} upserted, -{result['removed']} removed")
+        return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="gallery-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval_s": self.interval,
+            "watermark": self.watermark,
+            "lag_s": None if self.last_sync_at is None else round(now - self.last_sync_at, 3),
+            "last_sync_at": self.last_sync_at,
+            "last_duration_ms": None if self.last_duration is None else round(self.last_duration * 1000, 2),
+            "last_rows": self.last_rows,
+            "polls": self.polls,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "total_upserts": self.total_upserts,
+            "total_removals": self.total_removals,
+        }
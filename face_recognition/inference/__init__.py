@@ -0,0 +1,37 @@
+# Inference layer for the face recognition service
+# Embedding backends (ArcFace ONNX, MobileFaceNet TFLite), session setup, batching and the upload cache shared by every endpoint that embeds faces.
+
+from .cache import UploadCache, content_key
+from .binding import BoundSession, embedding_buffer, normalize_rows
+from .scheduler import MicroBatchScheduler
+from .variants import MODEL_VARIANTS, resolve_variant, variant_path
+from .session import EXECUTION_MODES, OPTIMIZATION_LEVELS, SessionSettings, create_session, settings_from_env
+from .backends import (
+    BACKENDS,
+    MOBILEFACENET_INPUT,
+    ArcFaceOnnxBackend,
+    EmbeddingBackend,
+    MobileFaceNetTFLiteBackend,
+)
+
+__all__ = [
+    "BoundSession",
+    "embedding_buffer",
+    "normalize_rows",
+    "MicroBatchScheduler",
+    "EXECUTION_MODES",
+    "OPTIMIZATION_LEVELS",
+    "SessionSettings",
+    "create_session",
+    "settings_from_env",
+    "MODEL_VARIANTS",
+    "resolve_variant",
+    "variant_path",
+    "BACKENDS",
+    "MOBILEFACENET_INPUT",
+    "EmbeddingBackend",
+    "ArcFaceOnnxBackend",
+    "MobileFaceNetTFLiteBackend",
+    "UploadCache",
+    "content_key",
+]
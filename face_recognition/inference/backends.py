@@ -0,0 +1,187 @@
+"""
+Embedding backends behind get_embedding.
+
+A backend turns a (B, 112, 112, 3) float32 stack of aligned faces - laid out
+as its `input_spec` says - into L2-normalized (B, dim) embeddings, written
+into a caller buffer or this thread's reusable one (see binding.embedding_buffer).
+
+    arcface-onnx          ArcFace via ONNX Runtime (tuned session, IO binding,
+                          optional INT8/FP16 variant); 512-d, the default
+    mobilefacenet-tflite  MobileFaceNet via the TFLite interpreter
+                          (output_model.tflite); far fewer FLOPs for
+                          low-power gates
+
+Embeddings from different backends live in different spaces: students have to
+be re-registered after a deployment switches backend (templates of another
+dimension are skipped when the gallery loads).
+"""
+
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from vision.align import ARCFACE_INPUT, FaceInputSpec
+
+from .binding import BoundSession, embedding_buffer, normalize_rows
+from .session import SessionSettings, create_session
+
+BACKENDS = ("arcface-onnx", "mobilefacenet-tflite")
+
+# MobileFaceNet_Optimized.py: BGR crop, x / 127.5 - 1
+MOBILEFACENET_INPUT = FaceInputSpec(rgb=False, mean=127.5, scale=1.0 / 127.5)
+
+
+class EmbeddingBackend(ABC):
+    """Interface every backend implements."""
+
+    name = "base"
+    dim: int = 0
+    batched: bool = False               # one call can take B > 1 faces
+    input_spec: FaceInputSpec = ARCFACE_INPUT
+
+    @abstractmethod
+    def embed(self, faces: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """L2-normalized (B, dim) embeddings of `faces`, in `out` when given."""
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "dim": self.dim, "batched": self.batched}
+
+    def close(self) -> None:
+        pass
+
+    def _output(self, faces: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        if out is None:
+            return embedding_buffer(len(faces), self.dim)
+        if out.shape != (len(faces), self.dim) or out.dtype != np.float32:
+            raise ValueError(f"out must be a float32 array of shape {(len(faces), self.dim)}")
+        return out
+
+
+class ArcFaceOnnxBackend(EmbeddingBackend):
+    """ArcFace ONNX export run by ONNX Runtime under `settings` (see inference.session)."""
+
+    name = "arcface-onnx"
+
+    def __init__(
+        self,
+        model_path: str,
+        settings: SessionSettings = SessionSettings(),
+        io_binding: bool = True,
+        providers=("CPUExecutionProvider",),
+    ):
+        self.model_path = model_path
+        self.settings = settings
+        self.session, self.session_info = create_session(model_path, settings, providers=providers)
+        self.input = self.session.get_inputs()[0]
+        output_names = [o.name for o in self.session.get_outputs()]
+        self.output_name = "embedding" if "embedding" in output_names else output_names[0]
+        shape = self.session.get_outputs()[output_names.index(self.output_name)].shape
+        # Exports with a fixed batch of 1 have to be run face by face
+        self.batched = not (self.input.shape and self.input.shape[0] == 1)
+        self.dim = int(shape[-1]) if shape and isinstance(shape[-1], int) else 512
+
+        self.bound: Optional[BoundSession] = None
+        if io_binding:
+            try:
+                self.bound = BoundSession(self.session, self.input.name, self.output_name, batched=self.batched)
+                self.dim = self.bound.dim
+            except ValueError as e:
+                print(f"[inference.backends] IO binding disabled: {e}")
+
+    def embed(self, faces: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.bound is not None:
+            return self.bound.run(faces, out)
+        out = self._output(faces, out)
+        if self.batched:
+            outputs = self.session.run([self.output_name], {self.input.name: faces})[0]
+            np.copyto(out, np.asarray(outputs, dtype=np.float32).reshape(len(faces), -1))
+        else:
+            for i in range(len(faces)):
+                outputs = self.session.run([self.output_name], {self.input.name: faces[i:i + 1]})[0]
+                np.copyto(out[i], np.asarray(outputs, dtype=np.float32).reshape(-1))
+        return normalize_rows(out)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **super().info(),
+            **self.settings.to_dict(),
+            **self.session_info,
+            "input": {"name": self.input.name, "shape": self.input.shape, "type": self.input.type},
+            "output": self.output_name,
+            "io_binding": self.bound is not None,
+        }
+
+
+def _tflite_interpreter_class():
+    """Interpreter from the lightest installed runtime: tflite-runtime, LiteRT, then TensorFlow."""
+    for module in ("tflite_runtime.interpreter", "ai_edge_litert.interpreter"):
+        try:
+            return importlib.import_module(module).Interpreter
+        except ImportError:
+            continue
+    import tensorflow as tf
+
+    return tf.lite.Interpreter
+
+
+class MobileFaceNetTFLiteBackend(EmbeddingBackend):
+    """
+    MobileFaceNet TFLite model. A TFLite interpreter must not be shared between
+    threads, so each thread that embeds gets its own (batch 1, `num_threads`
+    kernel threads); rows of a batch are run one after another.
+    """
+
+    name = "mobilefacenet-tflite"
+
+    def __init__(self, model_path: str, num_threads: int = 1, input_spec: FaceInputSpec = MOBILEFACENET_INPUT):
+        self.model_path = model_path
+        self.num_threads = max(1, int(num_threads))
+        self.input_spec = input_spec
+        self._interpreter_class = _tflite_interpreter_class()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._interpreters = 0
+
+        interpreter, input_index, _, _ = self._interpreter()
+        detail = next(d for d in interpreter.get_input_details() if d["index"] == input_index)
+        if detail["dtype"] != np.float32:
+            raise ValueError(f"{model_path}: expected a float32 input, got {detail['dtype'].__name__} (quantized-input models are not supported)")
+        self.input_shape = tuple(int(d) for d in detail["shape"])
+        self.dim = int(np.prod(interpreter.get_output_details()[0]["shape"][1:]))
+
+    def _interpreter(self):
+        state = getattr(self._local, "state", None)
+        if state is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            input_detail = interpreter.get_input_details()[0]
+            if list(input_detail["shape"][:1]) != [1]:
+                interpreter.resize_tensor_input(input_detail["index"], [1] + list(input_detail["shape"][1:]))
+            interpreter.allocate_tensors()
+            output_index = interpreter.get_output_details()[0]["index"]
+            # tensor() returns a view getter; calling it after invoke reads the output without a copy
+            state = self._local.state = (interpreter, input_detail["index"], output_index, interpreter.tensor(output_index))
+            with self._lock:
+                self._interpreters += 1
+        return state
+
+    def embed(self, faces: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        out = self._output(faces, out)
+        interpreter, input_index, _, output = self._interpreter()
+        for i in range(len(faces)):
+            interpreter.set_tensor(input_index, faces[i:i + 1])
+            interpreter.invoke()
+            np.copyto(out[i], output().reshape(-1))
+        return normalize_rows(out)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **super().info(),
+            "model": self.model_path,
+            "input_shape": self.input_shape,
+            "num_threads": self.num_threads,
+            "interpreters": self._interpreters,
+            "runtime": self._interpreter_class.__module__,
+        }
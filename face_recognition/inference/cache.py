@@ -0,0 +1,113 @@
+"""
+Content-hash cache for per-upload work, with single-flight.
+
+Kiosks retry on timeout and the dashboard sends one captured blob to several
+endpoints, so the same bytes are decoded, detected and embedded again and
+again. Results are kept in a bounded LRU keyed by a BLAKE2b hash of the
+upload, each entry expiring `ttl` seconds after it was computed. When an
+identical upload arrives while the first is still being processed, it waits
+for that computation instead of starting its own.
+
+Cached values are shared between requests: treat them as read-only.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def content_key(data: bytes) -> bytes:
+    """128-bit BLAKE2b digest of `data` (hashes at memory speed, no practical collisions)."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class UploadCache:
+    """
+    LRU of at most `max_entries` values, each valid for `ttl` seconds.
+
+    `get_or_compute(key, compute)` returns (value, status) where status is
+    "hit" (cached), "shared" (waited on an identical in-flight computation)
+    or "miss" (computed here). Exceptions are not cached; every waiter of a
+    failed computation gets the exception.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl)
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[0]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], "hit"
+                del self._entries[key]
+                self.expirations += 1
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not owner:
+            return future.result(), "shared"
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.errors += 1
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value, "miss"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.shared
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "in_flight": len(self._inflight),
+                "hits": self.hits,
+                "shared": self.shared,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.shared) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "errors": self.errors,
+            }
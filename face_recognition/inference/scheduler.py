@@ -0,0 +1,237 @@
+"""
+Dynamic micro-batching in front of the ArcFace session.
+
+Concurrent requests each embed one or a few faces; run one by one, every
+ONNX call pays the full per-call overhead and leaves most of the CPU's SIMD
+width idle. Callers here enqueue their face tensors and block on a future; a
+single dispatcher thread takes the oldest pending item, keeps collecting until
+`max_batch` faces are queued or the oldest item has waited `max_wait_ms`, runs
+one batched call and hands each caller its rows.
+
+The wait is measured from when the oldest item was enqueued, so items that
+piled up while the previous batch ran are dispatched at once - under load the
+batch size grows on its own and an idle service adds at most `max_wait_ms`.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class _Pending:
+    __slots__ = ("faces", "out", "future", "enqueued")
+
+    def __init__(self, faces: np.ndarray, out: Optional[np.ndarray]):
+        self.faces = faces
+        self.out = out
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatchScheduler:
+    """
+    Coalesce `run_batch(faces) -> (n, D)` calls from many threads.
+
+    `embed(faces, out)` takes an (n, H, W, C) stack and returns its (n, D)
+    rows, copied into `out` when given (else a new array); the stack must stay
+    unchanged until the call returns (it is copied into the batch buffer by the
+    dispatcher). `run_batch` may return a buffer it reuses - rows are copied
+    out before the next batch runs. Items larger than `max_batch` run on their
+    own.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch: int = 32,
+        max_wait_ms: float = 2.0,
+        name: str = "arcface-batcher",
+    ):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.run_batch = run_batch
+        self.max_batch = int(max_batch)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue: "queue.SimpleQueue[Optional[_Pending]]" = queue.SimpleQueue()
+        self._carry: Optional[_Pending] = None
+        self._buffer: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.pending = 0
+        self.max_pending = 0
+        self.requests = 0
+        self.batches = 0
+        self.dispatched = 0
+        self.faces = 0
+        self.max_batch_seen = 0
+        self.batch_sizes: Dict[int, int] = {}
+        self.wait_time = 0.0
+        self.max_wait_seen = 0.0
+        self.run_time = 0.0
+        self.errors = 0
+
+    # ------------------------------------------------------------------ callers
+
+    def submit(self, faces: np.ndarray, out: Optional[np.ndarray] = None) -> Future:
+        """Queue an (n, H, W, C) stack; the future resolves to its (n, D) outputs (`out` when given)."""
+        item = _Pending(faces, out)
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("inference scheduler is stopped")
+            self.pending += len(faces)
+            self.max_pending = max(self.max_pending, self.pending)
+            self.requests += 1
+        self.start()
+        self._queue.put(item)
+        return item.future
+
+    def embed(self, faces: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Blocking `submit`: (n, D) outputs for `faces`."""
+        return self.submit(faces, out).result()
+
+    # --------------------------------------------------------------- dispatcher
+
+    def _next(self, timeout: Optional[float]) -> Optional[_Pending]:
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        if timeout is None:
+            return self._queue.get()
+        if timeout <= 0:
+            return self._queue.get_nowait()
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self) -> Optional[List[_Pending]]:
+        """Block for the oldest item, then gather more until full or its deadline. None = stop."""
+        first = self._next(None)
+        if first is None:
+            return None
+        batch = [first]
+        size = len(first.faces)
+        deadline = first.enqueued + self.max_wait
+        while size < self.max_batch:
+            try:
+                item = self._next(deadline - time.perf_counter())
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop requested: run what we have, then exit on the next loop
+                self._queue.put(None)
+                break
+            if size + len(item.faces) > self.max_batch:
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item.faces)
+        return batch
+
+    def _stack(self, batch: List[_Pending], size: int) -> np.ndarray:
+        if len(batch) == 1:
+            return batch[0].faces
+        shape = batch[0].faces.shape[1:]
+        if self._buffer is None or self._buffer.shape[1:] != shape or self._buffer.dtype != batch[0].faces.dtype:
+            self._buffer = np.empty((self.max_batch,) + shape, dtype=batch[0].faces.dtype)
+        offset = 0
+        for item in batch:
+            n = len(item.faces)
+            self._buffer[offset:offset + n] = item.faces
+            offset += n
+        return self._buffer[:size]
+
+    def _dispatch(self, batch: List[_Pending]) -> None:
+        started = time.perf_counter()
+        size = sum(len(item.faces) for item in batch)
+        waits = [started - item.enqueued for item in batch]
+        try:
+            outputs = self.run_batch(self._stack(batch, size))
+            error = None
+        except Exception as e:
+            outputs = None
+            error = e
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.pending -= size
+            self.batches += 1
+            self.dispatched += len(batch)
+            self.faces += size
+            self.max_batch_seen = max(self.max_batch_seen, size)
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+            self.wait_time += sum(waits)
+            self.max_wait_seen = max(self.max_wait_seen, max(waits))
+            self.run_time += elapsed
+            if error is not None:
+                self.errors += 1
+
+        if error is not None:
+            print(f"[inference.scheduler] batch of {size} failed: {error}")
+        offset = 0
+        for item in batch:
+            n = len(item.faces)
+            if error is not None:
+                item.future.set_exception(error)
+            else:
+                try:
+                    if item.out is not None:
+                        np.copyto(item.out, outputs[offset:offset + n])
+                        item.future.set_result(item.out)
+                    else:
+                        item.future.set_result(outputs[offset:offset + n].copy())
+                except Exception as e:
+                    item.future.set_exception(e)
+            offset += n
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                break
+            self._dispatch(batch)
+
+    # ---------------------------------------------------------------- lifecycle
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Finish queued work, then stop the dispatcher; later submits raise RuntimeError."""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "queue_depth": self.pending,
+                "max_queue_depth": self.max_pending,
+                "requests": self.requests,
+                "batches": self.batches,
+                "faces": self.faces,
+                "avg_batch_size": round(self.faces / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "avg_wait_ms": round(1000 * self.wait_time / self.dispatched, 3) if self.dispatched else 0.0,
+                "max_wait_ms_seen": round(1000 * self.max_wait_seen, 3),
+                "avg_run_ms": round(1000 * self.run_time / self.batches, 3) if self.batches else 0.0,
+                "errors": self.errors,
+            }
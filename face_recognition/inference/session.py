@@ -0,0 +1,139 @@
+"""
+ONNX Runtime session construction with explicit threading and a cached
+optimized model.
+
+A default InferenceSession sizes its intra-op pool to every core, so several
+service workers (or several request threads running the session at once) on
+one box oversubscribe the CPU, and each start re-runs graph optimization on
+the raw export. Sessions built here take explicit intra-/inter-op thread
+counts, execution mode and optimization level. On the first start the
+optimized graph is written to a cache file named after a hash of the model
+bytes, the ORT version and the machine; later starts load that file with
+optimization switched off.
+"""
+
+import hashlib
+import os
+import platform
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence
+
+EXECUTION_MODES = ("sequential", "parallel")
+OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+
+
+@dataclass(frozen=True)
+class SessionSettings:
+    intra_op_threads: int = 0          # 0 = ORT default (one per physical core)
+    inter_op_threads: int = 0          # only used in parallel mode
+    execution_mode: str = "sequential"
+    optimization: str = "all"
+    allow_spinning: bool = True        # busy-wait between ops; off when cores are shared
+    cache_dir: Optional[str] = None    # None = do not cache the optimized model
+
+    def __post_init__(self):
+        if self.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode {self.execution_mode!r} (expected one of {EXECUTION_MODES})")
+        if self.optimization not in OPTIMIZATION_LEVELS:
+            raise ValueError(f"Unknown optimization level {self.optimization!r} (expected one of {OPTIMIZATION_LEVELS})")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def session_options(settings: SessionSettings, optimization: Optional[str] = None, optimized_model_path: Optional[str] = None):
+    """ort.SessionOptions for `settings`; `optimization` overrides its level."""
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    options = ort.SessionOptions()
+    options.graph_optimization_level = levels[optimization or settings.optimization]
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if settings.execution_mode == "parallel" else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    if settings.intra_op_threads > 0:
+        options.intra_op_num_threads = settings.intra_op_threads
+    if settings.inter_op_threads > 0:
+        options.inter_op_num_threads = settings.inter_op_threads
+    options.add_session_config_entry("session.intra_op.allow_spinning", "1" if settings.allow_spinning else "0")
+    options.add_session_config_entry("session.inter_op.allow_spinning", "1" if settings.allow_spinning else "0")
+    if optimized_model_path:
+        options.optimized_model_filepath = optimized_model_path
+    return options
+
+
+def optimized_model_path(model_path: str, settings: SessionSettings, providers: Sequence[str]) -> Optional[str]:
+    """Cache file for `model_path` optimized under `settings`, or None when caching is off."""
+    if not settings.cache_dir or settings.optimization == "disable":
+        return None
+    import onnxruntime as ort
+
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    # Fully optimized graphs can contain layout/kernels specific to this CPU and ORT build
+    digest.update(f"{ort.__version__}|{platform.machine()}|{settings.optimization}|{','.join(providers)}".encode())
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(settings.cache_dir, f"{stem}.{digest.hexdigest()[:16]}.opt.onnx")
+
+
+def create_session(model_path: str, settings: SessionSettings = SessionSettings(), providers: Sequence[str] = ("CPUExecutionProvider",)):
+    """
+    InferenceSession for `model_path` under `settings`. Returns (session, info)
+    where info records which file was loaded and whether the cache was hit.
+    """
+    import onnxruntime as ort
+
+    providers = list(providers)
+    cached = optimized_model_path(model_path, settings, providers)
+    if cached and os.path.exists(cached):
+        try:
+            session = ort.InferenceSession(cached, session_options(settings, optimization="disable"), providers=providers)
+            return session, {"model": cached, "optimized_cache": "hit"}
+        except Exception as e:
+            print(f"[inference.session] Ignoring unreadable optimized model {cached}: {e}")
+            try:
+                os.remove(cached)
+            except OSError:
+                pass
+
+    if not cached:
+        session = ort.InferenceSession(model_path, session_options(settings), providers=providers)
+        return session, {"model": model_path, "optimized_cache": "off"}
+
+    # Write to a temporary name and rename, so concurrent workers never read a partial file
+    os.makedirs(settings.cache_dir, exist_ok=True)
+    partial = f"{cached}.{os.getpid()}.tmp"
+    session = ort.InferenceSession(model_path, session_options(settings, optimized_model_path=partial), providers=providers)
+    status = "miss"
+    try:
+        os.replace(partial, cached)
+    except OSError as e:
+        print(f"[inference.session] Could not write optimized model cache {cached}: {e}")
+        status = "write_failed"
+    return session, {"model": model_path, "optimized_cache": status, "cache_path": cached}
+
+
+def settings_from_env(environ=os.environ, **defaults) -> SessionSettings:
+    """SessionSettings from ORT_* environment variables, falling back to `defaults`."""
+    base = SessionSettings(**defaults)
+
+    def _get(name: str, fallback):
+        value = environ.get(name, "").strip()
+        return value if value else fallback
+
+    cache_dir = str(_get("ORT_OPTIMIZED_MODEL_CACHE", base.cache_dir or ""))
+    return SessionSettings(
+        intra_op_threads=int(_get("ORT_INTRA_OP_THREADS", base.intra_op_threads)),
+        inter_op_threads=int(_get("ORT_INTER_OP_THREADS", base.inter_op_threads)),
+        execution_mode=str(_get("ORT_EXECUTION_MODE", base.execution_mode)).lower(),
+        optimization=str(_get("ORT_GRAPH_OPTIMIZATION", base.optimization)).lower(),
+        allow_spinning=str(_get("ORT_ALLOW_SPINNING", "1" if base.allow_spinning else "0")).lower() in ("1", "true", "yes"),
+        cache_dir=None if cache_dir.lower() in ("", "off", "none", "false", "0") else cache_dir,
+    )
@@ -0,0 +1,39 @@
+"""
+Reduced-precision ArcFace model variants.
+
+scripts/quantize_arcface.py writes the variants next to the FP32 export as
+`<stem>.<variant>.onnx` (arcface.int8-static.onnx, ...); the service picks
+one at startup by name. Embeddings from a variant are close to, but not
+bit-identical with, FP32 ones - scripts/bench_arcface_variants.py reports the
+cosine agreement and similarity drift to check against the recognition
+threshold before switching a gate over.
+"""
+
+import os
+from typing import Optional
+
+MODEL_VARIANTS = ("fp32", "int8-dynamic", "int8-static", "fp16")
+
+
+def variant_path(model_path: str, variant: str) -> str:
+    """Path of `variant` for the FP32 model at `model_path` (the model itself for fp32)."""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown ArcFace variant {variant!r} (expected one of {MODEL_VARIANTS})")
+    if variant == "fp32":
+        return model_path
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.{variant}{ext or '.onnx'}"
+
+
+def resolve_variant(model_path: str, variant: Optional[str]) -> str:
+    """
+    Model file to load for `variant` of `model_path`. Raises FileNotFoundError
+    when a non-FP32 variant has not been generated yet.
+    """
+    path = variant_path(model_path, (variant or "fp32").strip().lower())
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"ArcFace variant {variant!r} not found at {path}; "
+            f"generate it with: python scripts/quantize_arcface.py {model_path}"
+        )
+    return path
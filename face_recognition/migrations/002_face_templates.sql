@@ -0,0 +1,7 @@
+-- Face recognition: multiple face templates per student
+-- JSON array of embeddings (most recent last). face_embedding keeps holding the latest template
+-- so older clients keep working. Run in Supabase SQL Editor if the column does not exist.
+
+ALTER TABLE public.students ADD COLUMN IF NOT EXISTS face_templates JSONB;
+
+COMMENT ON COLUMN public.students.face_templates IS 'Face recognition: list of ArcFace embeddings for this student, fused at match time';
@@ -0,0 +1,139 @@
+"""
+Benchmark ONNX Runtime thread layouts for the ArcFace model on this machine.
+
+Every layout (intra-op threads x execution mode [x inter-op threads]) is
+timed with `--callers` threads running the session at once, the way the
+service does: 1 caller matches the micro-batching scheduler (one dispatcher
+thread), RECOGNITION_WORKERS callers matches INFERENCE_BATCHING=false. The
+fastest layout is printed as ORT_* environment variables for app.py.
+
+Usage (from face_recognition/):
+  python scripts/autotune_onnx.py
+  python scripts/autotune_onnx.py --callers 4 --batch 1 --threads 1 2 4
+  python scripts/autotune_onnx.py --model ../arcface.onnx --batch 1 8 32 --seconds 5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference import SessionSettings, create_session  # noqa: E402
+
+
+def _default_threads() -> list[int]:
+    cores = os.cpu_count() or 1
+    threads = [1]
+    while threads[-1] * 2 <= cores:
+        threads.append(threads[-1] * 2)
+    if threads[-1] != cores:
+        threads.append(cores)
+    return threads
+
+
+def _run_layout(model: str, settings: SessionSettings, batch: int, callers: int, seconds: float) -> dict:
+    session, _ = create_session(model, settings)
+    feed = session.get_inputs()[0]
+    output = session.get_outputs()[0].name
+    shape = [batch] + [d if isinstance(d, int) else 112 for d in feed.shape[1:]]
+    faces = np.random.default_rng(0).standard_normal(shape).astype(np.float32)
+
+    for _ in range(3):
+        session.run([output], {feed.name: faces})
+
+    latencies: list[float] = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def caller():
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            session.run([output], {feed.name: faces})
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        "faces_per_s": len(latencies) * batch / elapsed,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else float("nan"),
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else float("nan"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ONNX Runtime thread layouts for ArcFace")
+    parser.add_argument("--model", default=os.environ.get("ARCFACE_MODEL_PATH", "").strip() or "arcface.onnx")
+    parser.add_argument("--callers", type=int, default=1, help="Threads running the session at once")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8], help="Faces per ONNX call")
+    parser.add_argument("--threads", type=int, nargs="+", default=_default_threads(), help="Intra-op thread counts")
+    parser.add_argument("--modes", nargs="+", default=["sequential", "parallel"], choices=["sequential", "parallel"])
+    parser.add_argument("--inter", type=int, nargs="+", default=[2], help="Inter-op threads (parallel mode only)")
+    parser.add_argument("--no-spinning", action="store_true", help="Disable busy-wait of idle ORT threads")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Timed run per layout and batch size")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Model not found: {args.model}", file=sys.stderr)
+        return 1
+
+    layouts = []
+    for mode in args.modes:
+        for intra in args.threads:
+            for inter in (args.inter if mode == "parallel" else [0]):
+                layouts.append(SessionSettings(
+                    intra_op_threads=intra,
+                    inter_op_threads=inter,
+                    execution_mode=mode,
+                    allow_spinning=not args.no_spinning,
+                ))
+
+    probe, _ = create_session(args.model, SessionSettings())
+    fixed_batch = probe.get_inputs()[0].shape[0] == 1
+    batches = [1] if fixed_batch else args.batch
+    if fixed_batch and args.batch != [1]:
+        print("Model has a fixed batch of 1; timing batch 1 only")
+    print(f"Model {args.model}: {len(layouts)} layouts x batch {batches}, {args.callers} caller(s), "
+          f"{os.cpu_count()} logical CPUs\n")
+
+    best = None
+    for batch in batches:
+        print(f"batch={batch}")
+        print(f"  {'mode':<11}{'intra':>6}{'inter':>6}{'faces/s':>10}{'p50':>10}{'p95':>10}")
+        for settings in layouts:
+            result = _run_layout(args.model, settings, batch, args.callers, args.seconds)
+            print(f"  {settings.execution_mode:<11}{settings.intra_op_threads:>6}{settings.inter_op_threads or '-':>6}"
+                  f"{result['faces_per_s']:>10.1f}{result['p50_ms']:>8.2f}ms{result['p95_ms']:>8.2f}ms")
+            # Rank on the largest batch size: that is what the service runs under load
+            if batch == batches[-1] and (best is None or result["faces_per_s"] > best[1]["faces_per_s"]):
+                best = (settings, result)
+        print()
+
+    settings, result = best
+    print(f"Fastest at batch={batches[-1]}: {result['faces_per_s']:.1f} faces/s")
+    print(f"  ORT_INTRA_OP_THREADS={settings.intra_op_threads}")
+    print(f"  ORT_EXECUTION_MODE={settings.execution_mode}")
+    if settings.execution_mode == "parallel":
+        print(f"  ORT_INTER_OP_THREADS={settings.inter_op_threads}")
+    print(f"  ORT_ALLOW_SPINNING={'0' if args.no_spinning else '1'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,92 @@
+"""
+Recall-versus-latency benchmark: gallery.ann.IVFIndex against the exact
+matmul matcher (gallery.matcher.match_top_k).
+
+By default a synthetic gallery of unit-norm 512-d templates is generated and
+queries are noisy copies of random templates (genuine attempts). Pass
+--index to benchmark the vectors stored in a saved index file instead.
+
+Usage (from face_recognition/):
+  python scripts/bench_ann.py --size 200000 --queries 500 --nprobe 1 4 8 16 32
+  python scripts/bench_ann.py --index gallery_ivf.npz
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gallery import IVFIndex, l2_normalize, match_top_k  # noqa: E402
+
+
+def _percentiles(samples: list[float]) -> str:
+    ms = np.asarray(samples) * 1000.0
+    return f"p50={np.percentile(ms, 50):7.3f}ms  p95={np.percentile(ms, 95):7.3f}ms"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark IVF ANN index vs exact matcher")
+    parser.add_argument("--size", type=int, default=100_000, help="Synthetic gallery size")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.04, help="Per-dim query noise (synthetic)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = auto (4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--index", type=Path, help="Benchmark vectors from a saved IVF .npz")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.index:
+        saved = IVFIndex.load(str(args.index))
+        keys, gallery = saved.items()
+        dim = saved.dim
+    else:
+        dim = args.dim
+        gallery = l2_normalize(rng.standard_normal((args.size, dim), dtype=np.float32))
+        keys = [str(i) for i in range(args.size)]
+    n = gallery.shape[0]
+    if n == 0:
+        print("Gallery is empty", file=sys.stderr)
+        return 1
+
+    targets = rng.integers(0, n, size=args.queries)
+    queries = l2_normalize(gallery[targets] + args.noise * rng.standard_normal((args.queries, dim), dtype=np.float32))
+    print(f"=== Gallery: N={n}  D={dim}  queries={args.queries}  k={args.k} ===\n")
+
+    exact_top, exact_times = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = match_top_k(gallery, q, args.k)
+        exact_times.append(time.perf_counter() - t0)
+        exact_top.append([keys[r] for r in res.rows])
+    print(f"exact matmul            {_percentiles(exact_times)}")
+
+    index = IVFIndex(dim, nlist=args.nlist or None)
+    t0 = time.perf_counter()
+    index.build(keys, gallery)
+    print(f"IVF build               {time.perf_counter() - t0:7.2f}s  nlist={index.centroids.shape[0]}\n")
+
+    print(f"{'nprobe':>6}  {'recall@1':>8}  {'recall@' + str(args.k):>9}  latency")
+    for nprobe in args.nprobe:
+        hits1, hitsk, times = 0, 0, []
+        for q, truth in zip(queries, exact_top):
+            t0 = time.perf_counter()
+            found, _ = index.search(q, args.k, nprobe=nprobe)
+            times.append(time.perf_counter() - t0)
+            hits1 += int(bool(found) and found[0] == truth[0])
+            hitsk += len(set(found) & set(truth))
+        recall1 = hits1 / len(queries)
+        recallk = hitsk / (len(queries) * min(args.k, n))
+        print(f"{nprobe:>6}  {recall1:>8.3f}  {recallk:>9.3f}  {_percentiles(times)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
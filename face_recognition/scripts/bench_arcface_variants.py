@@ -0,0 +1,121 @@
+"""
+Latency, throughput and embedding agreement of ArcFace variants against FP32.
+
+Faces are cropped from the photos in testing/ the way the service does it.
+For every variant found next to the FP32 model (see quantize_arcface.py):
+
+  p50/p95     single-face latency (batch 1, one caller)
+  faces/s     throughput at --batch faces per call
+  cos mean/min  cosine between the variant's and FP32's embedding of the same face
+  sim drift   largest change of any face-to-face similarity vs FP32 - compare it
+              with the gap between RECOGNITION_THRESHOLD and typical scores
+
+Usage (from face_recognition/):
+  python scripts/bench_arcface_variants.py
+  python scripts/bench_arcface_variants.py arcface.onnx --variants fp32 int8-static --batch 16 --threads 4
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from gallery import l2_normalize  # noqa: E402
+from inference import SessionSettings, create_session  # noqa: E402
+from inference.variants import MODEL_VARIANTS, variant_path  # noqa: E402
+from face_samples import DEFAULT_IMAGE_DIR, load_face_samples  # noqa: E402
+
+
+def _embed(session, faces: np.ndarray) -> np.ndarray:
+    feed = session.get_inputs()[0].name
+    output = session.get_outputs()[0].name
+    rows = [session.run([output], {feed: faces[i:i + 1]})[0].reshape(-1) for i in range(len(faces))]
+    return l2_normalize(np.stack(rows))
+
+
+def _timed(fn, seconds: float) -> list[float]:
+    fn()
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ArcFace FP32 / INT8 / FP16 variants")
+    parser.add_argument("model", type=Path, nargs="?", default=Path(os.environ.get("ARCFACE_MODEL_PATH", "").strip() or "arcface.onnx"))
+    parser.add_argument("--variants", nargs="+", default=list(MODEL_VARIANTS), choices=list(MODEL_VARIANTS))
+    parser.add_argument("--images", type=Path, default=DEFAULT_IMAGE_DIR)
+    parser.add_argument("--batch", type=int, default=8, help="Faces per call for the throughput run")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = ORT default)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Timed run per measurement")
+    args = parser.parse_args()
+
+    if not args.model.is_file():
+        print(f"Model not found: {args.model}", file=sys.stderr)
+        return 1
+    faces, names = load_face_samples(args.images)
+    if not len(faces):
+        print(f"No faces detected in {args.images}", file=sys.stderr)
+        return 1
+    print(f"{len(faces)} faces from {args.images}: {', '.join(names)}\n")
+
+    settings = SessionSettings(intra_op_threads=args.threads)
+    reference = None
+    rows = []
+    for variant in ["fp32"] + [v for v in args.variants if v != "fp32"]:
+        path = Path(variant_path(str(args.model), variant))
+        if not path.is_file():
+            print(f"{variant}: {path} not found (run scripts/quantize_arcface.py)")
+            continue
+        session, _ = create_session(str(path), settings)
+        feed = session.get_inputs()[0]
+        output = session.get_outputs()[0].name
+
+        embeddings = _embed(session, faces)
+        if reference is None:
+            reference = embeddings
+        cosines = np.sum(embeddings * reference, axis=1)
+        drift = np.abs(embeddings @ embeddings.T - reference @ reference.T).max()
+
+        single = _timed(lambda: session.run([output], {feed.name: faces[:1]}), args.seconds)
+        batch = 1 if feed.shape and feed.shape[0] == 1 else args.batch
+        stacked = np.ascontiguousarray(np.resize(faces, (batch,) + faces.shape[1:]))
+        batched = _timed(lambda: session.run([output], {feed.name: stacked}), args.seconds)
+
+        ms = np.asarray(single) * 1000.0
+        if variant in args.variants:
+            rows.append((
+                variant,
+                path.stat().st_size / 1e6,
+                np.percentile(ms, 50),
+                np.percentile(ms, 95),
+                batch * len(batched) / sum(batched),
+                batch,
+                float(cosines.mean()),
+                float(cosines.min()),
+                float(drift),
+            ))
+
+    if not rows:
+        return 1
+    print(f"{'variant':<14}{'MB':>7}{'p50':>10}{'p95':>10}{'faces/s':>10}{'batch':>7}{'cos mean':>10}{'cos min':>9}{'sim drift':>11}")
+    base_rate = next((r[4] for r in rows if r[0] == "fp32"), None)
+    for variant, size, p50, p95, rate, batch, cos_mean, cos_min, drift in rows:
+        speedup = f"  ({rate / base_rate:.2f}x)" if base_rate and variant != "fp32" else ""
+        print(f"{variant:<14}{size:>7.1f}{p50:>8.2f}ms{p95:>8.2f}ms{rate:>10.1f}{batch:>7}"
+              f"{cos_mean:>10.4f}{cos_min:>9.4f}{drift:>11.4f}{speedup}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
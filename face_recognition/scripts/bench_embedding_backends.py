@@ -0,0 +1,145 @@
+"""
+Latency, memory and agreement of the embedding backends (inference/backends.py).
+
+Faces are cropped from the photos in testing/ the way the service does it,
+each laid out for the backend's input spec, plus a mirrored and two
+exposure-shifted copies per photo; copies of one photo count as the same
+person, different photos as different people.
+
+  load MB       resident memory added by loading the backend
+  p50/p95       single-face latency
+  faces/s       throughput at --batch faces per call (row by row for TFLite)
+  genuine       mean / min similarity between copies of the same photo
+  impostor max  highest similarity between different photos
+  corr / NN     agreement with the first backend: correlation of all pairwise
+                similarities and share of faces whose nearest neighbour is the same
+
+Embedding spaces differ between backends, so agreement is measured on the
+similarity structure, not by comparing vectors.
+
+Usage (from face_recognition/):
+  python scripts/bench_embedding_backends.py
+  python scripts/bench_embedding_backends.py --backends mobilefacenet-tflite --threads 2
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference import BACKENDS, ArcFaceOnnxBackend, MobileFaceNetTFLiteBackend, SessionSettings  # noqa: E402
+from face_samples import DEFAULT_IMAGE_DIR, load_face_samples  # noqa: E402
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # Peak rather than current RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _build(name: str, args):
+    if name == "arcface-onnx":
+        return ArcFaceOnnxBackend(str(args.arcface), SessionSettings(intra_op_threads=args.threads))
+    return MobileFaceNetTFLiteBackend(str(args.mobilefacenet), num_threads=max(1, args.threads))
+
+
+def _timed(fn, seconds: float) -> list[float]:
+    fn()
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _off_diagonal(matrix: np.ndarray) -> np.ndarray:
+    return matrix[~np.eye(len(matrix), dtype=bool)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--arcface", type=Path, default=Path(os.environ.get("ARCFACE_MODEL_PATH", "").strip() or "arcface.onnx"))
+    parser.add_argument("--mobilefacenet", type=Path, default=Path(os.environ.get("MOBILEFACENET_MODEL_PATH", "").strip() or "output_model.tflite"))
+    parser.add_argument("--images", type=Path, default=DEFAULT_IMAGE_DIR)
+    parser.add_argument("--batch", type=int, default=8, help="Faces per call for the throughput run")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op / interpreter threads (0 = runtime default)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Timed run per measurement")
+    args = parser.parse_args()
+
+    reference = None
+    rows = []
+    for name in args.backends:
+        before = _rss_mb()
+        try:
+            backend = _build(name, args)
+        except Exception as e:
+            print(f"{name}: not available ({e})")
+            continue
+        loaded = _rss_mb() - before
+
+        faces, names = load_face_samples(args.images, augment=True, spec=backend.input_spec)
+        if not len(faces):
+            print(f"No faces detected in {args.images}", file=sys.stderr)
+            return 1
+        embeddings = backend.embed(faces, np.empty((len(faces), backend.dim), dtype=np.float32))
+        similarity = embeddings @ embeddings.T
+
+        source = np.array([n.split(" (")[0] for n in names])
+        same = source[:, None] == source[None, :]
+        off = ~np.eye(len(faces), dtype=bool)
+        genuine = similarity[same & off]
+        impostor = similarity[~same]
+
+        nearest = np.where(off, similarity, -np.inf).argmax(axis=1)
+        if reference is None:
+            reference = (similarity, nearest)
+        corr = float(np.corrcoef(_off_diagonal(similarity), _off_diagonal(reference[0]))[0, 1])
+        nn_agree = float(np.mean(nearest == reference[1]))
+
+        out = np.empty((max(args.batch, 1), backend.dim), dtype=np.float32)
+        single = _timed(lambda: backend.embed(faces[:1], out[:1]), args.seconds)
+        stacked = np.ascontiguousarray(np.resize(faces, (args.batch,) + faces.shape[1:]))
+        batched = _timed(lambda: backend.embed(stacked, out[:args.batch]), args.seconds)
+
+        ms = np.asarray(single) * 1000.0
+        rows.append((
+            name,
+            backend.dim,
+            loaded,
+            np.percentile(ms, 50),
+            np.percentile(ms, 95),
+            args.batch * len(batched) / sum(batched),
+            float(genuine.mean()) if len(genuine) else float("nan"),
+            float(genuine.min()) if len(genuine) else float("nan"),
+            float(impostor.max()) if len(impostor) else float("nan"),
+            corr,
+            nn_agree,
+        ))
+        backend.close()
+
+    if not rows:
+        return 1
+    print(f"\n{'backend':<22}{'dim':>5}{'load MB':>9}{'p50':>10}{'p95':>10}{'faces/s':>10}"
+          f"{'genuine':>9}{'(min)':>8}{'impostor max':>14}{'corr':>7}{'NN':>6}")
+    for name, dim, loaded, p50, p95, rate, g_mean, g_min, i_max, corr, nn in rows:
+        print(f"{name:<22}{dim:>5}{loaded:>9.1f}{p50:>8.2f}ms{p95:>8.2f}ms{rate:>10.1f}"
+              f"{g_mean:>9.3f}{g_min:>8.3f}{i_max:>14.3f}{corr:>7.3f}{nn:>6.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,59 @@
+"""
+Face input tensors from a folder of photos (default: testing/), prepared
+exactly as the service does (reduced decode, MediaPipe detection, bbox
+alignment). Shared by quantize_arcface.py (calibration data),
+bench_arcface_variants.py and bench_embedding_backends.py (benchmark inputs).
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from vision import ARCFACE_INPUT, DetectorPool, FaceInputSpec, decode_image, detect_faces, face_inputs, mediapipe_face_detector  # noqa: E402
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+DEFAULT_IMAGE_DIR = Path(__file__).resolve().parents[1] / "testing"
+
+
+def load_face_samples(
+    image_dir: Path = DEFAULT_IMAGE_DIR,
+    augment: bool = False,
+    spec: FaceInputSpec = ARCFACE_INPUT,
+) -> tuple[np.ndarray, list[str]]:
+    """
+    (N, 112, 112, 3) float32 face inputs laid out per `spec`, one per image
+    with a detectable face, and their file names. `augment` adds a mirrored
+    and a darker/brighter copy of each face, named "<file> (...)".
+    """
+    pool = DetectorPool(mediapipe_face_detector(model_selection=0, min_detection_confidence=0.5), size=1)
+    faces: list[np.ndarray] = []
+    names: list[str] = []
+    try:
+        for path in sorted(Path(image_dir).iterdir()):
+            if path.suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            image = decode_image(path.read_bytes())
+            detected = detect_faces(pool, image, max_faces=1)
+            if not detected:
+                print(f"  skipped {path.name}: no face detected")
+                continue
+            face = face_inputs(detected, spec)[0].copy()
+            faces.append(face)
+            names.append(path.name)
+            if augment:
+                faces.append(face[:, ::-1].copy())
+                names.append(f"{path.name} (mirrored)")
+                for gain in (0.8, 1.2):
+                    # Inputs are (x - mean) * scale; change the pixels, not the normalized values
+                    pixels = np.clip((face / spec.scale + spec.mean) * gain, 0, 255)
+                    faces.append(((pixels - spec.mean) * spec.scale).astype(np.float32))
+                    names.append(f"{path.name} (x{gain})")
+    finally:
+        pool.close()
+    if not faces:
+        return np.zeros((0, 112, 112, 3), dtype=np.float32), []
+    return np.stack(faces), names
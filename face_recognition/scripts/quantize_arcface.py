@@ -0,0 +1,133 @@
+"""
+Produce reduced-precision variants of the ArcFace ONNX export.
+
+Variants are written next to the input as <stem>.<variant>.onnx and selected
+by the service with ARCFACE_MODEL_VARIANT (see inference/variants.py):
+
+  int8-dynamic  weights quantized to INT8, activations quantized at run time
+                (no calibration data; smallest change to set up)
+  int8-static   QDQ INT8 weights (per channel) and activations, with
+                activation ranges calibrated on face crops from testing/
+                (usually the fastest on CPUs with VNNI/AVX-512)
+  fp16          FP16 weights and compute with FP32 inputs/outputs kept, so the
+                service feeds it unchanged (mostly pays off on GPUs / ARM
+                with native FP16)
+
+Compare the results with scripts/bench_arcface_variants.py before switching.
+
+Usage (from face_recognition/):
+  pip install onnx onnxruntime onnxconverter-common
+  python scripts/quantize_arcface.py arcface.onnx
+  python scripts/quantize_arcface.py arcface.onnx --variants int8-static --images testing
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from inference.variants import MODEL_VARIANTS, variant_path  # noqa: E402
+from face_samples import DEFAULT_IMAGE_DIR, load_face_samples  # noqa: E402
+
+
+def _preprocess(model: Path, work_dir: str) -> Path:
+    """Shape inference + graph cleanup recommended before quantization (skipped if unavailable)."""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+    except ImportError:
+        return model
+    out = Path(work_dir) / "preprocessed.onnx"
+    try:
+        quant_pre_process(str(model), str(out), skip_symbolic_shape=True)
+        return out
+    except Exception as e:
+        print(f"  pre-processing skipped: {e}")
+        return model
+
+
+def int8_dynamic(model: Path, out: Path, work_dir: str) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(_preprocess(model, work_dir)), str(out), weight_type=QuantType.QInt8)
+
+
+def int8_static(model: Path, out: Path, work_dir: str, image_dir: Path, per_channel: bool) -> None:
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    faces, names = load_face_samples(image_dir, augment=True)
+    if not len(faces):
+        raise RuntimeError(f"no faces found in {image_dir} for calibration")
+    print(f"  calibrating on {len(faces)} face crops from {image_dir}")
+    input_name = ort.InferenceSession(str(model), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class FaceReader(CalibrationDataReader):
+        def __init__(self):
+            self._faces = iter(faces)
+
+        def get_next(self):
+            face = next(self._faces, None)
+            return None if face is None else {input_name: face[None]}
+
+    quantize_static(
+        str(_preprocess(model, work_dir)),
+        str(out),
+        FaceReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=per_channel,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def fp16(model: Path, out: Path) -> None:
+    import onnx
+    from onnxconverter_common import float16
+
+    converted = float16.convert_float_to_float16(onnx.load(str(model)), keep_io_types=True)
+    onnx.save(converted, str(out))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Write INT8 / FP16 variants of an ArcFace ONNX model")
+    parser.add_argument("model", type=Path, nargs="?", default=Path(os.environ.get("ARCFACE_MODEL_PATH", "").strip() or "arcface.onnx"))
+    parser.add_argument("--variants", nargs="+", default=[v for v in MODEL_VARIANTS if v != "fp32"],
+                        choices=[v for v in MODEL_VARIANTS if v != "fp32"])
+    parser.add_argument("--images", type=Path, default=DEFAULT_IMAGE_DIR, help="Calibration photos (int8-static)")
+    parser.add_argument("--per-tensor", action="store_true", help="Per-tensor instead of per-channel weights (int8-static)")
+    args = parser.parse_args()
+
+    if not args.model.is_file():
+        print(f"Model not found: {args.model}", file=sys.stderr)
+        return 1
+
+    failed = 0
+    for variant in args.variants:
+        out = Path(variant_path(str(args.model), variant))
+        print(f"{variant}: {args.model} -> {out}")
+        try:
+            with tempfile.TemporaryDirectory() as work_dir:
+                if variant == "int8-dynamic":
+                    int8_dynamic(args.model, out, work_dir)
+                elif variant == "int8-static":
+                    int8_static(args.model, out, work_dir, args.images, per_channel=not args.per_tensor)
+                else:
+                    fp16(args.model, out)
+        except Exception as e:
+            failed += 1
+            print(f"  failed: {e}", file=sys.stderr)
+            continue
+        size_mb = out.stat().st_size / 1e6
+        print(f"  wrote {size_mb:.1f} MB ({size_mb / (args.model.stat().st_size / 1e6):.0%} of FP32)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
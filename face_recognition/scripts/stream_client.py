@@ -0,0 +1,87 @@
+"""
+Stream a camera, video file or RTSP feed to /ws/recognize and print the events.
+
+Frames are JPEG-encoded and sent as binary WebSocket messages at up to --fps;
+the server keeps only the newest frame while it is busy, so the client never
+has to wait for a result before sending the next frame.
+
+Usage (from face_recognition/):
+  pip install websockets opencv-python
+  python scripts/stream_client.py --source 0 --location "Main Gate"
+  python scripts/stream_client.py --source rtsp://camera/stream --fps 10 --url ws://gate-box:8005/ws/recognize
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import quote
+
+import cv2
+
+
+async def _send_frames(ws, capture, fps: float, quality: int, max_side: int) -> None:
+    interval = 1.0 / fps if fps > 0 else 0.0
+    loop = asyncio.get_running_loop()
+    while True:
+        started = time.perf_counter()
+        ok, frame = await loop.run_in_executor(None, capture.read)
+        if not ok:
+            break
+        h, w = frame.shape[:2]
+        if max_side and max(h, w) > max_side:
+            scale = max_side / float(max(h, w))
+            frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            await ws.send(jpeg.tobytes())
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def _print_events(ws) -> None:
+    async for message in ws:
+        event = json.loads(message)
+        if event.get("type") != "result":
+            print(event)
+            continue
+        names = [f["student"]["full_name"] for f in event["faces"] if f.get("recognized")]
+        print(f"frame {event['frame']:>6}  faces={len(event['faces'])}  recognized={names or '-'}  "
+              f"latency={event['latency_ms']:.0f}ms  dropped={event['dropped']}"
+              + (f"  security={event['security_decision']}" if "security_decision" in event else ""))
+
+
+async def run(args) -> int:
+    import websockets
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        print(f"Could not open {args.source}", file=sys.stderr)
+        return 1
+    url = f"{args.url}?location={quote(args.location)}"
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            printer = asyncio.create_task(_print_events(ws))
+            await _send_frames(ws, capture, args.fps, args.quality, args.max_side)
+            await asyncio.sleep(1.0)
+            printer.cancel()
+    finally:
+        capture.release()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stream frames to the recognition WebSocket")
+    parser.add_argument("--source", default="0", help="Camera index, video file or RTSP URL")
+    parser.add_argument("--url", default="ws://localhost:8005/ws/recognize")
+    parser.add_argument("--location", default="Main Gate")
+    parser.add_argument("--fps", type=float, default=15.0, help="Upper bound on frames sent per second")
+    parser.add_argument("--quality", type=int, default=85, help="JPEG quality")
+    parser.add_argument("--max-side", type=int, default=1280, help="Downscale frames to this longer side (0 = off)")
+    return asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
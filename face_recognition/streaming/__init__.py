@@ -0,0 +1,25 @@
+# Streaming layer for the face recognition service
+# Continuous-camera recognition: latest-wins frame hand-off, per-event cooldowns, motion gating, face tracks and the threaded gate pipeline.
+
+from .slot import LatestSlot
+from .cooldown import Cooldown
+from .motion import MotionGate, decode_thumbnail, parse_roi
+from .tracker import FaceTracker, Track
+from .pipeline import LatestQueue, Pipeline, Stage, StageMetrics
+from .ingest import Frame, VideoSource
+
+__all__ = [
+    "LatestSlot",
+    "Cooldown",
+    "MotionGate",
+    "decode_thumbnail",
+    "parse_roi",
+    "FaceTracker",
+    "Track",
+    "LatestQueue",
+    "Pipeline",
+    "Stage",
+    "StageMetrics",
+    "Frame",
+    "VideoSource",
+]
@@ -0,0 +1,33 @@
+"""
+Per-key cooldown for events raised from a continuous stream.
+
+A student standing in front of a gate camera is recognized on every frame, and
+an unknown face triggers the security agent on every frame. Entries, attendance
+and alerts should happen once per visit, so each key may fire at most once per
+`seconds`.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Hashable
+
+
+class Cooldown:
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.seconds = float(seconds)
+        self.clock = clock
+        self._last: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+
+    def ready(self, key: Hashable) -> bool:
+        """True (and start the cooldown) when `key` has not fired within the last `seconds`."""
+        now = self.clock()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.seconds:
+                return False
+            self._last[key] = now
+            if len(self._last) > 1024:
+                # Forget keys whose cooldown is over so long-lived streams stay small
+                self._last = {k: t for k, t in self._last.items() if now - t < self.seconds}
+            return True
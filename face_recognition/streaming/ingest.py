@@ -0,0 +1,145 @@
+"""
+Camera / video ingest for the gate worker.
+
+VideoSource wraps cv2.VideoCapture (RTSP/HTTP URL, device index or file) as
+the decode stage of a Pipeline: each call returns the next decoded frame as a
+Frame. The capture buffer is kept at one frame so a slow consumer sees the
+newest picture instead of a queue of stale ones, network streams are reopened
+after a drop, and files are paced at their own frame rate so they behave like
+a live camera (pass realtime=False to read them as fast as possible).
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class Frame:
+    """One camera frame and the results the stages attach to it."""
+
+    seq: int
+    captured_at: float                  # time.perf_counter() when decoded
+    image: np.ndarray                   # BGR
+    detections: List[Any] = field(default_factory=list)
+    rejections: List[Any] = field(default_factory=list)
+    usable: List[Any] = field(default_factory=list)
+    tracks: List[Any] = field(default_factory=list)       # track of each detection (when tracking)
+    to_embed: List[Any] = field(default_factory=list)     # usable detections that need an embedding
+    embeddings: Optional[np.ndarray] = None
+    matches: Dict[int, Any] = field(default_factory=dict)  # id(detection) -> MatchResult
+    gallery: Any = None
+
+
+def _is_stream(source: Union[str, int]) -> bool:
+    return isinstance(source, str) and "://" in source
+
+
+class VideoSource:
+    """
+    Frames from `source`. `fps_limit` > 0 caps the rate frames are handed on;
+    extra frames are read and discarded so the capture never lags.
+    """
+
+    def __init__(
+        self,
+        source: Union[str, int],
+        fps_limit: float = 0.0,
+        realtime: bool = True,
+        reconnect_delay: float = 2.0,
+    ):
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.fps_limit = float(fps_limit)
+        self.realtime = realtime
+        self.reconnect_delay = float(reconnect_delay)
+        self.live = not (isinstance(self.source, str) and not _is_stream(self.source))
+
+        self._capture: Optional[cv2.VideoCapture] = None
+        self._frame_interval = 0.0
+        self._last_emit = 0.0
+        self._last_read = 0.0
+        self.seq = 0
+        self.read_failures = 0
+        self.reconnects = 0
+        self.skipped = 0
+        self._stopped = threading.Event()
+
+    def open(self) -> bool:
+        self.close()
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            capture.release()
+            return False
+        # Keep the driver/FFmpeg queue to one frame (ignored by backends without a buffer)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self._frame_interval = 1.0 / fps if not self.live and self.realtime and 0 < fps < 240 else 0.0
+        self._capture = capture
+        print(f"[streaming.ingest] Opened {self.source} ({fps:.1f} fps reported)")
+        return True
+
+    def stop(self) -> None:
+        """Make a pending or future read() end the stream (e.g. while waiting to reconnect)."""
+        self._stopped.set()
+
+    def close(self) -> None:
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def read(self, _=None) -> Optional[Frame]:
+        """
+        Next Frame; None when this frame is skipped by the rate limit.
+        Raises StopIteration at the end of a file (or when a device cannot be opened).
+        """
+        if self._stopped.is_set() or (self._capture is None and not self._reopen()):
+            self.close()
+            raise StopIteration
+        if self._frame_interval:
+            wait = self._last_read + self._frame_interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        ok, image = self._capture.read()
+        self._last_read = time.perf_counter()
+        if not ok or image is None:
+            self.read_failures += 1
+            if not self.live:
+                self.close()
+                raise StopIteration
+            print(f"[streaming.ingest] Lost {self.source}, reconnecting")
+            self.close()
+            return None
+
+        now = time.perf_counter()
+        if self.fps_limit > 0 and now - self._last_emit < 1.0 / self.fps_limit:
+            self.skipped += 1
+            return None
+        self._last_emit = now
+        self.seq += 1
+        return Frame(seq=self.seq, captured_at=now, image=image)
+
+    def _reopen(self) -> bool:
+        if self.seq == 0 and self.reconnects == 0:
+            if self.open():
+                return True
+            if not _is_stream(self.source):
+                return False
+        while not self._stopped.wait(self.reconnect_delay):
+            self.reconnects += 1
+            if self.open():
+                return True
+            print(f"[streaming.ingest] {self.source} unavailable, retrying in {self.reconnect_delay:g}s")
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": str(self.source),
+            "frames": self.seq,
+            "skipped": self.skipped,
+            "read_failures": self.read_failures,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,152 @@
+"""
+Motion gating in front of face detection.
+
+A gate camera sees an empty corridor most of the time, and running MediaPipe
+on every one of those frames is what keeps the gate box busy. MotionGate
+compares a small blurred grayscale thumbnail of each frame (160 px wide,
+region of interest only) with a slowly updated background and forwards the
+frame only when enough of the region changed. That costs about a
+millisecond on a full HD frame, so an idle stream does next to no work, while someone
+walking in changes the thumbnail on the very first frame they appear in.
+
+After motion, frames keep being forwarded for `hold_s` seconds so a person who
+stops in front of the camera is still recognized; `refresh_s` > 0 forces a
+frame through periodically even when nothing moves. The background adapts at
+`learning_rate` per frame, so lighting changes and parked objects stop
+counting as motion after a few seconds.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Region of interest as fractions of the frame: (left, top, right, bottom)
+Roi = Tuple[float, float, float, float]
+
+
+def parse_roi(text: str) -> Optional[Roi]:
+    """"x0,y0,x1,y1" in 0..1 fractions of the frame -> Roi; empty -> None (whole frame)."""
+    text = (text or "").strip()
+    if not text:
+        return None
+    values = tuple(float(v) for v in text.split(","))
+    if len(values) != 4:
+        raise ValueError(f"ROI needs 4 values x0,y0,x1,y1, got {text!r}")
+    x0, y0, x1, y1 = values
+    if not (0.0 <= x0 < x1 <= 1.0 and 0.0 <= y0 < y1 <= 1.0):
+        raise ValueError(f"ROI must satisfy 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1, got {text!r}")
+    return values
+
+
+def decode_thumbnail(data: bytes) -> Optional[np.ndarray]:
+    """Grayscale decode of an encoded frame at 1/8 scale (JPEG scales while decoding, so this is cheap)."""
+    buf = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        image = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    return image
+
+
+class MotionGate:
+    """
+    `moving(image)` is True when `image` (BGR or grayscale, any size) should go
+    on to detection. Pixels whose thumbnail differs from the background by more
+    than `threshold` gray levels count as changed; the frame moves when at least
+    `min_area` of the region changed. Safe to call from one thread at a time per
+    gate; stats() may be read from any thread.
+    """
+
+    def __init__(
+        self,
+        roi: Optional[Roi] = None,
+        threshold: int = 25,
+        min_area: float = 0.005,
+        hold_s: float = 2.0,
+        refresh_s: float = 0.0,
+        learning_rate: float = 0.05,
+        width: int = 160,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.roi = roi
+        self.threshold = int(threshold)
+        self.min_area = float(min_area)
+        self.hold_s = float(hold_s)
+        self.refresh_s = float(refresh_s)
+        self.learning_rate = float(learning_rate)
+        self.width = int(width)
+        self.clock = clock
+
+        self._background: Optional[np.ndarray] = None
+        self._last_motion = float("-inf")
+        self._last_forward = float("-inf")
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.forwarded = 0
+        self.motion_frames = 0
+        self.last_changed = 0.0
+
+    def _thumbnail(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            image = image[int(y0 * h):max(int(y1 * h), int(y0 * h) + 1), int(x0 * w):max(int(x1 * w), int(x0 * w) + 1)]
+            h, w = image.shape[:2]
+        step = w // (2 * self.width)
+        if step > 1:
+            # Subsample to ~2x the target first; area-resizing a full HD frame costs more than the rest
+            image = image[::step, ::step]
+            h, w = image.shape[:2]
+        if w > self.width:
+            image = cv2.resize(image, (self.width, max(1, round(h * self.width / w))), interpolation=cv2.INTER_AREA)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(image, (5, 5), 0)
+
+    def changed_fraction(self, image: np.ndarray) -> float:
+        """Share of the region that differs from the background; updates the background."""
+        thumb = self._thumbnail(image)
+        if self._background is None or self._background.shape != thumb.shape:
+            self._background = thumb.astype(np.float32)
+            # First frame (or the camera changed resolution): nothing to compare against
+            return 1.0
+        diff = cv2.absdiff(thumb, cv2.convertScaleAbs(self._background))
+        _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(thumb, self._background, self.learning_rate)
+        return cv2.countNonZero(mask) / float(mask.size)
+
+    def moving(self, image: np.ndarray) -> bool:
+        changed = self.changed_fraction(image)
+        now = self.clock()
+        with self._lock:
+            self.frames += 1
+            self.last_changed = changed
+            if changed >= self.min_area:
+                self.motion_frames += 1
+                self._last_motion = now
+            forward = (
+                now - self._last_motion <= self.hold_s
+                or (self.refresh_s > 0 and now - self._last_forward >= self.refresh_s)
+            )
+            if forward:
+                self.forwarded += 1
+                self._last_forward = now
+            return forward
+
+    def reset(self) -> None:
+        """Forget the background (e.g. after the camera reconnects)."""
+        self._background = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "forwarded": self.forwarded,
+                "skipped": self.frames - self.forwarded,
+                "motion_frames": self.motion_frames,
+                "forward_rate": round(self.forwarded / self.frames, 3) if self.frames else 0.0,
+                "last_changed": round(self.last_changed, 4),
+                "roi": list(self.roi) if self.roi is not None else None,
+            }
@@ -0,0 +1,251 @@
+"""
+Threaded stage pipeline with latest-wins queues.
+
+Each stage runs in its own thread and is connected to the next by a small
+bounded queue. When a stage falls behind, the queue in front of it drops its
+oldest item instead of blocking the producer, so every stage always works on
+the newest frame available and end-to-end latency stays bounded by the
+slowest stage rather than growing with a backlog. Stages overlap: while
+ArcFace embeds frame N, detection already runs on frame N+1 and the camera
+decodes N+2.
+
+Every stage keeps FPS (over the last few seconds), processing latency
+(mean / p95 / max), error, skip and drop counters; Pipeline.stats() collects them.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import numpy as np
+
+
+class LatestQueue:
+    """
+    Thread-safe queue of at most `maxsize` items. `put` never blocks: when
+    full, the oldest item is dropped (and handed to `on_drop`, called outside
+    the lock). `get` blocks until an item arrives and returns None once the
+    queue is closed and empty.
+    """
+
+    def __init__(self, maxsize: int = 1, on_drop: Optional[Callable[[Any], None]] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = int(maxsize)
+        self.on_drop = on_drop
+        self._items: Deque[Any] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.puts = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> bool:
+        """Enqueue `item`; True when an older item was dropped to make room."""
+        with self._cond:
+            if self._closed:
+                return False
+            self.puts += 1
+            old = self._items.popleft() if len(self._items) >= self.maxsize else None
+            if old is not None:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+        if old is not None and self.on_drop is not None:
+            self.on_drop(old)
+        return old is not None
+
+    def get(self) -> Optional[Any]:
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            return self._items.popleft() if self._items else None
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+
+class StageMetrics:
+    """Throughput and latency of one stage (thread-safe)."""
+
+    def __init__(self, window_s: float = 5.0, samples: int = 512):
+        self.window_s = float(window_s)
+        self._done: Deque[float] = deque()
+        self._latencies: Deque[float] = deque(maxlen=samples)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.skipped = 0
+        self.max_latency = 0.0
+
+    def record(self, latency: float) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self.count += 1
+            self._latencies.append(latency)
+            self.max_latency = max(self.max_latency, latency)
+            self._done.append(now)
+            while self._done and now - self._done[0] > self.window_s:
+                self._done.popleft()
+
+    def error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def skip(self) -> None:
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        with self._lock:
+            while self._done and now - self._done[0] > self.window_s:
+                self._done.popleft()
+            ms = np.asarray(self._latencies, dtype=np.float64) * 1000.0
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "fps": round(len(self._done) / self.window_s, 2),
+                "avg_ms": round(float(ms.mean()), 2) if len(ms) else 0.0,
+                "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else 0.0,
+                "max_ms": round(self.max_latency * 1000.0, 2),
+            }
+
+
+class Stage:
+    """
+    One pipeline stage: a thread applying `fn` to items from `inbox` and
+    putting non-None results into `outbox` (None filters the item out and
+    counts as skipped). A stage without an inbox is a source: `fn(None)` is
+    called repeatedly and returns the next item (None to skip, StopIteration
+    to end the stream).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        inbox: Optional[LatestQueue] = None,
+        outbox: Optional[LatestQueue] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.metrics = StageMetrics()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _next(self) -> Any:
+        if self.inbox is None:
+            return None
+        item = self.inbox.get()
+        if item is None:
+            raise StopIteration
+        return item
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._next()
+                except StopIteration:
+                    break
+                started = time.perf_counter()
+                try:
+                    result = self.fn(item)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    self.metrics.error()
+                    print(f"[streaming.pipeline] {self.name} failed: {e}")
+                    continue
+                if result is None:
+                    self.metrics.skip()
+                    continue
+                self.metrics.record(time.perf_counter() - started)
+                if self.outbox is not None:
+                    self.outbox.put(result)
+        finally:
+            # Let the next stage drain and stop too
+            if self.outbox is not None:
+                self.outbox.close()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self.inbox is not None:
+            self.inbox.close()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+
+class Pipeline:
+    """
+    Chain `stages` (the first one a source) through LatestQueues of `queue_size`.
+    `on_drop(item)` is called for every item a queue drops. `stats()` reports
+    each stage's metrics and drops in the queue in front of it.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        queue_size: int = 1,
+        on_drop: Optional[Callable[[Any], None]] = None,
+    ):
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            queue = LatestQueue(queue_size, on_drop)
+            upstream.outbox = queue
+            downstream.inbox = queue
+        self.started_at: Optional[float] = None
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        for stage in self.stages:
+            stage.stop()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def wait(self) -> None:
+        """Block until the source ends and every stage has drained."""
+        for stage in self.stages:
+            while stage.is_alive():
+                stage.join(0.5)
+
+    def stats(self) -> Dict[str, Any]:
+        stages = {}
+        for stage in self.stages:
+            entry = stage.metrics.snapshot()
+            if stage.inbox is not None:
+                entry["queued"] = len(stage.inbox)
+                entry["dropped"] = stage.inbox.dropped
+            stages[stage.name] = entry
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "stages": stages,
+        }
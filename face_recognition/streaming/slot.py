@@ -0,0 +1,54 @@
+"""
+Latest-wins hand-off between a frame receiver and a recognition loop.
+
+A camera produces frames faster than detection + embedding can process them
+when several faces are in view or the box is busy. Queueing every frame only
+makes results later and later; what a gate needs is the newest frame. The
+slot holds at most one pending frame: a new frame replaces the pending one
+(counted as dropped) and the consumer always gets the most recent.
+"""
+
+import asyncio
+import time
+from typing import Any, Optional, Tuple
+
+
+class LatestSlot:
+    """
+    Single-item asyncio slot. `put(item)` never blocks; `await get()` returns
+    (sequence number, item, receive time) or None once the slot is closed and
+    drained. Use from one event loop.
+    """
+
+    def __init__(self):
+        self._item: Optional[Tuple[int, Any, float]] = None
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> bool:
+        """Offer a frame; True when it replaced one that was never processed."""
+        if self._closed:
+            return False
+        self.received += 1
+        replaced = self._item is not None
+        if replaced:
+            self.dropped += 1
+        self._item = (self.received, item, time.perf_counter())
+        self._ready.set()
+        return replaced
+
+    async def get(self) -> Optional[Tuple[int, Any, float]]:
+        while self._item is None:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        item, self._item = self._item, None
+        return item
+
+    def close(self) -> None:
+        """Wake the consumer; a pending frame is still handed out first."""
+        self._closed = True
+        self._ready.set()
@@ -0,0 +1,273 @@
+"""
+Face tracks across the frames of one camera.
+
+A student walking up to the gate stays in view for dozens of frames, and
+without tracking every one of them is embedded and matched again. FaceTracker
+links each frame's detections to the tracks of the previous frames (greedy
+IoU, then centroid distance for faces that moved further than their own
+size overlaps) and decides which faces still need an embedding:
+
+  - a new track is embedded on its first usable frame;
+  - further embeddings are averaged into the track's fused embedding, up to
+    `max_embeds`, unless a match is already confident (score >= confident_score);
+  - after that the track is only re-checked every `retry_s` seconds. Each
+    re-check embedding is first matched on its own: when it names a different
+    student than the track (or names one where the track named none, or the
+    other way round), someone else has taken over the box - e.g. a tailgater -
+    and the track starts again from that embedding under a new id. Otherwise
+    it joins the fused embedding, which only averages the last `max_embeds`
+    embeddings so a slow change of view is followed too.
+
+Faces that are not embedded reuse their track's fused embedding and match;
+refresh() re-matches a track only when its embedding changed or the gallery
+did. A track is settled() - its face may be reported as unknown - only once
+`max_embeds` embeddings have actually been fused (or it matched confidently);
+a claimed frame that never reaches the embedder (dropped by a latest-wins
+queue) is given back with release(), so the track is claimed again on the
+next frame. Tracks unseen for `max_age_s` are dropped.
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Box = Tuple[int, int, int, int]  # x1, y1, x2, y2 (DetectionResult.bbox)
+
+
+@dataclass(eq=False)
+class Track:
+    """One face followed across frames."""
+
+    id: int
+    bbox: Box
+    first_seen: float
+    last_seen: float
+    hits: int = 1
+    attempts: int = 0                   # embeddings requested and not released (see FaceTracker.release)
+    embedded: int = 0                   # embeddings fused
+    last_attempt: float = float("-inf")
+    fused: Optional[np.ndarray] = None  # L2-normalized mean of the track's last max_embeds embeddings
+    match: Any = None                   # MatchResult of `fused` against `gallery`
+    gallery: Any = None
+    confident: bool = False
+    _window: Deque[np.ndarray] = field(default_factory=deque, repr=False)
+    _check: Optional[np.ndarray] = field(default=None, repr=False)  # re-check embedding not matched on its own yet
+    _dirty: bool = field(default=False, repr=False)
+
+    @property
+    def best_score(self) -> Optional[float]:
+        return self.match.best_score if self.match is not None and len(self.match) else None
+
+
+def iou(a: Box, b: Box) -> float:
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / float(union) if union > 0 else 0.0
+
+
+def _center_distance(a: Box, b: Box) -> float:
+    """Distance between box centers in units of `a`'s size."""
+    dx = (a[0] + a[2] - b[0] - b[2]) / 2.0
+    dy = (a[1] + a[3] - b[1] - b[3]) / 2.0
+    size = ((a[2] - a[0]) + (a[3] - a[1])) / 2.0
+    return float(np.hypot(dx, dy)) / max(1.0, size)
+
+
+class FaceTracker:
+    """Tracks for one camera. Thread-safe; stages of a pipeline may share it."""
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_distance: float = 0.75,
+        max_age_s: float = 1.0,
+        max_embeds: int = 3,
+        retry_s: float = 2.0,
+        confident_score: float = 0.75,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.iou_threshold = float(iou_threshold)
+        self.max_distance = float(max_distance)
+        self.max_age_s = float(max_age_s)
+        self.max_embeds = max(1, int(max_embeds))
+        self.retry_s = float(retry_s)
+        self.confident_score = float(confident_score)
+        self.clock = clock
+
+        self._tracks: List[Track] = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.faces = 0
+        self.embeds = 0
+        self.matches = 0
+        self.takeovers = 0
+
+    def update(self, boxes: Sequence[Box]) -> List[Track]:
+        """Assign every box of a new frame to a track (existing or new), in order."""
+        now = self.clock()
+        with self._lock:
+            self._tracks = [t for t in self._tracks if now - t.last_seen <= self.max_age_s]
+            assigned: List[Optional[Track]] = [None] * len(boxes)
+            free = set(range(len(self._tracks)))
+
+            pairs = [
+                (iou(track.bbox, box), ti, bi)
+                for ti, track in enumerate(self._tracks)
+                for bi, box in enumerate(boxes)
+            ]
+            for overlap, ti, bi in sorted(pairs, reverse=True):
+                if overlap < self.iou_threshold:
+                    break
+                if ti in free and assigned[bi] is None:
+                    assigned[bi] = self._tracks[ti]
+                    free.discard(ti)
+
+            # Fast movers (or low frame rates) can leave no overlap: fall back to nearest center
+            pairs = [
+                (_center_distance(self._tracks[ti].bbox, box), ti, bi)
+                for ti in free
+                for bi, box in enumerate(boxes)
+                if assigned[bi] is None
+            ]
+            for distance, ti, bi in sorted(pairs):
+                if distance > self.max_distance:
+                    break
+                if ti in free and assigned[bi] is None:
+                    assigned[bi] = self._tracks[ti]
+                    free.discard(ti)
+
+            for bi, box in enumerate(boxes):
+                track = assigned[bi]
+                if track is None:
+                    track = assigned[bi] = Track(id=self._next_id, bbox=tuple(box), first_seen=now, last_seen=now)
+                    self._next_id += 1
+                    self._tracks.append(track)
+                else:
+                    track.bbox = tuple(box)
+                    track.last_seen = now
+                    track.hits += 1
+            self.faces += len(boxes)
+            return assigned
+
+    def claim(self, track: Track) -> bool:
+        """True (and counted as an attempt) when `track` should be embedded on this frame."""
+        now = self.clock()
+        with self._lock:
+            if track.confident or track.attempts >= self.max_embeds:
+                if now - track.last_attempt < self.retry_s:
+                    return False
+            track.attempts += 1
+            track.last_attempt = now
+            return True
+
+    def release(self, track: Track) -> None:
+        """Give back a claim whose embedding will never be produced (e.g. its frame was dropped)."""
+        with self._lock:
+            if track.attempts > track.embedded:
+                track.attempts -= 1
+                track.last_attempt = float("-inf")
+
+    def settled(self, track: Track) -> bool:
+        """True when the track's match is final enough to act on: confident, or fused from `max_embeds` embeddings."""
+        with self._lock:
+            return track.confident or track.embedded >= self.max_embeds
+
+    def add_embedding(self, track: Track, embedding: np.ndarray) -> None:
+        """
+        Fuse an L2-normalized embedding into the track. An embedding taken after
+        the track settled is a re-check: refresh() also matches it on its own.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1).copy()
+        with self._lock:
+            if track._window and track._window[0].shape != embedding.shape:
+                track._window.clear()
+                track.embedded = 0
+            if track.confident or track.embedded >= self.max_embeds:
+                track._check = embedding
+            track._window.append(embedding)
+            while len(track._window) > self.max_embeds:
+                track._window.popleft()
+            track.embedded += 1
+            track.fused = self._fuse(track._window)
+            track._dirty = True
+            self.embeds += 1
+
+    @staticmethod
+    def _fuse(window) -> np.ndarray:
+        total = np.sum(window, axis=0)
+        norm = float(np.linalg.norm(total))
+        return total / norm if norm > 0 else total
+
+    def _identity(self, match) -> Optional[int]:
+        """Gallery row `match` names as the face's student, or None when it names nobody."""
+        if match is None or not len(match) or match.best_score < self.confident_score:
+            return None
+        return match.best_row
+
+    def _take_over(self, track: Track, embedding: np.ndarray, match, gallery) -> None:
+        """Restart `track` from the re-check `embedding` that disagreed with it, under a new id."""
+        track.id = self._next_id
+        self._next_id += 1
+        track._window = deque([embedding])
+        track.embedded = track.attempts = 1
+        track.fused = embedding
+        track.match = match
+        track.gallery = gallery
+        track.confident = self._identity(match) is not None
+        track._dirty = False
+        self.takeovers += 1
+
+    def refresh(self, tracks: Sequence[Track], view: Callable[[], Any], match_batch: Callable) -> Any:
+        """
+        Bring the match of every track in `tracks` that has an embedding up to
+        date with the current gallery view (`view()`), matching only tracks whose
+        embedding changed or whose match belongs to an older view. `match_batch`
+        takes a (B, D) stack and returns (view, matches). Returns the view all
+        the tracks' matches now refer to.
+        """
+        gallery = view()
+        for _ in range(3):
+            with self._lock:
+                stale = list({
+                    id(t): t for t in tracks if t.fused is not None and (t._dirty or t.gallery is not gallery)
+                }.values())
+                fused = [t.fused for t in stale]
+                checked = [t for t in stale if t._check is not None]
+                checks = [t._check for t in checked]
+                for track in checked:
+                    track._check = None
+            if not stale:
+                break
+            gallery, matches = match_batch(np.stack(fused + checks))
+            with self._lock:
+                for track, embedding, match in zip(stale, fused, matches):
+                    track.match = match
+                    track.gallery = gallery
+                    track.confident = self._identity(match) is not None
+                    # An embedding fused meanwhile (another stage) still needs its own match
+                    track._dirty = track.fused is not embedding
+                for track, embedding, match in zip(checked, checks, matches[len(stale):]):
+                    if self._identity(match) != self._identity(track.match):
+                        self._take_over(track, embedding, match, gallery)
+                self.matches += len(stale) + len(checked)
+        return gallery
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": len(self._tracks),
+                "created": self._next_id - 1,
+                "faces": self.faces,
+                "embeds": self.embeds,
+                "matches": self.matches,
+                "takeovers": self.takeovers,
+                "embeds_per_track": round(self.embeds / (self._next_id - 1), 2) if self._next_id > 1 else 0.0,
+            }
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Import the service packages (gallery, vision, inference, streaming) as app.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
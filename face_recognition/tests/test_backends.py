@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from inference.backends import EmbeddingBackend
+
+
+def test_backend_must_implement_embed():
+    class Incomplete(EmbeddingBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_backend_output_buffer_checks_shape():
+    class Constant(EmbeddingBackend):
+        name = "constant"
+        dim = 4
+
+        def embed(self, faces, out=None):
+            out = self._output(faces, out)
+            out[:] = 0.5
+            return out
+
+    backend = Constant()
+    faces = np.zeros((2, 112, 112, 3), np.float32)
+    assert backend.embed(faces).shape == (2, 4)
+    with pytest.raises(ValueError):
+        backend.embed(faces, out=np.zeros((2, 5), np.float32))
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from inference.cache import UploadCache, content_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_hit_then_expiry():
+    clock = Clock()
+    cache = UploadCache(max_entries=4, ttl=10.0, clock=clock)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_compute("a", compute) == (1, "miss")
+    clock.now = 9.9
+    assert cache.get_or_compute("a", compute) == (1, "hit")
+    clock.now = 10.0
+    assert cache.get_or_compute("a", compute) == (2, "miss")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = UploadCache(max_entries=2, ttl=60.0, clock=Clock())
+    cache.get_or_compute("a", lambda: "A")
+    cache.get_or_compute("b", lambda: "B")
+    assert cache.get_or_compute("a", lambda: "A2") == ("A", "hit")  # "b" is now the oldest
+    cache.get_or_compute("c", lambda: "C")
+
+    assert cache.get_or_compute("a", lambda: "A3") == ("A", "hit")
+    assert cache.get_or_compute("b", lambda: "B2") == ("B2", "miss")
+    assert cache.stats()["evictions"] == 2
+
+
+def test_identical_concurrent_uploads_compute_once():
+    cache = UploadCache(clock=Clock())
+    key = content_key(b"same jpeg bytes")
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "embedding"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute(key, compute)))
+    owner.start()
+    assert started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.get_or_compute(key, compute))) for _ in range(3)]
+    for t in waiters:
+        t.start()
+    wait_for(lambda: cache.stats()["shared"] == 3)
+    release.set()
+    for t in [owner] + waiters:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [("embedding", "miss")] + [("embedding", "shared")] * 3
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_exceptions_reach_waiters_and_are_not_cached():
+    cache = UploadCache(clock=Clock())
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("undecodable image")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_compute("bad", fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=call)
+    owner.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    wait_for(lambda: cache.stats()["shared"] == 1)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert errors == ["undecodable image"] * 2
+    assert cache.stats()["errors"] == 1 and cache.stats()["entries"] == 0
+    assert cache.get_or_compute("bad", lambda: "fixed") == ("fixed", "miss")
+
+
+def test_max_entries_must_be_positive():
+    with pytest.raises(ValueError):
+        UploadCache(max_entries=0)
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from gallery import MatchResult, fuse_scores, match_top_k, match_top_k_batch, quantize, top_k_from_scores
+from gallery.matcher import _rank
+
+
+def unit_rows(n, dim=64, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def cosine_loop(matrix, query):
+    """The per-student loop the matcher replaced: 1 - scipy cosine distance, row by row."""
+    return [float(np.dot(row, query) / (np.linalg.norm(row) * np.linalg.norm(query))) for row in matrix]
+
+
+def test_top_k_matches_per_row_cosine_loop():
+    matrix = unit_rows(200)
+    query = np.random.default_rng(1).normal(size=64).astype(np.float32) * 3.0  # not normalized
+
+    result = match_top_k(matrix, query, k=5)
+
+    expected = cosine_loop(matrix, query)
+    order = np.argsort(expected)[::-1][:5]
+    assert result.best_row == int(np.argmax(expected))
+    np.testing.assert_array_equal(result.rows, order)
+    np.testing.assert_allclose(result.scores, np.asarray(expected)[order], atol=1e-5)
+
+
+def test_batch_matches_single_queries():
+    matrix = unit_rows(300)
+    queries = unit_rows(7, seed=2)
+
+    batch = match_top_k_batch(matrix, queries, k=4)
+
+    for q, got in zip(queries, batch):
+        single = match_top_k(matrix, q, k=4)
+        np.testing.assert_array_equal(got.rows, single.rows)
+        np.testing.assert_allclose(got.scores, single.scores, atol=1e-6)
+
+
+def test_k_larger_than_gallery_returns_every_row_sorted():
+    matrix = unit_rows(3)
+    result = match_top_k(matrix, matrix[1], k=10)
+
+    assert len(result) == 3
+    assert result.best_row == 1
+    assert np.all(np.diff(result.scores) <= 0)
+
+
+def test_empty_gallery_and_k_zero():
+    assert len(match_top_k(np.zeros((0, 8), np.float32), np.ones(8, np.float32), k=5)) == 0
+    assert len(top_k_from_scores(np.array([0.5, 0.2], np.float32), 0)) == 0
+
+
+def test_ties_keep_k_results_with_equal_scores():
+    scores = np.array([0.3, 0.9, 0.9, 0.1, 0.9], dtype=np.float32)
+    result = top_k_from_scores(scores, 2)
+
+    assert len(result) == 2
+    assert set(result.rows.tolist()) <= {1, 2, 4}
+    np.testing.assert_array_equal(result.scores, np.float32([0.9, 0.9]))
+    assert result.margin == 0.0
+
+
+def test_margin():
+    single = MatchResult(np.array([4]), np.array([0.8], np.float32))
+    pair = MatchResult(np.array([4, 2]), np.array([0.8, 0.5], np.float32))
+    empty = MatchResult(np.empty(0, np.int64), np.empty(0, np.float32))
+
+    assert single.margin == pytest.approx(0.8)
+    assert pair.margin == pytest.approx(0.3)
+    assert empty.margin == 0.0
+    assert empty.best_row == -1
+
+
+def test_query_size_mismatch_raises():
+    with pytest.raises(ValueError):
+        match_top_k(unit_rows(5, dim=8), np.ones(9, np.float32))
+
+
+def test_rank_does_not_modify_scores_in_place():
+    matrix = unit_rows(100)
+    codes, scales = quantize.encode(matrix, "int8")
+    q = unit_rows(1, seed=3)[0]
+    scores = quantize.scores(codes, q, scales)
+    before = scores.copy()
+    identity = np.arange(100) // 2
+    representative = np.arange(0, 100, 2)
+
+    _rank(scores, codes, q, 5, scales, 32, identity, representative, "max")
+
+    np.testing.assert_array_equal(scores, before)
+
+
+@pytest.mark.parametrize("mode", ["max", "mean"])
+def test_fusion_per_identity(mode):
+    scores = np.array([0.9, 0.1, 0.5, 0.6], dtype=np.float32)
+    identity = np.array([0, 0, 1, 1])
+
+    fused = fuse_scores(scores, identity, 2, mode)
+
+    expected = [0.9, 0.6] if mode == "max" else [0.5, 0.55]
+    np.testing.assert_allclose(fused, expected, atol=1e-6)
+
+
+def test_multi_template_returns_representative_rows():
+    matrix = unit_rows(6)
+    identity = np.array([0, 0, 1, 1, 2, 2])
+    representative = np.array([0, 2, 4])
+
+    result = match_top_k(matrix, matrix[3], k=3, identity=identity, representative=representative)
+
+    assert result.best_row == 2  # student 1's first row, matched through its second template
+    assert set(result.rows.tolist()) == {0, 2, 4}
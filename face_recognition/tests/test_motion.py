@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from streaming import MotionGate, parse_roi
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def frame(value=80, box=None, size=(240, 320)):
+    """Flat grey BGR frame, with an optional bright (x0, y0, x1, y1) box - someone walking in."""
+    image = np.full(size + (3,), value, np.uint8)
+    if box is not None:
+        x0, y0, x1, y1 = box
+        image[y0:y1, x0:x1] = 250
+    return image
+
+
+def settled_gate(clock, **kwargs):
+    """Gate that has seen the empty scene and is outside its hold window."""
+    gate = MotionGate(clock=clock, **kwargs)
+    assert gate.moving(frame())
+    clock.now += 10.0
+    return gate
+
+
+def test_first_frame_is_forwarded():
+    gate = MotionGate(clock=Clock())
+    assert gate.moving(frame())
+    assert gate.stats()["forwarded"] == 1 and gate.last_changed == 1.0
+
+
+def test_static_frames_are_skipped():
+    clock = Clock()
+    gate = settled_gate(clock, hold_s=2.0)
+    for _ in range(5):
+        clock.now += 0.1
+        assert not gate.moving(frame())
+    stats = gate.stats()
+    # Only the first frame (nothing to compare against) counted as motion
+    assert stats["skipped"] == 5 and stats["motion_frames"] == 1
+
+
+def test_motion_is_held_for_hold_s():
+    clock = Clock()
+    # The background takes each frame in at once, so a person standing still stops counting as motion
+    gate = settled_gate(clock, hold_s=2.0, learning_rate=1.0)
+    assert gate.moving(frame(box=(100, 60, 180, 160)))
+
+    # Person stops in front of the camera: the scene is static again but still forwarded
+    clock.now += 1.9
+    assert gate.moving(frame(box=(100, 60, 180, 160)))
+    clock.now += 0.2
+    assert not gate.moving(frame(box=(100, 60, 180, 160)))
+    assert gate.stats()["motion_frames"] == 2
+
+
+def test_refresh_s_forces_a_frame_through():
+    clock = Clock()
+    gate = settled_gate(clock, hold_s=0.0, refresh_s=5.0)
+    clock.now += 0.1
+    assert gate.moving(frame())  # 10 s since the last forwarded frame
+    clock.now += 4.0
+    assert not gate.moving(frame())
+    clock.now += 1.0
+    assert gate.moving(frame())
+
+
+def test_motion_outside_roi_is_ignored():
+    clock = Clock()
+    # Left half of the frame only
+    gate = settled_gate(clock, roi=parse_roi("0,0,0.5,1"), hold_s=0.0)
+    assert not gate.moving(frame(box=(200, 60, 300, 200)))
+    clock.now += 0.1
+    assert gate.moving(frame(box=(20, 60, 120, 200)))
+    assert gate.stats()["roi"] == [0.0, 0.0, 0.5, 1.0]
+
+
+@pytest.mark.parametrize("text", ["0,0,1", "0.5,0,0.5,1", "0,0,1.5,1"])
+def test_parse_roi_rejects_bad_regions(text):
+    with pytest.raises(ValueError):
+        parse_roi(text)
+
+
+def test_parse_roi_empty_is_whole_frame():
+    assert parse_roi("") is None and parse_roi("  ") is None
@@ -0,0 +1,67 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from vision import DetectionResult, QualityThresholds, assess_face, decode_image, decode_scale, image_size
+from vision.quality import FACE_TOO_SMALL
+
+
+def detection(image, bbox):
+    return DetectionResult(
+        bbox=bbox,
+        score=0.9,
+        keypoints=[],
+        image_size=(image.shape[1], image.shape[0]),
+        transform=None,
+        source=image,
+    )
+
+
+def test_reduced_decode_scale_matches_upload_size():
+    upload = np.random.default_rng(0).integers(0, 256, size=(2400, 3200, 3), dtype=np.uint8)
+    data = cv2.imencode(".jpg", upload)[1].tobytes()
+    image = decode_image(data, max_side=800)
+    assert image.shape[:2] == (600, 800)
+    assert decode_scale(data, image) == 4.0
+    assert decode_scale(data, decode_image(data, max_side=None)) == 1.0
+    assert decode_scale(b"not an image", image) == 1.0
+
+
+def with_orientation(jpeg, orientation, order="MM"):
+    """`jpeg` with an EXIF APP1 segment carrying `orientation`, as phones write it."""
+    fmt = ">" if order == "MM" else "<"
+    tiff = order.encode() + struct.pack(fmt + "HI", 42, 8) + struct.pack(fmt + "H", 1)
+    tiff += struct.pack(fmt + "HHIHH", 0x0112, 3, 1, orientation, 0) + struct.pack(fmt + "I", 0)
+    payload = b"Exif\x00\x00" + tiff
+    return jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + jpeg[2:]
+
+
+@pytest.mark.parametrize("orientation,order", [(1, "MM"), (3, "II"), (6, "MM"), (8, "II")])
+def test_exif_rotated_jpeg_size_matches_decoded_image(orientation, order):
+    upload = np.random.default_rng(2).integers(0, 256, size=(2400, 3200, 3), dtype=np.uint8)
+    data = with_orientation(cv2.imencode(".jpg", upload)[1].tobytes(), orientation, order)
+
+    full = decode_image(data, max_side=None)
+    assert image_size(data) == (full.shape[1], full.shape[0])
+    assert decode_scale(data, full) == 1.0
+    reduced = decode_image(data, max_side=800)
+    assert decode_scale(data, reduced) == 4.0
+
+    face = detection(reduced, (10, 20, 110, 220))
+    rescaled = face.rescaled(image_size(data))
+    assert rescaled.bbox == (40, 80, 440, 880)
+
+
+def test_min_face_px_is_in_upload_pixels():
+    # A 200 px face in the upload is 50 px after a 1/4 reduced decode
+    image = np.random.default_rng(1).integers(0, 256, size=(600, 800, 3), dtype=np.uint8)
+    face = detection(image, (100, 100, 150, 150))
+    thresholds = QualityThresholds(min_face_px=60, min_sharpness=0.0)
+
+    small = assess_face(face, thresholds)
+    assert small.reason == FACE_TOO_SMALL and small.face_px == 50
+
+    full = assess_face(face, thresholds, scale=4.0)
+    assert full.ok and full.face_px == 200
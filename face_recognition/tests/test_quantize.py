@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from gallery import FaceGallery, match_top_k, quantize
+
+
+def unit_rows(n, dim=512, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("dtype, bound", [("float32", 0.0), ("float16", 1e-3), ("int8", None)])
+def test_encode_decode_round_trip(dtype, bound):
+    matrix = unit_rows(500)
+
+    codes, scales = quantize.encode(matrix, dtype)
+    decoded = quantize.decode(codes, scales)
+
+    assert codes.dtype == np.dtype(dtype)
+    assert (scales is not None) == (dtype == "int8")
+    error = np.abs(decoded - matrix).max(axis=1)
+    if bound is None:
+        # int8 rounds to half a quantization step of each row's scale
+        bound = scales / 2 + 1e-7
+    assert np.all(error <= bound)
+
+
+def test_int8_zero_row_round_trips():
+    codes, scales = quantize.encode(np.zeros((2, 8), np.float32), "int8")
+    np.testing.assert_array_equal(quantize.decode(codes, scales), 0.0)
+
+
+def test_unknown_dtype_rejected():
+    with pytest.raises(ValueError):
+        quantize.encode(unit_rows(2, dim=4), "bfloat16")
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_storage_picks_float32_top1(dtype):
+    gallery = unit_rows(2000)
+    # Noisy probes of known rows, as a camera would give for enrolled students
+    rng = np.random.default_rng(1)
+    targets = rng.choice(len(gallery), size=100, replace=False)
+    queries = gallery[targets] + rng.normal(scale=0.03, size=(100, gallery.shape[1])).astype(np.float32)
+    codes, scales = quantize.encode(gallery, dtype)
+
+    for q in queries:
+        exact = match_top_k(gallery, q, k=5)
+        compact = match_top_k(codes, q, k=5, scales=scales)
+        assert compact.best_row == exact.best_row
+        assert compact.best_score == pytest.approx(exact.best_score, abs=2e-3)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_gallery_storage_dtypes_agree(dtype):
+    vectors = unit_rows(300, seed=4)
+    gallery = FaceGallery(dim=512, dtype=dtype)
+    gallery.load({"register_number": f"R{i}", "embedding": v, "full_name": f"S{i}"} for i, v in enumerate(vectors))
+
+    for i in (0, 57, 299):
+        view, result = gallery.match(vectors[i], k=3)
+        assert view.register_numbers[result.best_row] == f"R{i}"
+        assert result.best_score == pytest.approx(1.0, abs=2e-3)
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference import MicroBatchScheduler
+
+
+def faces(*values):
+    """(n, 2, 2, 1) stack whose face i is filled with values[i]."""
+    return np.stack([np.full((2, 2, 1), v, np.float32) for v in values])
+
+
+class Backend:
+    """run_batch stand-in: (n, 1) rows echoing each face's value; the first call blocks until released."""
+
+    def __init__(self, fail=False):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, batch):
+        self.calls.append(len(batch))
+        if len(self.calls) == 1:
+            self.started.set()
+            self.release.wait(5)
+        elif self.fail:
+            raise RuntimeError("onnx exploded")
+        return batch[:, 0, 0, :].copy()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def blocked_scheduler(backend, max_batch=8):
+    """Scheduler whose dispatcher is busy on a first 1-face batch, so later submits pile up."""
+    scheduler = MicroBatchScheduler(backend, max_batch=max_batch, max_wait_ms=0)
+    first = scheduler.submit(faces(-1))
+    assert backend.started.wait(5)
+    return scheduler, first
+
+
+def test_concurrent_submits_share_one_batch():
+    backend = Backend()
+    scheduler, first = blocked_scheduler(backend)
+    results = {}
+
+    def call(value):
+        results[value] = scheduler.embed(faces(value))
+
+    threads = [threading.Thread(target=call, args=(v,)) for v in (1, 2, 3)]
+    for t in threads:
+        t.start()
+    wait_for(lambda: scheduler.stats()["queue_depth"] == 4)
+    backend.release.set()
+    for t in threads:
+        t.join(5)
+
+    assert backend.calls == [1, 3]
+    assert first.result(5)[0, 0] == -1
+    assert {v: float(r[0, 0]) for v, r in results.items()} == {1: 1.0, 2: 2.0, 3: 3.0}
+    assert scheduler.stats()["batch_sizes"] == {1: 1, 3: 1}
+    scheduler.stop()
+
+
+def test_split_at_max_batch_carries_the_rest():
+    backend = Backend()
+    scheduler, _ = blocked_scheduler(backend, max_batch=4)
+    out = np.zeros((2, 1), np.float32)
+    futures = [scheduler.submit(faces(1, 1, 1)), scheduler.submit(faces(2, 2), out), scheduler.submit(faces(3))]
+    big = scheduler.submit(faces(*range(10, 16)))
+    backend.release.set()
+
+    rows = [f.result(5) for f in futures]
+    # 3 + 2 would overflow max_batch: the 2-face item is carried into the next batch with the 1-face one
+    assert backend.calls == [1, 3, 3, 6]
+    assert rows[1] is out and out[:, 0].tolist() == [2.0, 2.0]
+    assert rows[0][:, 0].tolist() == [1.0, 1.0, 1.0] and rows[2][:, 0].tolist() == [3.0]
+    assert big.result(5)[:, 0].tolist() == list(range(10, 16))
+    scheduler.stop()
+
+
+def test_batch_error_reaches_every_waiter():
+    backend = Backend(fail=True)
+    scheduler, first = blocked_scheduler(backend)
+    futures = [scheduler.submit(faces(v)) for v in (1, 2, 3)]
+    backend.release.set()
+
+    first.result(5)
+    for future in futures:
+        with pytest.raises(RuntimeError, match="onnx exploded"):
+            future.result(5)
+    assert scheduler.stats()["errors"] == 1
+    # The dispatcher survives a failed batch
+    backend.fail = False
+    assert scheduler.embed(faces(7))[0, 0] == 7
+    scheduler.stop()
+
+
+def test_stop_finishes_queued_work_then_rejects_submits():
+    backend = Backend()
+    scheduler, first = blocked_scheduler(backend)
+    queued = scheduler.submit(faces(5))
+    stopper = threading.Thread(target=scheduler.stop)
+    stopper.start()
+    backend.release.set()
+    stopper.join(5)
+
+    assert first.result(0)[0, 0] == -1 and queued.result(0)[0, 0] == 5
+    assert not scheduler.stats()["running"]
+    with pytest.raises(RuntimeError, match="stopped"):
+        scheduler.submit(faces(6))
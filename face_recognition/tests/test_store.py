@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from gallery import FaceGallery, IVFIndex, open_snapshot, write_snapshot
+from gallery.store import DEFAULT_HOSTEL_STATUS
+
+
+def unit_rows(n, dim=32, seed=0):
+    rows = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_missing_hostel_status_same_after_load_and_upsert():
+    vectors = unit_rows(2)
+    gallery = FaceGallery(dim=32)
+    gallery.load([
+        {"register_number": "A", "embedding": vectors[0]},
+        {"register_number": "B", "embedding": vectors[0], "hostel_status": None},
+    ])
+    gallery.upsert("C", vectors[1])
+    gallery.apply(upserts=[{"register_number": "D", "embedding": vectors[1], "hostel_status": None}])
+
+    view = gallery.view()
+    for reg in "ABCD":
+        assert view.student(view.rows[reg][0])["hostel_status"] == DEFAULT_HOSTEL_STATUS
+
+
+def test_upsert_keeps_existing_fields():
+    vectors = unit_rows(2)
+    gallery = FaceGallery(dim=32)
+    gallery.load([{"register_number": "A", "embedding": vectors[0], "full_name": "Asha", "hostel_status": "resident"}])
+
+    gallery.upsert("A", vectors[1])
+
+    view = gallery.view()
+    student = view.student(view.rows["A"][0])
+    assert student["full_name"] == "Asha"
+    assert student["hostel_status"] == "resident"
+
+
+def test_snapshot_install_is_mapped_until_first_change(tmp_path):
+    vectors = unit_rows(4)
+    source = FaceGallery(dim=32)
+    source.load({"register_number": f"R{i}", "embedding": v} for i, v in enumerate(vectors))
+    write_snapshot(str(tmp_path), source.view(), source.dtype)
+    snap = open_snapshot(str(tmp_path))
+
+    gallery = FaceGallery(dim=32)
+    gallery.install(snap["matrix"], snap["scales"], snap["student_ids"], snap["register_numbers"],
+                    snap["full_names"], snap["hostel_statuses"])
+    assert gallery.stats()["mapped"]
+
+    gallery.upsert("R9", vectors[0])
+    assert not gallery.stats()["mapped"]
+    assert len(gallery) == 5
+
+
+def test_concurrent_snapshot_writers_claim_distinct_versions(tmp_path):
+    source = FaceGallery(dim=32)
+    source.load({"register_number": f"R{i}", "embedding": v} for i, v in enumerate(unit_rows(3)))
+    assert write_snapshot(str(tmp_path), source.view(), source.dtype) == 1
+    # Another worker has claimed v2 but not finished writing it
+    (tmp_path / "gallery-v2.json").touch()
+
+    assert write_snapshot(str(tmp_path), source.view(), source.dtype, extra={"watermark": "w"}) == 3
+    snap = open_snapshot(str(tmp_path))
+    assert snap["version"] == 3 and snap["watermark"] == "w" and snap["count"] == 3
+
+
+@pytest.mark.parametrize("fusion", ["max", "mean"])
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_ann_path_fuses_like_exact_path(fusion, dtype):
+    rng = np.random.default_rng(5)
+    entries = []
+    for i in range(60):
+        base = unit_rows(1, seed=100 + i)[0]
+        templates = base + rng.normal(scale=0.3, size=(3, 32)).astype(np.float32)
+        entries.append({"register_number": f"R{i}", "embedding": templates})
+    exact = FaceGallery(dim=32, dtype=dtype, fusion=fusion)
+    exact.load(entries)
+    # nprobe covering every list makes the index exhaustive, so only fusion can differ
+    ann = FaceGallery(dim=32, dtype=dtype, fusion=fusion, index=IVFIndex(dim=32, nlist=4, nprobe=4), ann_min_size=1)
+    ann.load(entries)
+
+    for query in unit_rows(10, seed=9):
+        _, want = exact.match(query, k=3)
+        view, got = ann.match(query, k=3)
+        assert [view.register_numbers[r] for r in got.rows] == [exact.view().register_numbers[r] for r in want.rows]
+        # int8: the exact path rescores only its shortlist, other templates keep coarse scores
+        np.testing.assert_allclose(got.scores, want.scores, atol=1e-5 if dtype == "float32" else 1e-3)
+
+
+@pytest.mark.parametrize("fusion", ["max", "mean"])
+def test_verify_fuses_student_templates(fusion):
+    templates = unit_rows(3, seed=7)
+    gallery = FaceGallery(dim=32, fusion=fusion)
+    gallery.load([{"register_number": "A", "embedding": templates}, {"register_number": "B", "embedding": unit_rows(1)[0]}])
+
+    per_template = templates @ templates[1]
+    expected = per_template.max() if fusion == "max" else per_template.mean()
+    assert gallery.verify("A", templates[1]) == pytest.approx(float(expected), abs=1e-5)
+    assert gallery.verify("missing", templates[1]) is None
+
+
+def test_ivf_items_round_trip_through_save(tmp_path):
+    vectors = unit_rows(40)
+    index = IVFIndex(dim=32, nlist=4)
+    index.build([str(i) for i in range(40)], vectors)
+    path = str(tmp_path / "ivf.npz")
+    index.save(path)
+
+    keys, saved = IVFIndex.load(path).items()
+    assert len(keys) == 40 and IVFIndex.load(path).keys() == keys
+    order = [int(k) for k in keys]
+    np.testing.assert_array_equal(saved, vectors[order])
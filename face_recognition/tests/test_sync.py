@@ -0,0 +1,101 @@
+import numpy as np
+
+from gallery import FaceGallery, GallerySync
+
+
+def unit(seed, dim=16):
+    v = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+class Students:
+    """In-memory students table answering the keyset query app.fetch_student_changes sends."""
+
+    def __init__(self):
+        self.rows = {}
+        self.calls = []
+        self.fail = False
+
+    def put(self, reg, updated_at, active=True, seed=0):
+        self.rows[reg] = {
+            "id": reg,
+            "register_number": reg,
+            "full_name": f"Student {reg}",
+            "hostel_status": "resident",
+            "face_embedding": unit(seed).tolist(),
+            "is_active": active,
+            "updated_at": updated_at,
+        }
+
+    def fetch(self, since, after, limit):
+        self.calls.append((since, after, limit))
+        if self.fail:
+            raise ConnectionError("supabase unavailable")
+        rows = sorted(self.rows.values(), key=lambda r: (r["updated_at"], r["register_number"]))
+        if since is not None:
+            rows = [
+                r for r in rows
+                if r["updated_at"] > since or (r["updated_at"] == since and (after is None or r["register_number"] > after))
+            ]
+        return [dict(r) for r in rows[:limit]]
+
+
+def parse(row):
+    return np.asarray(row["face_embedding"], dtype=np.float32) if row.get("face_embedding") else None
+
+
+def new_sync(table, page_size=2):
+    gallery = FaceGallery(dim=16)
+    return gallery, GallerySync(gallery, table.fetch, parse, page_size=page_size)
+
+
+def test_pages_past_rows_with_equal_updated_at():
+    table = Students()
+    for i, reg in enumerate("EDCBA"):
+        table.put(reg, "2025-01-01T00:00:00+00:00", seed=i)
+    gallery, sync = new_sync(table, page_size=2)
+
+    assert sync.poll() == 5
+    assert sorted(gallery.view().rows) == list("ABCDE")
+    # Every page resumed after the last (updated_at, register_number) applied
+    assert [after for _, after, _ in table.calls] == [None, "B", "D"]
+    assert sync.watermark == "2025-01-01T00:00:00+00:00"
+
+    table.put("F", "2025-01-01T00:00:00+00:00", seed=9)
+    assert sync.poll() == 1
+    assert "F" in gallery.view().rows
+
+
+def test_removes_deactivated_and_cleared_rows():
+    table = Students()
+    table.put("A", "2025-01-01T00:00:00+00:00", seed=1)
+    table.put("B", "2025-01-01T00:00:01+00:00", seed=2)
+    table.put("C", "2025-01-01T00:00:02+00:00", seed=3)
+    gallery, sync = new_sync(table)
+    sync.poll()
+    assert len(gallery) == 3
+
+    table.put("A", "2025-01-02T00:00:00+00:00", active=False)
+    table.rows["B"].update(face_embedding=None, updated_at="2025-01-02T00:00:01+00:00")
+    assert sync.poll() == 2
+    assert sorted(gallery.view().rows) == ["C"]
+    assert sync.stats()["total_removals"] == 2
+
+
+def test_failed_poll_is_counted_and_retried_from_the_same_cursor():
+    table = Students()
+    table.put("A", "2025-01-01T00:00:00+00:00")
+    gallery, sync = new_sync(table)
+    sync.poll()
+
+    table.put("B", "2025-01-02T00:00:00+00:00", seed=2)
+    table.fail = True
+    assert sync.poll() == 0
+    stats = sync.stats()
+    assert stats["errors"] == 1 and "unavailable" in stats["last_error"]
+    assert sync.watermark == "2025-01-01T00:00:00+00:00"
+
+    table.fail = False
+    assert sync.poll() == 1
+    assert "B" in gallery.view().rows
+    assert sync.stats()["errors"] == 1 and sync.stats()["last_error"] is None
@@ -0,0 +1,131 @@
+import numpy as np
+
+from gallery import FaceGallery
+from streaming import FaceTracker
+from streaming.pipeline import LatestQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def unit(seed, dim=8):
+    v = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def near(v, seed, noise=0.1):
+    w = v + noise * np.random.default_rng(seed).normal(size=v.shape).astype(np.float32)
+    return w / np.linalg.norm(w)
+
+
+def two_students(dim=32):
+    a, b = unit(100, dim), unit(200, dim)
+    gallery = FaceGallery(dim=dim)
+    gallery.load([{"register_number": "A", "embedding": a}, {"register_number": "B", "embedding": b}])
+    return gallery, a, b
+
+
+def refresh(tracker, track, gallery):
+    view = tracker.refresh([track], gallery.view, lambda q: gallery.match_batch(q, k=2))
+    return view.student(track.match.best_row)["register_number"], track.best_score
+
+
+def settled_track(tracker, gallery, a):
+    track = tracker.update([(0, 0, 100, 100)])[0]
+    for seed in range(3):
+        assert tracker.claim(track)
+        tracker.add_embedding(track, near(a, seed))
+    assert refresh(tracker, track, gallery)[0] == "A" and tracker.settled(track)
+    return track
+
+
+def test_track_taken_over_by_another_student_restarts():
+    gallery, a, b = two_students()
+    clock = Clock()
+    tracker = FaceTracker(max_embeds=3, retry_s=2.0, confident_score=0.75, clock=clock)
+    track = settled_track(tracker, gallery, a)
+    first_id = track.id
+
+    # Someone else steps into the box: one re-check embedding decides
+    clock.now += 2.0
+    assert tracker.claim(track)
+    tracker.add_embedding(track, near(b, 10))
+    student, score = refresh(tracker, track, gallery)
+    assert student == "B" and score > 0.75
+    assert track.id != first_id and track.embedded == 1 and track.confident
+    np.testing.assert_allclose(track.fused, near(b, 10))
+    assert tracker.stats()["takeovers"] == 1
+
+
+def test_takeover_by_stranger_drops_the_student():
+    gallery, a, _ = two_students()
+    clock = Clock()
+    tracker = FaceTracker(max_embeds=3, retry_s=2.0, confident_score=0.75, clock=clock)
+    track = settled_track(tracker, gallery, a)
+
+    clock.now += 2.0
+    assert tracker.claim(track)
+    tracker.add_embedding(track, unit(300, 32))
+    refresh(tracker, track, gallery)
+    assert track.best_score < 0.75 and not track.confident and track.embedded == 1
+    # Not reported as unknown until the stranger has max_embeds embeddings of their own
+    assert not tracker.settled(track)
+
+
+def test_agreeing_recheck_keeps_track_and_window():
+    gallery, a, _ = two_students()
+    clock = Clock()
+    tracker = FaceTracker(max_embeds=3, retry_s=2.0, confident_score=0.75, clock=clock)
+    track = settled_track(tracker, gallery, a)
+    first_id = track.id
+
+    for step in range(4):
+        clock.now += 2.0
+        assert tracker.claim(track)
+        tracker.add_embedding(track, near(a, 20 + step))
+        assert refresh(tracker, track, gallery)[0] == "A"
+    assert track.id == first_id and track.embedded == 7
+    assert len(track._window) == 3 and tracker.stats()["takeovers"] == 0
+
+
+def test_dropped_claims_are_claimed_again():
+    clock = Clock()
+    tracker = FaceTracker(max_embeds=3, retry_s=2.0, clock=clock)
+    track = tracker.update([(0, 0, 100, 100)])[0]
+
+    claimed = [tracker.claim(track) for _ in range(4)]
+    assert claimed == [True, True, True, False]
+    # Two of the three frames never reach the embedder
+    tracker.add_embedding(track, unit(0))
+    tracker.release(track)
+    tracker.release(track)
+    assert not tracker.settled(track)
+
+    clock.now += 0.1
+    assert tracker.claim(track) and tracker.claim(track)
+    assert not tracker.claim(track)
+    tracker.add_embedding(track, unit(1))
+    tracker.add_embedding(track, unit(2))
+    assert track.embedded == 3 and tracker.settled(track)
+
+
+def test_release_never_gives_back_fused_embeddings():
+    tracker = FaceTracker(max_embeds=2, clock=Clock())
+    track = tracker.update([(0, 0, 100, 100)])[0]
+    assert tracker.claim(track)
+    tracker.add_embedding(track, unit(0))
+    tracker.release(track)
+    assert track.attempts == 1
+
+
+def test_latest_queue_reports_dropped_items():
+    dropped = []
+    queue = LatestQueue(1, on_drop=dropped.append)
+    assert not queue.put("a")
+    assert queue.put("b")
+    assert dropped == ["a"] and queue.get() == "b"
@@ -0,0 +1,26 @@
+# Vision layer for the face recognition service
+# Face detection and crop preprocessing shared by the registration and recognition endpoints.
+
+from .detector import DetectorPool, mediapipe_face_detector
+from .detection import DetectionResult, detect_faces
+from .align import ALIGNMENTS, ARCFACE_INPUT, FaceInputSpec, face_inputs
+from .decode import decode_image, decode_scale, downscale, image_size
+from .quality import QualityResult, QualityThresholds, assess_face
+
+__all__ = [
+    "DetectorPool",
+    "mediapipe_face_detector",
+    "DetectionResult",
+    "ALIGNMENTS",
+    "ARCFACE_INPUT",
+    "FaceInputSpec",
+    "face_inputs",
+    "detect_faces",
+    "decode_image",
+    "decode_scale",
+    "downscale",
+    "image_size",
+    "QualityResult",
+    "QualityThresholds",
+    "assess_face",
+]
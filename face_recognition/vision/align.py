@@ -0,0 +1,120 @@
+"""
+Face alignment straight into reusable ArcFace input buffers.
+
+Each face is sampled once into a per-thread 112x112 uint8 scratch, swapped
+BGR->RGB into a second scratch when the model wants RGB, then converted/centred
+into a per-thread (B, 112, 112, 3) float32 input buffer and scaled in place.
+Channel order, mean and scale come from a FaceInputSpec (ArcFace by default;
+embedding backends declare their own). Nothing is allocated per request once
+a thread's buffers have grown to the largest batch it has seen.
+
+Two alignments are available:
+    "bbox"       the detector box stretched to 112x112 with cv2.resize into
+                 the scratch - the same sampling as the old crop + resize, so
+                 embeddings stay compatible with already registered templates
+    "keypoints"  one cv2.warpAffine with the similarity transform that puts
+                 the MediaPipe eye keypoints on the ArcFace reference eye
+                 positions (rotation/scale normalized); templates must be
+                 re-registered after switching
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+FACE_SIZE = 112
+ALIGNMENTS = ("bbox", "keypoints")
+
+# ArcFace reference eye centres in the 112x112 frame (image-left eye first)
+_REF_EYES = np.array([[38.2946, 51.6963], [73.5318, 51.5014]], dtype=np.float64)
+
+_local = threading.local()
+
+
+@dataclass(frozen=True)
+class FaceInputSpec:
+    """Pixel layout an embedding model expects: (x - mean) * scale, RGB or BGR order."""
+
+    rgb: bool = True
+    mean: float = 127.5
+    scale: float = 1.0 / 128.0
+
+
+ARCFACE_INPUT = FaceInputSpec()
+
+
+def eyes_transform(image_left_eye: Sequence[float], image_right_eye: Sequence[float]) -> Optional[np.ndarray]:
+    """
+    Inverse similarity map (112 frame -> source) that lands the two eye points
+    on the ArcFace reference eyes. None when the eyes coincide.
+    """
+    src = np.asarray([image_left_eye, image_right_eye], dtype=np.float64)
+    d_src = src[1] - src[0]
+    d_ref = _REF_EYES[1] - _REF_EYES[0]
+    norm = float(np.dot(d_ref, d_ref))
+    if norm == 0 or not np.any(d_src):
+        return None
+    # Complex-number form of the similarity: src = a * ref + t, with a = scale * e^(i*theta)
+    a = (d_src[0] * d_ref[0] + d_src[1] * d_ref[1]) / norm
+    b = (d_src[1] * d_ref[0] - d_src[0] * d_ref[1]) / norm
+    tx = src[0, 0] - (a * _REF_EYES[0, 0] - b * _REF_EYES[0, 1])
+    ty = src[0, 1] - (b * _REF_EYES[0, 0] + a * _REF_EYES[0, 1])
+    return np.array([[a, -b, tx], [b, a, ty]], dtype=np.float64)
+
+
+def _buffers(batch: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    scratch = getattr(_local, "scratch", None)
+    if scratch is None:
+        scratch = _local.scratch = np.empty((2, FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8)
+    inputs = getattr(_local, "inputs", None)
+    if inputs is None or inputs.shape[0] < batch:
+        inputs = _local.inputs = np.empty((max(batch, 1), FACE_SIZE, FACE_SIZE, 3), dtype=np.float32)
+    return scratch[0], scratch[1], inputs
+
+
+def align_into(
+    image: np.ndarray,
+    bbox: Tuple[int, int, int, int],
+    transform: Optional[np.ndarray],
+    bgr: np.ndarray,
+    rgb: np.ndarray,
+    out: np.ndarray,
+    spec: FaceInputSpec = ARCFACE_INPUT,
+) -> None:
+    """
+    Sample one face of BGR `image` into the uint8 scratches `bgr`/`rgb` and
+    write its model input into `out` (112, 112, 3) float32. `transform` is
+    an inverse 2x3 map (see eyes_transform); None stretches `bbox`.
+    """
+    if transform is None:
+        x1, y1, x2, y2 = bbox
+        cv2.resize(image[y1:y2, x1:x2], (FACE_SIZE, FACE_SIZE), dst=bgr)
+    else:
+        cv2.warpAffine(
+            image,
+            transform,
+            (FACE_SIZE, FACE_SIZE),
+            dst=bgr,
+            flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_REPLICATE,
+        )
+    if spec.rgb:
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=rgb)
+    # ArcFace: (x - 127.5) / 128; 1/128 is exact in float32 so this matches the old division
+    np.subtract(rgb if spec.rgb else bgr, np.float32(spec.mean), out=out, dtype=np.float32)
+    out *= np.float32(spec.scale)
+
+
+def face_inputs(detections: Sequence, spec: FaceInputSpec = ARCFACE_INPUT) -> np.ndarray:
+    """
+    (B, 112, 112, 3) float32 model inputs for `detections`, written into this
+    thread's reusable buffer. The returned array is only valid until the next
+    call from the same thread; copy it to keep it longer.
+    """
+    bgr, rgb, inputs = _buffers(len(detections))
+    for i, detection in enumerate(detections):
+        align_into(detection.source, detection.bbox, detection.transform, bgr, rgb, inputs[i], spec)
+    return inputs[:len(detections)]
@@ -0,0 +1,138 @@
+"""
+Reduced-resolution image decode.
+
+Phones and the dashboard upload full-size JPEGs, but the detector works on a
+~128 px input and ArcFace on a 112 px crop. The JPEG/PNG header is read first
+(no pixel decode) and, when the image is much larger than `max_side`, OpenCV's
+IMREAD_REDUCED_COLOR_{2,4,8} decodes it at 1/2, 1/4 or 1/8 scale directly in
+the DCT domain - a 12 MP upload is decoded at 3 MP or less, which cuts decode
+time and peak memory. The result is still large enough to crop faces from;
+detection itself runs on a further downscaled copy (see vision.detection).
+"""
+
+import struct
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers carrying the image size (all SOFn except DHT/JPG/DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_APP1 = 0xE1
+_EXIF_ORIENTATION = 0x0112
+
+
+def exif_orientation(segment: bytes) -> int:
+    """EXIF orientation (1-8) from the payload of a JPEG APP1 segment; 1 when absent or unreadable."""
+    if segment[:6] != b"Exif\x00\x00" or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return 1
+    try:
+        ifd = struct.unpack(order + "I", tiff[4:8])[0]
+        count = struct.unpack(order + "H", tiff[ifd:ifd + 2])[0]
+        for n in range(count):
+            entry = ifd + 2 + 12 * n
+            tag, kind = struct.unpack(order + "HH", tiff[entry:entry + 4])
+            if tag == _EXIF_ORIENTATION and kind == 3:
+                value = struct.unpack(order + "H", tiff[entry + 8:entry + 10])[0]
+                return value if 1 <= value <= 8 else 1
+    except struct.error:
+        pass
+    return 1
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) of the decoded image from a JPEG or PNG header without
+    decoding pixels, or None. cv2.imdecode applies the EXIF orientation, so
+    JPEGs rotated by a quarter turn (orientations 5-8) report their size swapped.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return int(width), int(height)
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    n = len(data)
+    orientation = 1
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if marker == _APP1 and orientation == 1:
+            orientation = exif_orientation(data[i + 4:i + 2 + length])
+        elif marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return (int(height), int(width)) if orientation >= 5 else (int(width), int(height))
+        i += 2 + length
+    return None
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:2] == b"\xff\xd8"
+
+
+def reduction_for(size: Tuple[int, int], max_side: int) -> int:
+    """Largest IMREAD_REDUCED factor that keeps the longer side at or above `max_side`."""
+    longest = max(size)
+    for factor, _ in _REDUCED_FLAGS:
+        if longest // factor >= max_side:
+            return factor
+    return 1
+
+
+def decode_image(data: bytes, max_side: Optional[int] = 1600) -> Optional[np.ndarray]:
+    """
+    Decode an uploaded image to BGR. JPEGs whose longer side is at least twice
+    `max_side` are decoded at reduced scale; other formats (and JPEGs whose
+    header cannot be read) are decoded at full size, as is everything when
+    `max_side=None`.
+    Returns None when the bytes are not a readable image.
+    """
+    buf = np.frombuffer(data, np.uint8)
+    if not max_side:
+        return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+    size = image_size(data)
+    if size is not None and is_jpeg(data):
+        factor = reduction_for(size, max_side)
+        flag = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+        image = cv2.imdecode(buf, flag)
+        if image is not None or factor == 1:
+            return image
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def decode_scale(data: bytes, image: Optional[np.ndarray]) -> float:
+    """Upload pixels per pixel of `image` decoded from `data` (1.0 unless decode_image reduced it)."""
+    size = image_size(data)
+    if size is None or image is None or image.size == 0:
+        return 1.0
+    return size[0] / float(image.shape[1])
+
+
+def downscale(image: np.ndarray, max_side: int) -> np.ndarray:
+    """Shrink `image` so its longer side is at most `max_side` (no-op when already small)."""
+    h, w = image.shape[:2]
+    longest = max(h, w)
+    if longest <= max_side:
+        return image
+    scale = max_side / float(longest)
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
@@ -0,0 +1,125 @@
+"""
+Single-pass face detection.
+
+One detector run per image produces a DetectionResult per face with
+everything downstream code needs: pixel bounding box, keypoints, score and the
+alignment that yields its ArcFace input tensor from the original frame. Visualization,
+registration, authentication and recognition all consume these results, so no
+endpoint has to detect twice.
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .align import ALIGNMENTS, eyes_transform, face_inputs
+from .decode import downscale
+
+
+@dataclass(frozen=True)
+class DetectionResult:
+    """One detected face in pixel coordinates of the source image."""
+
+    bbox: Tuple[int, int, int, int]     # x1, y1, x2, y2 (clipped to the image)
+    score: float                        # detector confidence
+    keypoints: List[Tuple[int, int]]    # MediaPipe order: right eye, left eye, nose tip, mouth, right ear, left ear
+    image_size: Tuple[int, int]         # width, height
+    transform: Optional[np.ndarray] = field(repr=False, compare=False)  # 2x3 ArcFace frame -> source map; None = bbox crop
+    source: np.ndarray = field(repr=False, compare=False)     # BGR image the face was detected in
+
+    @property
+    def width(self) -> int:
+        return self.bbox[2] - self.bbox[0]
+
+    @property
+    def height(self) -> int:
+        return self.bbox[3] - self.bbox[1]
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        return (self.bbox[0] + self.bbox[2]) // 2, (self.bbox[1] + self.bbox[3]) // 2
+
+    def rescaled(self, image_size: Tuple[int, int]) -> "DetectionResult":
+        """Box and keypoints mapped onto the same image at `image_size` (e.g. the full-size upload)."""
+        if tuple(image_size) == tuple(self.image_size):
+            return self
+        sx = image_size[0] / float(self.image_size[0])
+        sy = image_size[1] / float(self.image_size[1])
+        x1, y1, x2, y2 = self.bbox
+        return replace(
+            self,
+            bbox=(int(round(x1 * sx)), int(round(y1 * sy)), int(round(x2 * sx)), int(round(y2 * sy))),
+            keypoints=[(int(round(x * sx)), int(round(y * sy))) for x, y in self.keypoints],
+            image_size=(int(image_size[0]), int(image_size[1])),
+            transform=None,
+            source=None,
+        )
+
+    @property
+    def crop(self) -> np.ndarray:
+        """(1, 112, 112, 3) ArcFace input in this thread's reusable buffer (see vision.align.face_inputs)."""
+        return face_inputs([self])
+
+
+def _to_result(detection, image: np.ndarray, alignment: str) -> Optional[DetectionResult]:
+    h, w = image.shape[:2]
+    location = detection.location_data
+    box = location.relative_bounding_box
+    x1, y1 = max(0, int(box.xmin * w)), max(0, int(box.ymin * h))
+    x2, y2 = min(w, x1 + int(box.width * w)), min(h, y1 + int(box.height * h))
+    if x2 <= x1 or y2 <= y1:
+        return None
+    relative = list(getattr(location, "relative_keypoints", []))
+    transform = None
+    if alignment == "keypoints" and len(relative) >= 2:
+        eyes = sorted(((kp.x * w, kp.y * h) for kp in relative[:2]), key=lambda p: p[0])
+        transform = eyes_transform(eyes[0], eyes[1])
+    return DetectionResult(
+        bbox=(x1, y1, x2, y2),
+        score=float(detection.score[0]) if detection.score else 0.0,
+        keypoints=[(int(kp.x * w), int(kp.y * h)) for kp in relative],
+        image_size=(w, h),
+        transform=transform,
+        source=image,
+    )
+
+
+def detect_faces(
+    pool,
+    image: Optional[np.ndarray],
+    max_faces: int = 1,
+    detect_max_side: Optional[int] = 640,
+    alignment: str = "bbox",
+) -> List[DetectionResult]:
+    """
+    Detect faces in a BGR image with a detector from `pool` (vision.DetectorPool)
+    and return up to `max_faces` results, most confident first.
+
+    Detection runs on a copy downscaled to `detect_max_side` (the detector
+    resizes to its ~128 px input anyway); MediaPipe boxes are relative, so
+    crops are still taken from the full-resolution `image`. The detector is
+    held only for inference.
+
+    `alignment` ("bbox" | "keypoints", see vision.align) picks the transform
+    each result's ArcFace input is warped with; the warp itself happens when
+    the input is requested (`result.crop` / `face_inputs(results)`).
+    """
+    if alignment not in ALIGNMENTS:
+        raise ValueError(f"Unknown face alignment {alignment!r} (expected one of {ALIGNMENTS})")
+    if image is None or image.size == 0:
+        return []
+    small = downscale(image, detect_max_side) if detect_max_side else image
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    with pool.acquire() as detector:
+        results = detector.process(rgb)
+    detections = sorted(results.detections or [], key=lambda d: d.score[0] if d.score else 0.0, reverse=True)
+    out = []
+    for detection in detections:
+        result = _to_result(detection, image, alignment)
+        if result is not None:
+            out.append(result)
+            if len(out) >= max_faces:
+                break
+    return out
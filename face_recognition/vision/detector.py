@@ -0,0 +1,154 @@
+"""
+Pool of long-lived MediaPipe FaceDetection instances.
+
+Building a FaceDetection loads and initializes its TFLite graph, which costs far
+more than running it on one image. The pool keeps a fixed number of detectors
+alive for the life of the worker; a request checks one out, runs inference and
+returns it. A detector instance is not safe to share between threads, so each
+is used by one request at a time.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+
+def mediapipe_face_detector(model_selection: int = 0, min_detection_confidence: float = 0.5) -> Callable[[], Any]:
+    """Factory building a MediaPipe FaceDetection with the given settings."""
+    import mediapipe as mp
+
+    def build():
+        return mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_detection_confidence,
+        )
+
+    return build
+
+
+# Left in the idle queue by close() to wake callers waiting for a detector
+_CLOSED = object()
+
+
+def _close_detector(detector: Any) -> None:
+    try:
+        detector.close()
+    except Exception as e:
+        print(f"[vision.detector] Failed to close detector: {e}")
+
+
+class DetectorPool:
+    """
+    Thread-safe pool of up to `size` detectors built lazily by `factory`.
+
+    Use `with pool.acquire() as detector:`; when every detector is busy the
+    caller waits up to `timeout` seconds and then gets a TimeoutError.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 4, timeout: float = 10.0):
+        if size < 1:
+            raise ValueError("detector pool size must be at least 1")
+        self.factory = factory
+        self.size = int(size)
+        self.timeout = float(timeout)
+        # LIFO: the most recently used detector (warm caches) is handed out first
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._all: List[Any] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.acquires = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def _checkout(self) -> Any:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("detector pool is closed")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if len(self._all) < self.size:
+                detector = self.factory()
+                self._all.append(detector)
+                return detector
+        started = time.perf_counter()
+        try:
+            detector = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no face detector free after {self.timeout:.1f}s (pool size {self.size})")
+        if detector is _CLOSED:
+            # Wake the next waiter too
+            self._idle.put(_CLOSED)
+            raise RuntimeError("detector pool is closed")
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.waits += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+        return detector
+
+    def _checkin(self, detector: Any) -> None:
+        with self._lock:
+            if not self._closed:
+                self._idle.put(detector)
+                return
+        # Checked out while the pool was closed: release it now that it is free
+        _close_detector(detector)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        detector = self._checkout()
+        with self._lock:
+            self.acquires += 1
+        try:
+            yield detector
+        finally:
+            self._checkin(detector)
+
+    def warm(self, count: int = 1) -> None:
+        """Build up to `count` detectors ahead of the first request."""
+        with self._lock:
+            if self._closed:
+                return
+            missing = max(0, min(count, self.size) - len(self._all))
+            built = [self.factory() for _ in range(missing)]
+            self._all.extend(built)
+            for detector in built:
+                self._idle.put(detector)
+
+    def close(self) -> None:
+        """
+        Release every idle detector's graph; detectors still checked out are
+        released when they come back. The pool cannot be used afterwards.
+        """
+        idle = []
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            # Callers already waiting for a detector get "closed" instead of a timeout
+            self._idle.put(_CLOSED)
+        for detector in idle:
+            _close_detector(detector)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": len(self._all),
+                "idle": 0 if self._closed else self._idle.qsize(),
+                "acquires": self.acquires,
+                "waits": self.waits,
+                "avg_wait_ms": round(1000 * self.wait_time / self.waits, 2) if self.waits else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 2),
+            }
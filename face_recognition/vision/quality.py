@@ -0,0 +1,111 @@
+"""
+Cheap face-quality gate run between detection and embedding.
+
+Blurry, tiny, low-confidence or strongly turned faces rarely match anyone, and
+a failed match costs a full ArcFace run, a gallery scan and a security-agent
+event (incident row + alert email). Each check here costs microseconds on
+data the detector already produced, so unusable frames are rejected with a
+reason code before any of that work happens.
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+import cv2
+import numpy as np
+
+# Reason codes, in the order the checks run (cheapest first)
+FACE_TOO_SMALL = "face_too_small"
+LOW_DETECTION_SCORE = "low_detection_score"
+HEAD_TURNED = "head_turned"
+TOO_BLURRY = "too_blurry"
+REASONS = (FACE_TOO_SMALL, LOW_DETECTION_SCORE, HEAD_TURNED, TOO_BLURRY)
+
+# Side of the grey patch the sharpness is measured on, so the score does not depend on face size
+_SHARPNESS_SIZE = 112
+
+
+@dataclass(frozen=True)
+class QualityThresholds:
+    min_face_px: int = 60          # shorter bbox side in source pixels
+    min_score: float = 0.6         # detector confidence
+    max_yaw: float = 0.5           # |yaw ratio|: 0 frontal, 1 full profile
+    min_sharpness: float = 60.0    # variance of the Laplacian on the 112 px grey face
+
+
+@dataclass(frozen=True)
+class QualityResult:
+    ok: bool
+    reason: Optional[str]
+    face_px: int
+    score: float
+    yaw: Optional[float]
+    sharpness: Optional[float]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def yaw_ratio(keypoints) -> Optional[float]:
+    """
+    Signed head-turn estimate from MediaPipe keypoints: where the nose tip sits
+    between the two ear tragions (falls back to the eyes). 0 is frontal, +-1
+    is full profile; None without enough keypoints.
+    """
+    if len(keypoints) < 3:
+        return None
+    nose_x = keypoints[2][0]
+    left, right = (keypoints[4], keypoints[5]) if len(keypoints) >= 6 else (keypoints[0], keypoints[1])
+    d_left = abs(nose_x - left[0])
+    d_right = abs(nose_x - right[0])
+    total = d_left + d_right
+    if total == 0:
+        return None
+    return float((d_left - d_right) / total)
+
+
+def sharpness(image: np.ndarray, bbox) -> float:
+    """Variance of the Laplacian of the face, resized to a fixed grey patch."""
+    x1, y1, x2, y2 = bbox
+    face = cv2.resize(image[y1:y2, x1:x2], (_SHARPNESS_SIZE, _SHARPNESS_SIZE))
+    grey = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    _, std = cv2.meanStdDev(cv2.Laplacian(grey, cv2.CV_16S, ksize=3))
+    return float(std[0, 0] ** 2)
+
+
+def assess_face(
+    detection,
+    thresholds: QualityThresholds = QualityThresholds(),
+    scale: float = 1.0,
+) -> QualityResult:
+    """
+    Run the checks on a vision.DetectionResult, stopping at the first failure.
+    `scale` is source pixels per pixel of the image the face was detected in
+    (> 1 when a large JPEG was decoded at reduced size, see vision.decode), so
+    the size check and the reported face_px are in upload pixels.
+    """
+    face_px = int(min(detection.width, detection.height) * scale)
+    score = float(detection.score)
+    yaw = None
+    sharp = None
+    reason = None
+    if face_px < thresholds.min_face_px:
+        reason = FACE_TOO_SMALL
+    elif score < thresholds.min_score:
+        reason = LOW_DETECTION_SCORE
+    else:
+        yaw = yaw_ratio(detection.keypoints)
+        if yaw is not None and abs(yaw) > thresholds.max_yaw:
+            reason = HEAD_TURNED
+        else:
+            sharp = sharpness(detection.source, detection.bbox)
+            if sharp < thresholds.min_sharpness:
+                reason = TOO_BLURRY
+    return QualityResult(
+        ok=reason is None,
+        reason=reason,
+        face_px=face_px,
+        score=score,
+        yaw=None if yaw is None else round(yaw, 3),
+        sharpness=None if sharp is None else round(sharp, 1),
+    )